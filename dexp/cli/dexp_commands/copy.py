@@ -27,16 +27,32 @@ from dexp.datasets.operations.copy import dataset_copy
     default=None,
     help="Dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option("--chunks", "-chk", default=None, help="Dataset chunks dimensions, e.g. (1, 126, 512, 512).")
 @click.option(
     "--codec",
     "-z",
-    default=_default_codec,
-    help="Compression codec: zstd for ’, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’ ",
+    default=None,
+    help="Compression codec: zstd for ’, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’, "
+    + f"by default the codec of the input when only slicing along time, ‘{_default_codec}’ otherwise",
+)
+@click.option(
+    "--clevel",
+    "-l",
+    type=int,
+    default=None,
+    help="Compression level, by default the level of the input when only slicing along time, "
+    + f"{_default_clevel} otherwise",
+)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
     show_default=True,
 )
-@click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
 @click.option("--overwrite", "-w", is_flag=True, help="Forces overwrite of target", show_default=True)
 @click.option(
     "--zerolevel",
@@ -72,6 +88,7 @@ def copy(
     codec,
     clevel,
     overwrite,
+    resume,
     zerolevel,
     workers,
     workersbackend,
@@ -96,6 +113,7 @@ def copy(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             zerolevel=zerolevel,
             workers=workers,
             workersbackend=workersbackend,
@@ -25,7 +25,9 @@ from dexp.datasets.operations.crop import dataset_crop
     default=None,
     help="Reference channel to estimate cropping. If no provided it picks the first one.",
 )
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option("--chunks", "-chk", default=None, help="Dataset chunks dimensions, e.g. (1, 126, 512, 512).")
 @click.option(
     "--codec",
@@ -35,6 +37,13 @@ from dexp.datasets.operations.crop import dataset_crop
     show_default=True,
 )
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option("--overwrite", "-w", is_flag=True, help="Forces overwrite of target", show_default=True)
 @click.option(
     "--workers",
@@ -55,6 +64,7 @@ def crop(
     codec,
     clevel,
     overwrite,
+    resume,
     workers,
     check,
 ):
@@ -82,6 +92,7 @@ def crop(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             workers=workers,
             check=check,
         )
@@ -27,7 +27,9 @@ from dexp.datasets.operations.deconv import dataset_deconv
     default=None,
     help="dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option(
     "--codec",
     "-z",
@@ -36,8 +38,24 @@ from dexp.datasets.operations.deconv import dataset_deconv
     show_default=True,
 )
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option("--overwrite", "-w", is_flag=True, help="to force overwrite of target", show_default=True)
 @click.option("--tilesize", "-ts", type=int, default=512, help="Tile size for tiled computation", show_default=True)
+@click.option(
+    "--memorybudget",
+    "-mb",
+    type=float,
+    default=None,
+    help="Memory budget in GB for processing one tile, when given the tile size and margins are chosen automatically "
+    "to use as few tiles as possible within that budget (overrides tile size).",
+    show_default=True,
+)
 @click.option(
     "--method",
     "-m",
@@ -147,7 +165,9 @@ def deconv(
     codec,
     clevel,
     overwrite,
+    resume,
     tilesize,
+    memorybudget,
     method,
     iterations,
     maxcorrection,
@@ -192,7 +212,9 @@ def deconv(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             tilesize=tilesize,
+            memory_budget=memorybudget,
             method=method,
             num_iterations=iterations,
             max_correction=maxcorrection,
@@ -32,7 +32,9 @@ from dexp.datasets.operations.deskew import dataset_deskew
     default=None,
     help="dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )  #
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option(
     "--codec",
     "-z",
@@ -40,6 +42,13 @@ from dexp.datasets.operations.deskew import dataset_deskew
     help="compression codec: ‘zstd’, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’ ",
 )
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option(
     "--overwrite", "-w", is_flag=True, help="to force overwrite of target", show_default=True
 )  # , help='dataset slice'
@@ -110,6 +119,7 @@ def deskew(
     codec,
     clevel,
     overwrite,
+    resume,
     mode,
     deltax,
     deltaz,
@@ -158,6 +168,7 @@ def deskew(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             workers=workers,
             workersbackend=workersbackend,
             devices=devices,
@@ -4,6 +4,7 @@ import click
 from arbol.arbol import aprint, asection
 
 from dexp.cli.parsing import _get_output_path
+from dexp.utils.fastcopy import fastcopy as native_fastcopy
 from dexp.utils.robocopy import robocopy
 
 
@@ -20,22 +21,27 @@ from dexp.utils.robocopy import robocopy
 @click.option(
     "--large_files", "-lf", is_flag=True, help="Set to true to speed up large file transfer", show_default=True
 )
-def fastcopy(input_path, output_path, workers, large_files):
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Skips files already copied, i.e. with same size and modification time (Linux and OSX only)",
+    show_default=True,
+)
+def fastcopy(input_path, output_path, workers, large_files, resume):
     """Copies a dataset fast, with no processing, just moves the data as fast as possible. For each operating system it uses the best method."""
 
     output_path = _get_output_path(input_path, output_path, "_copy")
 
-    if workers == -1:
+    if workers < 0:
         workers = max(1, os.cpu_count() // abs(workers))
 
     with asection(f"Fast copying from: {input_path} to {output_path} "):
 
         from sys import platform
 
-        if platform == "linux" or platform == "linux2":
-            raise NotImplementedError("Fast copy not yet implemented for Linux")
-        elif platform == "darwin":
-            raise NotImplementedError("Fast copy not yet implemented for OSX")
+        if platform == "linux" or platform == "linux2" or platform == "darwin":
+            native_fastcopy(input_path, output_path, nb_threads=workers, resume=resume)
         elif platform == "win32":
             robocopy(
                 input_path, output_path, nb_threads=workers, large_files=large_files or not (".zarr" in input_path)
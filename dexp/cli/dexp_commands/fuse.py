@@ -27,7 +27,9 @@ from dexp.datasets.operations.fuse import dataset_fuse
     default=None,
     help="dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )  #
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option(
     "--codec",
     "-z",
@@ -35,6 +37,13 @@ from dexp.datasets.operations.fuse import dataset_fuse
     help="compression codec: ‘zstd’, ‘blosclz’, ‘lz4’, ‘lz4hc’, ‘zlib’ or ‘snappy’ ",
 )
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option(
     "--overwrite", "-w", is_flag=True, help="to force overwrite of target", show_default=True
 )  # , help='dataset slice'
@@ -197,6 +206,7 @@ def fuse(
     codec,
     clevel,
     overwrite,
+    resume,
     microscope,
     equalise,
     equalisemode,
@@ -244,6 +254,7 @@ def fuse(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             microscope=microscope,
             equalise=equalise,
             equalise_mode=equalisemode,
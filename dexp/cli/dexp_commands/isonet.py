@@ -21,7 +21,9 @@ from dexp.datasets.operations.isonet import dataset_isonet
     default=None,
     help="dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )  #
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option(
     "--codec",
     "-z",
@@ -30,6 +32,13 @@ from dexp.datasets.operations.isonet import dataset_isonet
     show_default=True,
 )  #
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option(
     "--overwrite", "-w", is_flag=True, help="to force overwrite of target", show_default=True
 )  # , help='dataset slice'
@@ -56,6 +65,7 @@ def isonet(
     codec,
     clevel,
     overwrite,
+    resume,
     context,
     mode,
     max_epochs,
@@ -79,6 +89,7 @@ def isonet(
             compression=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             context=context,
             mode=mode,
             max_epochs=max_epochs,
@@ -9,13 +9,24 @@ from dexp.datasets.operations.serve import dataset_serve
 @click.argument("input_paths", nargs=-1)  # ,  help='input path'
 @click.option("--host", "-h", type=str, default="0.0.0.0", help="Host to serve from", show_default=True)
 @click.option("--port", "-p", type=int, default=8000, help="Port to serve from", show_default=True)
-def serve(input_paths, host, port):
+@click.option(
+    "--workers", "-wk", type=int, default=8, help="Number of threads reading chunks from storage", show_default=True
+)
+@click.option(
+    "--cachesize",
+    "-cs",
+    type=int,
+    default=256,
+    help="Size in megabytes of the in-memory cache of recently served chunks",
+    show_default=True,
+)
+def serve(input_paths, host, port, workers, cachesize):
     """Serves dataset across network."""
 
     input_dataset, input_paths = glob_datasets(input_paths)
 
     with asection(f"Serving dataset(s): {input_paths}"):
-        dataset_serve(input_dataset, host=host, port=port)
+        dataset_serve(input_dataset, host=host, port=port, workers=workers, cache_size=cachesize * 2 ** 20)
 
         input_dataset.close()
         aprint("Done!")
@@ -25,7 +25,9 @@ from dexp.datasets.operations.stabilize import dataset_stabilize
     default=None,
     help="Dataset slice (TZYX), e.g. [0:5] (first five stacks) [:,0:100] (cropping in z) ",
 )
-@click.option("--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, or ‘zip’", show_default=True)
+@click.option(
+    "--store", "-st", default=_default_store, help="Zarr store: ‘dir’, ‘ndir’, ‘zip’, or ‘shard’", show_default=True
+)
 @click.option(
     "--codec",
     "-z",
@@ -34,6 +36,13 @@ from dexp.datasets.operations.stabilize import dataset_stabilize
     show_default=True,
 )
 @click.option("--clevel", "-l", type=int, default=_default_clevel, help="Compression level", show_default=True)
+@click.option(
+    "--resume",
+    "-r",
+    is_flag=True,
+    help="Resumes an interrupted run: the target is opened in append mode and only missing time points are processed",
+    show_default=True,
+)
 @click.option("--overwrite", "-w", is_flag=True, help="Forces overwrite of target", show_default=True)
 @click.option(
     "--maxrange",
@@ -158,6 +167,7 @@ def stabilize(
     codec,
     clevel,
     overwrite,
+    resume,
     maxrange,
     minconfidence,
     com,
@@ -198,6 +208,7 @@ def stabilize(
             compression_codec=codec,
             compression_level=clevel,
             overwrite=overwrite,
+            resume=resume,
             max_range=maxrange,
             min_confidence=minconfidence,
             enable_com=com,
@@ -20,6 +20,8 @@ def _strip_path(path):
         path = path[:-4]
     if path.endswith(".nested.zarr"):
         path = path[:-12]
+    if path.endswith(".sharded.zarr"):
+        path = path[:-13]
     if path.endswith(".zarr"):
         path = path[:-5]
     return path
@@ -0,0 +1,116 @@
+import http.client
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from os.path import join
+
+import numpy
+import pytest
+
+from dexp.datasets import ZDataset
+from dexp.datasets.chunk_server import ChunkServer, metrics_path
+
+
+@contextmanager
+def _serving(store):
+    server = ChunkServer(store, host="127.0.0.1", port=0, workers=4, cache_size=2 ** 20, report_interval=None)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    assert server.wait_until_started(timeout=10)
+    try:
+        yield server
+    finally:
+        server.stop()
+        thread.join(timeout=10)
+        assert not thread.is_alive()
+
+
+@pytest.fixture
+def stored_dataset():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = join(tmpdir, "test.zarr")
+        dataset = ZDataset(path=path, mode="w")
+        dataset.add_channel(name="channel", shape=(4, 16, 32, 32), chunks=(1, 8, 16, 16), dtype="u2")
+        data = numpy.random.randint(0, 1000, size=(4, 16, 32, 32), dtype="u2")
+        dataset.write_array("channel", data)
+        dataset.close()
+
+        dataset = ZDataset(path=path, mode="r")
+        try:
+            yield dataset._root_group.chunk_store, data
+        finally:
+            dataset.close()
+
+
+@pytest.fixture
+def served_dataset(stored_dataset):
+    store, data = stored_dataset
+    with _serving(store) as server:
+        yield server, store, data
+
+
+def _get(server, path, headers=None, connection=None):
+    connection = connection or http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    connection.request("GET", path, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def test_chunk_server_serves_stored_bytes(served_dataset):
+    server, store, data = served_dataset
+
+    # Chunks are served as stored, compressed, on a kept-alive connection:
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    for key in ("channel/channel/0.0.0.0", "channel/channel/3.1.1.1", "channel/channel/.zarray", ".zmetadata"):
+        status, headers, body = _get(server, "/" + key, connection=connection)
+        assert status == 200
+        assert body == bytes(store[key])
+    assert headers["Content-Type"] == "application/json"
+
+    assert _get(server, "/channel/channel/9.0.0.0")[0] == 404
+    assert _get(server, "/../secret")[0] == 400
+
+    # Conditional requests:
+    status, headers, body = _get(server, "/channel/channel/0.0.0.0")
+    etag = headers["ETag"]
+    status, _, body = _get(server, "/channel/channel/0.0.0.0", headers={"If-None-Match": etag})
+    assert status == 304 and body == b""
+    assert _get(server, "/channel/channel/0.0.0.0", headers={"If-None-Match": '"other"'})[0] == 200
+
+    # Byte ranges:
+    status, headers, body = _get(server, "/channel/channel/0.0.0.0", headers={"Range": "bytes=2-9"})
+    assert status == 206 and body == bytes(store["channel/channel/0.0.0.0"])[2:10]
+
+    metrics = json.loads(_get(server, metrics_path)[2])
+    assert metrics["cache_hits"] > 0
+    assert metrics["responses"]["304"] == 1
+
+
+def test_chunk_server_concurrent_requests(stored_dataset):
+    store, data = stored_dataset
+    keys = [f"channel/channel/{t}.{z}.{y}.{x}" for t in range(4) for z in range(2) for y in range(2) for x in range(2)]
+
+    with _serving(store) as server:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda key: _get(server, "/" + key), keys * 4))
+
+    for key, (status, _, body) in zip(keys * 4, results):
+        assert status == 200
+        assert body == bytes(store[key])
+
+    # Metrics are read once the server stopped, all responses are then accounted for:
+    metrics = server.metrics()
+    assert metrics["requests"] == len(keys) * 4
+    # Each chunk is read once from the store, concurrent requests share reads and the cache:
+    assert metrics["store_reads"] == len(keys)
+    assert metrics["bytes_sent"] == sum(len(body) for _, _, body in results)
+
+
+def test_chunk_server_zarr_client(served_dataset):
+    pytest.importorskip("aiohttp")
+    server, store, data = served_dataset
+
+    dataset = ZDataset(path=f"http://127.0.0.1:{server.port}", mode="r")
+    assert numpy.array_equal(dataset.get_array("channel")[...], data)
@@ -0,0 +1,42 @@
+import tempfile
+
+import numpy
+import pytest
+
+from dexp.datasets import ZDataset
+from dexp.datasets.chunking import benchmark_chunks, compute_chunks
+
+
+@pytest.mark.parametrize("access_pattern", ["stack", "slice", "view"])
+def test_compute_chunks(access_pattern):
+    shape = (100, 512, 2048, 2048)
+    chunks = compute_chunks(shape, numpy.uint16, access_pattern=access_pattern, chunk_bytes=2 ** 20)
+
+    assert len(chunks) == len(shape)
+    assert chunks[0] == 1
+    assert all(1 <= c <= s for c, s in zip(chunks, shape))
+    # chunks are at most twice the target size, for the default compression ratio of 2:
+    assert 2 ** 20 <= numpy.prod(chunks) * 2 <= 2 * 2 ** 20
+
+    if access_pattern == "stack":
+        # planes too large for the target size are split along y first:
+        assert chunks[1] == 1 and chunks[3] == shape[3]
+    elif access_pattern == "slice":
+        assert chunks[1] == 1
+    else:
+        assert max(chunks[1:]) <= 2 * min(chunks[1:])
+
+
+def test_add_channel_access_pattern():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        dataset = ZDataset(path=tmpdir + "/test.zarr", mode="w")
+        array = dataset.add_channel("first", shape=(2, 64, 512, 512), dtype="f4", access_pattern="stack")
+        assert array.chunks[2:] == (512, 512)
+
+
+def test_benchmark_chunks():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = benchmark_chunks((2, 32, 64, 64), access_pattern="view", chunk_bytes=2 ** 12, path=tmpdir)
+        assert results["chunks"] == compute_chunks((2, 32, 64, 64), numpy.uint16, chunk_bytes=2 ** 12)
+        assert results["compression_ratio"] > 1
+        assert results["write_throughput"] > 0 and results["read_throughput"] > 0
@@ -0,0 +1,109 @@
+import os
+import tempfile
+from os.path import join
+
+import dask.array
+import numpy
+
+from dexp.datasets import CCDataset, JoinedDataset
+from dexp.datasets.clearcontrol_array import CCArray
+from dexp.io.compress_array import compress_array
+
+
+def _write_cc_dataset(
+    path: str, stacks: numpy.ndarray, channel: str = "C0L0", compressed: bool = False, first_time_point: int = 0
+):
+    os.makedirs(join(path, "stacks", channel))
+    with open(join(path, f"{channel}.index.txt"), "w") as index_file:
+        for time_point, stack in enumerate(stacks, start=first_time_point):
+            # shapes are written in x, y, z order:
+            index_file.write(f"{time_point}\t{time_point * 1.5}\t{', '.join(map(str, stack.shape[::-1]))}\n")
+            file_name = join(path, "stacks", channel, str(time_point).zfill(6))
+            if compressed:
+                # many frames, to test decompressing frames overlapping with z slabs:
+                with open(file_name + ".blc", "wb") as compressed_file:
+                    compressed_file.write(compress_array(stack.astype("<u2"), min_num_chunks=5))
+            else:
+                stack.astype("<u2").tofile(file_name + ".raw")
+
+
+def test_clearcontrol_dataset_raw():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stacks = numpy.random.randint(0, 2 ** 16, size=(3, 7, 13, 17), dtype=numpy.uint16)
+        _write_cc_dataset(tmpdir, stacks)
+
+        dataset = CCDataset(tmpdir)
+        assert dataset.channels() == ["C0L0"]
+        assert dataset.shape("C0L0") == stacks.shape
+
+        stack = dataset.get_stack("C0L0", 1)
+        assert isinstance(stack, numpy.memmap)
+        assert numpy.array_equal(stack, stacks[1])
+        assert numpy.array_equal(stack[3], stacks[1, 3])
+
+        assert numpy.array_equal(dataset.get_stack("C0L0", 2, wrap_with_dask=True).compute(), stacks[2])
+        assert numpy.array_equal(numpy.asarray(dataset.get_array("C0L0")[:, 2:5]), stacks[:, 2:5])
+
+        # prefetched stacks are read in memory, not memory-mapped:
+        prefetched = list(dataset.prefetch("C0L0"))
+        assert numpy.array_equal(numpy.stack(prefetched), stacks)
+        assert all(stack.base is None for stack in prefetched)
+
+
+def test_clearcontrol_dataset_compressed():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stacks = numpy.random.randint(0, 2 ** 16, size=(2, 9, 13, 17), dtype=numpy.uint16)
+        _write_cc_dataset(tmpdir, stacks, compressed=True)
+
+        dataset = CCDataset(tmpdir)
+        assert numpy.array_equal(dataset.get_stack("C0L0", 1), stacks[1])
+
+        # The index of the compressed frames is cached next to the dataset:
+        assert os.path.exists(join(tmpdir, "C0L0.blc_index.npy"))
+
+        lazy_stack = dataset.get_stack("C0L0", 0, wrap_with_dask=True)
+        assert numpy.array_equal(lazy_stack[2:7, 3:5].compute(), stacks[0, 2:7, 3:5])
+        assert numpy.array_equal(lazy_stack[::-3].compute(), stacks[0, ::-3])
+
+        # Chunks along z span the compressed frames, so that each frame is decompressed once, not once per z slice:
+        nb_frames = len(dataset._get_frame_index("C0L0", 0))
+        assert sum(lazy_stack.chunks[0]) == stacks.shape[1]
+        assert 1 < len(lazy_stack.chunks[0]) <= nb_frames < stacks.shape[1]
+        lazy_array = dataset.get_array("C0L0", wrap_with_dask=True)
+        assert lazy_array.chunks[1] == lazy_stack.chunks[0]
+        assert numpy.array_equal(lazy_array.compute(), stacks)
+
+        dataset = CCDataset(tmpdir)
+        assert numpy.array_equal(dataset._get_slab_for_stack_file("C0L0", 1, 4, 6), stacks[1, 4:6])
+
+        # Datasets might not start at time point 0:
+        _write_cc_dataset(join(tmpdir, "later"), stacks, compressed=True, first_time_point=3)
+        dask_array = CCDataset(join(tmpdir, "later")).get_array("C0L0")
+        assert dask_array.chunks[1] == lazy_stack.chunks[0]
+        assert numpy.array_equal(dask_array.compute(), stacks)
+
+
+def test_clearcontrol_lazy_array():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stacks = numpy.random.randint(0, 2 ** 16, size=(4, 9, 13, 17), dtype=numpy.uint16)
+        _write_cc_dataset(join(tmpdir, "raw"), stacks)
+        _write_cc_dataset(join(tmpdir, "compressed"), stacks, compressed=True)
+
+        for path in ("raw", "compressed"):
+            dataset = CCDataset(join(tmpdir, path))
+            # Arrays are wrapped with dask by default:
+            assert isinstance(dataset.get_array("C0L0"), dask.array.Array)
+
+            array = dataset.get_array("C0L0", wrap_with_dask=False)
+            assert isinstance(array, CCArray)
+            assert array.shape == stacks.shape and array.dtype == stacks.dtype and len(array) == len(stacks)
+
+            for key in (1, -1, (2, 3), (slice(1, 3), slice(2, 8, 2), 5), (Ellipsis, 4), (slice(None, None, -1), -2)):
+                assert numpy.array_equal(array[key], stacks[key])
+            assert numpy.array_equal(numpy.asarray(array), stacks)
+
+            dask_array = dataset.get_array("C0L0", per_z_slice=False, wrap_with_dask=True)
+            assert numpy.array_equal(dask_array[1:3, :, 5].compute(), stacks[1:3, :, 5])
+
+        joined_dataset = JoinedDataset([CCDataset(join(tmpdir, "raw")), CCDataset(join(tmpdir, "compressed"))])
+        assert numpy.array_equal(joined_dataset.get_stack("C0L0", 5).compute(), stacks[1])
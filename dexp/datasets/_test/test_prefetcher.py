@@ -0,0 +1,55 @@
+import tempfile
+import threading
+import time
+from os.path import join
+
+import numpy
+
+from dexp.datasets import JoinedDataset, ZDataset
+from dexp.datasets.prefetcher import Prefetcher
+
+
+class _SlowArray:
+    # Array that records how many stacks are being read or have been read but not consumed:
+    def __init__(self, array):
+        self.array = array
+        self.nb_reads = 0
+        self.lock = threading.Lock()
+
+    def __getitem__(self, item):
+        with self.lock:
+            self.nb_reads += 1
+        time.sleep(0.01)
+        return self.array[item]
+
+
+def test_prefetcher_order_and_budget():
+    array = numpy.random.rand(10, 4, 8, 8).astype(numpy.float32)
+    slow_array = _SlowArray(array)
+    stack_nbytes = array[0, :, :4].nbytes
+
+    stacks = Prefetcher(slow_array, range(10), slicing=(slice(None), slice(0, 4)), depth=5, max_bytes=2 * stack_nbytes)
+    for tp, stack in enumerate(stacks):
+        assert numpy.array_equal(stack, array[tp, :, :4])
+        # at most two stacks are read ahead of the one being processed:
+        assert slow_array.nb_reads <= tp + 1 + 2
+        time.sleep(0.02)
+
+
+def test_dataset_prefetch():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        data = numpy.random.randint(0, 1000, size=(6, 4, 8, 8), dtype=numpy.uint16)
+        datasets = []
+        for name in ("first", "second"):
+            dataset = ZDataset(join(tmpdir, name + ".zarr"), mode="w")
+            dataset.add_channel("channel", shape=data.shape, dtype=data.dtype, chunks=(1, 2, 8, 8))
+            dataset.get_array("channel")[...] = data
+            datasets.append(dataset)
+
+        with datasets[0].prefetch("channel", time_points=[5, 1, 3], slicing=(slice(1, 3),), depth=2) as stacks:
+            for tp, stack in zip([5, 1, 3], stacks):
+                assert numpy.array_equal(stack, data[tp, 1:3])
+
+        joined_dataset = JoinedDataset(datasets)
+        stacks = list(joined_dataset.prefetch("channel"))
+        assert numpy.array_equal(numpy.stack(stacks), numpy.concatenate([data, data]))
@@ -0,0 +1,79 @@
+import pickle
+import tempfile
+import threading
+import time
+from os.path import join
+
+import numpy
+import pytest
+
+from dexp.datasets import ZDataset
+from dexp.datasets.write_behind import WriteBehindQueue
+
+
+def test_write_behind_queue_is_bounded():
+    lock = threading.Lock()
+    running = []
+    written = []
+
+    def write(i):
+        with lock:
+            running.append(i)
+        time.sleep(0.01)
+        with lock:
+            written.append(i)
+
+    queue = WriteBehindQueue(workers=2, max_pending=3)
+    for i in range(10):
+        queue.submit(write, i)
+        # at most three writes are pending, queued or being written:
+        with lock:
+            assert len(running) - len(written) <= 3
+    queue.close()
+    assert sorted(written) == list(range(10))
+
+
+def test_write_behind_queue_deferred_error():
+    def write(i):
+        if i == 1:
+            raise RuntimeError("write failed")
+
+    queue = WriteBehindQueue(workers=1, max_pending=1)
+    queue.submit(write, 0)
+    queue.submit(write, 1)
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    # the error is raised once:
+    queue.submit(write, 2)
+    queue.close()
+
+
+def test_dataset_write_behind():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = join(tmpdir, "test.zarr")
+        dataset = ZDataset(path=path, mode="w", write_workers=2, max_pending_writes=2)
+        dataset.add_channel(name="channel", shape=(6, 8, 16, 16), chunks=(1, 8, 8, 8), dtype="u2")
+
+        data = numpy.random.randint(0, 1000, size=(6, 8, 16, 16), dtype="u2")
+        stack = numpy.empty_like(data[0])
+        for tp in range(6):
+            # the buffer given to write_stack is reused right away:
+            stack[...] = data[tp]
+            dataset.write_stack("channel", tp, stack)
+        stack[...] = 0
+
+        assert dataset.completed_time_points("channel") == list(range(6))
+        assert numpy.array_equal(dataset.get_array("channel")[...], data)
+        for axis in range(3):
+            assert numpy.array_equal(dataset.get_projection_array("channel", axis)[...], data.max(axis=axis + 1))
+
+        # Copies sent to other processes write synchronously:
+        assert pickle.loads(pickle.dumps(dataset))._write_queue is None
+
+        # Write errors are raised when closing:
+        dataset.write_stack("channel", 0, numpy.zeros((4, 4, 4), dtype="u2"))
+        with pytest.raises(ValueError):
+            dataset.close()
+
+        dataset = ZDataset(path=path, mode="r")
+        assert numpy.array_equal(dataset.get_array("channel")[...], data)
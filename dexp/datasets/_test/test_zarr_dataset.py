@@ -3,11 +3,14 @@ import tempfile
 from os.path import join
 
 import numpy
+import pytest
+import zarr
 from ome_zarr.utils import info
 from skimage.data import binary_blobs
 from skimage.filters import gaussian
 
 from dexp.datasets import ZDataset
+from dexp.datasets.sharded_store import ShardedStore
 from dexp.utils.backends import NumpyBackend
 
 
@@ -214,3 +217,277 @@ def test_ome_zarr_convertion():
         ome_zarr_path = join(tmpdir, "test_ome.ome.zarr")
         zdataset.to_ome_zarr(ome_zarr_path)
         info(ome_zarr_path)
+
+
+def test_ome_zarr_multiscale():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        zdataset = ZDataset(path=join(tmpdir, "test.zarr"), mode="w", store="dir")
+        zdataset.add_channel(name="first", shape=(2, 8, 40, 36), chunks=(1, 4, 16, 16), dtype="f4")
+        data = numpy.random.rand(2, 8, 40, 36).astype("f4")
+        for t in range(2):
+            zdataset.write_stack("first", t, data[t])
+
+        ome_zarr_path = join(tmpdir, "test.ome.zarr")
+        zdataset.to_ome_zarr(ome_zarr_path, chunks=(1, 1, 4, 16, 16), workers=2)
+
+        group = zarr.open_group(ome_zarr_path, mode="r")
+        # levels are added until Y and X fit in a single chunk: 40x36 -> 20x18 -> 10x9
+        assert [group[str(level)].shape for level in range(3)] == [
+            (2, 1, 8, 40, 36),
+            (2, 1, 8, 20, 18),
+            (2, 1, 8, 10, 9),
+        ]
+        assert len(group.attrs["multiscales"][0]["datasets"]) == 3
+
+        assert numpy.array_equal(group["0"][:, 0], data)
+        block_means = data.reshape(2, 8, 20, 2, 18, 2).mean(axis=(3, 5))
+        assert numpy.allclose(group["1"][:, 0], block_means, atol=1e-6)
+
+
+def test_zarr_stack_writer():
+    from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        zdataset = ZDataset(path=join(tmpdir, "test.zarr"), mode="w", store="dir")
+        zdataset.add_channel(
+            name="first", shape=(3, 40, 50, 60), chunks=(1, 20, 25, 30), dtype="f4", codec="zstd", clevel=3
+        )
+
+        with NumpyBackend():
+            blobs = binary_blobs(length=60, n_dim=3, blob_size_fraction=0.1).astype("f4")[:40, :50, :60]
+
+            with zdataset.stack_writer("first", 1) as stack_writer:
+                scatter_gather_i2i(lambda x: x + 1, blobs, tiles=17, margins=3, out=stack_writer)
+
+            assert numpy.all(zdataset.get_stack("first", 1) == blobs + 1)
+            for axis in range(3):
+                projection = zdataset.get_projection_array("first", axis=axis)[1]
+                assert numpy.all(projection == numpy.max(blobs + 1, axis=axis))
+
+
+def test_zarr_sharded_store():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        path = join(tmpdir, "test")
+        zdataset = ZDataset(path=path, mode="w", store="shard")
+        zdataset.add_channel(name="first", shape=(3, 16, 32, 32), chunks=(1, 4, 8, 8), dtype="u2", codec="zstd")
+
+        data = numpy.random.randint(0, 1000, size=(3, 16, 32, 32), dtype="u2")
+        for t in range(2):
+            zdataset.write_stack("first", t, data[t])
+        zdataset.get_array("first")[0, :4, :8, :8] = 0
+        data[0, :4, :8, :8] = 0
+        assert zdataset.first_uninitialized_time_point("first") == 1
+        zdataset.close()
+
+        # One shard file per time point and array instead of one file per chunk:
+        nb_files = sum(len(files) for _, _, files in os.walk(path + ".sharded.zarr"))
+        assert nb_files < 30
+
+        zdataset = ZDataset(path=path + ".sharded.zarr", mode="r")
+        assert numpy.array_equal(zdataset.get_array("first")[:2], data[:2])
+        assert numpy.all(zdataset.get_array("first")[2] == zdataset.get_array("first").fill_value)
+        for axis in range(3):
+            projection = zdataset.get_projection_array("first", axis=axis)[1]
+            assert numpy.array_equal(projection, data[1].max(axis=axis))
+
+
+def test_sharded_store_open_shards(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = ShardedStore(join(tmpdir, "test.sharded.zarr"), max_open_shards=4)
+
+        # Writes are repeated until the whole record is written:
+        write = os.write
+        monkeypatch.setattr(os, "write", lambda fd, data: write(fd, data[:7]))
+        for t in range(32):
+            store[f"array/{t}.0.0"] = bytes([t]) * 100
+        monkeypatch.undo()
+
+        # Only the most recently read shards are kept open:
+        for _ in range(2):
+            for t in range(32):
+                assert store[f"array/{t}.0.0"] == bytes([t]) * 100
+                assert f"array/{t}.0.0" in store
+                assert len(store._read_fds) <= 4
+        store.close()
+        assert len(store._read_fds) == 0
+
+
+def test_zarr_chunk_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        path = join(tmpdir, "test.zarr")
+        zdataset = ZDataset(path=path, mode="w")
+        zdataset.add_channel(name="first", shape=(2, 10, 30, 30), chunks=(1, 4, 8, 8), dtype="u2", codec="zstd")
+        data = numpy.random.randint(0, 1000, size=(2, 10, 30, 30), dtype="u2")
+        for t in range(2):
+            zdataset.write_stack("first", t, data[t])
+        zdataset.close()
+
+        chunk_bytes = 4 * 8 * 8 * 2
+        zdataset = ZDataset(path=path, mode="r+", chunk_cache_size=16 * chunk_bytes)
+        array = zdataset.get_array("first")
+        cache = zdataset.chunk_cache
+
+        # Selections spanning partial and edge chunks, with steps and integer indices:
+        for key in [(1, slice(2, 9), slice(5, 27), slice(None)), (0, 3, slice(1, 30, 3), 7), (Ellipsis, 29), 1]:
+            assert numpy.array_equal(array[key], data[key])
+        assert array[1, 2, 3, 4] == data[1, 2, 3, 4]
+        assert numpy.array_equal(zdataset.get_array("first", wrap_with_dask=True)[1, 2:5].compute(), data[1, 2:5])
+
+        # Repeated reads hit the cache, which stays within its size:
+        cache.clear()
+        array[0, :4, :8, :8]
+        array[0, :4, :8, :8]
+        assert cache.hits == 1 and cache.misses == 1 and cache.hit_rate == 0.5
+        array[1]
+        assert cache.nbytes <= cache.max_bytes and cache.evictions > 0
+
+        # Projections share the cache:
+        misses = cache.misses
+        projection = zdataset.get_projection_array("first", axis=0)
+        assert numpy.array_equal(projection[1], data[1].max(axis=0))
+        assert numpy.array_equal(projection[1], data[1].max(axis=0))
+        assert cache.misses > misses and cache.hits > 0
+
+        # Writes invalidate the chunks they touch:
+        array[0, :4, :8, :8]
+        array[0, 1:3, 2:5, 2:5] = 0
+        data[0, 1:3, 2:5, 2:5] = 0
+        assert numpy.array_equal(array[0, :4, :8, :8], data[0, :4, :8, :8])
+        array[...] = 7
+        data[...] = 7
+        assert numpy.array_equal(array[0], data[0])
+
+        # The maximum size can be changed:
+        cache.max_bytes = chunk_bytes
+        assert cache.nbytes <= chunk_bytes
+        zdataset.close()
+
+
+def test_zarr_consolidated_metadata():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        path = join(tmpdir, "test.zarr")
+        zdataset = ZDataset(path=path, mode="w")
+        for channel in ("first", "second"):
+            zdataset.add_channel(name=channel, shape=(2, 8, 16, 16), chunks=(1, 4, 8, 8), dtype="u2")
+            zdataset.write_stack(channel, 0, numpy.full((8, 16, 16), 3, dtype="u2"))
+        zdataset.append_metadata({"dz": 2.0, "second": {"tx": 5}})
+        zdataset.close()
+        assert os.path.exists(join(path, ".zmetadata"))
+
+        # The hierarchy and attributes are read from the consolidated metadata only:
+        os.remove(join(path, "second", "second", ".zarray"))
+        os.remove(join(path, ".zattrs"))
+        zdataset = ZDataset(path=path, mode="r")
+        assert isinstance(zdataset._root_group.store, zarr.storage.ConsolidatedMetadataStore)
+        assert zdataset.channels() == ["first", "second"]
+        assert zdataset.get_projection_array("second", axis=0) is not None
+        assert numpy.all(zdataset.get_array("second")[0] == 3)
+        assert zdataset.get_resolution("second") == [1.0, 2.0, 1.0, 1.0]
+        assert zdataset.get_translation("second") == [0, 0, 5]
+        zdataset.close()
+
+        # Opening for writing removes the consolidated metadata until the dataset is closed:
+        path = join(tmpdir, "other.zarr")
+        zdataset = ZDataset(path=path, mode="w")
+        zdataset.add_channel(name="first", shape=(1, 4, 4, 4), chunks=(1, 4, 4, 4), dtype="u2")
+        zdataset.close()
+        zdataset = ZDataset(path=path, mode="a")
+        assert not os.path.exists(join(path, ".zmetadata"))
+        zdataset.add_channel(name="second", shape=(1, 4, 4, 4), chunks=(1, 4, 4, 4), dtype="u2")
+        zdataset.close()
+        assert ZDataset(path=path, mode="r").channels() == ["first", "second"]
+
+
+def test_zarr_completion_manifest():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        path = join(tmpdir, "test.sharded.zarr")
+        zdataset = ZDataset(path=path, mode="w")
+        zdataset.add_channel(name="first", shape=(4, 8, 16, 16), chunks=(1, 4, 8, 8), dtype="u2")
+        assert zdataset.completed_time_points("first") == []
+
+        data = numpy.random.randint(0, 1000, size=(8, 16, 16), dtype="u2")
+        zdataset.write_stack("first", 2, data)
+        # Time points written tile by tile are completed once the writer is closed:
+        with zdataset.stack_writer("first", 0) as writer:
+            writer[:4, :, :] = data[:4]
+            assert zdataset.completed_time_points("first") == [2]
+            writer[4:, :, :] = data[4:]
+        assert zdataset.completed_time_points("first") == [0, 2]
+        assert zdataset.missing_time_points("first") == [1, 3]
+        assert zdataset.first_uninitialized_time_point("first") == 2
+        zdataset.close()
+
+        # Resuming: the existing channel is reused if it has the same shape and dtype:
+        zdataset = ZDataset(path=path, mode="a")
+        array = zdataset.add_channel(name="first", shape=(4, 8, 16, 16), dtype="u2", exist_ok=True)
+        assert numpy.array_equal(array[2], data)
+        with pytest.raises(ValueError):
+            zdataset.add_channel(name="first", shape=(5, 8, 16, 16), dtype="u2", exist_ok=True)
+        with pytest.raises(ValueError):
+            zdataset.add_channel(name="first", shape=(4, 8, 16, 16), dtype="u2")
+        zdataset.close()
+
+        zdataset = ZDataset(path=path, mode="r")
+        assert zdataset.completed_time_points("first") == [0, 2]
+        assert zdataset.channels() == ["first"]
+
+
+def test_zarr_intensity_statistics():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print("created temporary directory", tmpdir)
+
+        path = join(tmpdir, "test.zarr")
+        zdataset = ZDataset(path=path, mode="w")
+        zdataset.add_channel(name="first", shape=(3, 32, 64, 64), chunks=(1, 16, 32, 32), dtype="u2")
+        zdataset.add_channel(name="second", shape=(2, 8, 8, 8), dtype="u2", enable_statistics=False)
+
+        data = numpy.random.randint(100, 4000, size=(3, 32, 64, 64), dtype="u2")
+        data[0, 0, 0, 0] = 60000
+        zdataset.write_stack("first", 0, data[0])
+        with zdataset.stack_writer("first", 1) as writer:
+            writer[:16, :, :] = data[1, :16]
+            writer[16:, :, :] = data[1, 16:]
+
+        # Time point 2 is not written yet:
+        statistics = zdataset.get_statistics("first")
+        assert len(statistics) == 3
+        assert list(statistics.recorded) == [True, True, False]
+        assert zdataset.get_statistics("second") is None
+
+        for tp in range(2):
+            stack = data[tp].astype(numpy.float64)
+            statistics = zdataset.get_statistics("first", tp)
+            assert statistics.min == stack.min()
+            assert statistics.max == stack.max()
+            assert statistics.mean == pytest.approx(stack.mean())
+            assert statistics.std == pytest.approx(stack.std())
+            # quantiles and histogram are estimated from samples of the voxels:
+            for q in (0.01, 0.5, 0.99):
+                assert abs(statistics.quantile(q) - numpy.quantile(stack, q)) < 0.01 * 3900
+            counts, edges = statistics.histogram()
+            assert counts.sum() == pytest.approx(stack.size)
+            assert edges[0] == stack.min() and edges[-1] == stack.max()
+
+        # Contrast limits ignore outliers, and time points without statistics:
+        low, high = zdataset.get_statistics("first").contrast_limits(0.001, 0.999)
+        assert 100 <= low < 200 and 3800 < high < 4000
+
+        # Statistics are recorded by write_array too, and reloaded with the dataset:
+        zdataset.write_array("first", data)
+        zdataset.close()
+        zdataset = ZDataset(path=path, mode="r")
+        statistics = zdataset.get_statistics("first")
+        assert numpy.all(statistics.recorded)
+        assert numpy.array_equal(statistics.max, data.max(axis=(1, 2, 3)))
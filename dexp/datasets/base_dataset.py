@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
-from typing import Any, Sequence, Tuple
+from typing import Any, Optional, Sequence, Tuple
 
 import numpy
 
+from dexp.datasets.prefetcher import Prefetcher
+
 
 class BaseDataset(ABC):
     def __init__(self, dask_backed=False):
@@ -80,6 +82,43 @@ class BaseDataset(ABC):
     def get_stack(self, channel: str, time_point: int, per_z_slice: bool = False, wrap_with_dask: bool = False):
         pass
 
+    def prefetch(
+        self,
+        channel: str,
+        time_points: Optional[Sequence[int]] = None,
+        slicing: Optional[Any] = None,
+        depth: int = 2,
+        max_bytes: Optional[int] = None,
+        workers: int = 1,
+    ) -> Prefetcher:
+        """
+        Returns an iterator over the stacks of a channel, in order, that reads the next stacks in background threads
+        while the current one is processed.
+
+        Parameters
+        ----------
+        channel : channel to read.
+        time_points : time points to read, all time points by default.
+        slicing : slicing applied to each stack.
+        depth : maximum number of stacks read ahead.
+        max_bytes : maximum number of bytes of stacks read ahead.
+        workers : number of threads reading stacks.
+
+        Returns
+        -------
+        Prefetcher iterating over the stacks as numpy arrays
+        """
+        if time_points is None:
+            time_points = range(self.nb_timepoints(channel))
+        return Prefetcher(
+            self.get_array(channel, wrap_with_dask=False),
+            time_points,
+            slicing=slicing,
+            depth=depth,
+            max_bytes=max_bytes,
+            workers=workers,
+        )
+
     @abstractmethod
     def get_projection_array(self, channel: str, axis: int, wrap_with_dask: bool = False) -> Any:
         pass
@@ -0,0 +1,263 @@
+import itertools
+import threading
+from collections import OrderedDict
+from numbers import Integral
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy
+
+
+class ChunkCache:
+    def __init__(self, max_bytes: int):
+        """
+        Thread-safe, byte-bounded, least-recently-used cache of decoded chunks. Chunks are stored read-only, and are
+        evicted least recently used first once the total size of the cached chunks exceeds the maximum size.
+
+        Parameters
+        ----------
+        max_bytes : maximum total size in bytes of the cached chunks.
+        """
+        self._max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._chunks: "OrderedDict[Hashable, numpy.ndarray]" = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # Cached chunks and statistics are not shared with other processes:
+        return self._max_bytes
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def __repr__(self) -> str:
+        return (
+            f"ChunkCache(nbytes={self._nbytes}, max_bytes={self._max_bytes}, chunks={len(self._chunks)}, "
+            + f"hits={self.hits}, misses={self.misses}, hit_rate={self.hit_rate:.3f})"
+        )
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes: int):
+        with self._lock:
+            self._max_bytes = int(max_bytes)
+            self._evict()
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    @property
+    def hit_rate(self) -> float:
+        nb_lookups = self.hits + self.misses
+        return self.hits / nb_lookups if nb_lookups > 0 else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hit_rate,
+                "nbytes": self._nbytes,
+                "max_bytes": self._max_bytes,
+                "chunks": len(self._chunks),
+            }
+
+    def get(self, key: Hashable) -> Optional[numpy.ndarray]:
+        with self._lock:
+            chunk = self._chunks.get(key)
+            if chunk is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._chunks.move_to_end(key)
+            return chunk
+
+    def put(self, key: Hashable, chunk: numpy.ndarray):
+        if chunk.nbytes > self._max_bytes:
+            # would evict everything else, and itself:
+            return
+        chunk.setflags(write=False)
+        with self._lock:
+            previous = self._chunks.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._chunks[key] = chunk
+            self._nbytes += chunk.nbytes
+            self._evict()
+
+    def discard(self, keys: Iterable[Hashable]) -> None:
+        """
+        Removes the chunks of the given keys, if they are cached.
+        """
+        with self._lock:
+            for key in keys:
+                chunk = self._chunks.pop(key, None)
+                if chunk is not None:
+                    self._nbytes -= chunk.nbytes
+
+    def invalidate(self, prefix: Tuple) -> None:
+        """
+        Removes all chunks whose key starts with the given prefix.
+        """
+        with self._lock:
+            for key in [k for k in self._chunks if k[: len(prefix)] == prefix]:
+                self._nbytes -= self._chunks.pop(key).nbytes
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def _evict(self):
+        while self._nbytes > self._max_bytes and self._chunks:
+            _, chunk = self._chunks.popitem(last=False)
+            self._nbytes -= chunk.nbytes
+            self.evictions += 1
+
+
+class CachedArray:
+    def __init__(self, array: Any, cache: ChunkCache):
+        """
+        Wraps a zarr array so that reads go through a cache of decoded chunks. Only integer and slice (of positive
+        step) indexing is served from the cache, other selections are read from the zarr array directly. Writes by
+        indexing go through to the zarr array and invalidate the chunks they touch, writes through other methods of
+        the zarr array (oindex, set_*_selection, ...) bypass the cache. Other attributes are those of the zarr array.
+
+        Parameters
+        ----------
+        array : zarr array to wrap.
+        cache : cache of decoded chunks, can be shared by several arrays.
+        """
+        self._array = array
+        self._cache = cache
+        self._cache_prefix = (id(array.chunk_store), array.path)
+
+    @property
+    def array(self) -> Any:
+        return self._array
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name == "_array":
+            raise AttributeError(name)
+        return getattr(self._array, name)
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+    def __array__(self, dtype=None) -> numpy.ndarray:
+        return numpy.asarray(self[...], dtype=dtype)
+
+    def __repr__(self) -> str:
+        return f"CachedArray({self._array!r})"
+
+    def __getitem__(self, key) -> Any:
+        selection = self._normalise_key(key)
+        if selection is None:
+            return self._array[key]
+
+        out_shape = tuple(len(s) for s in selection if isinstance(s, range))
+        out = numpy.empty(out_shape, dtype=self._array.dtype)
+        if out.size == 0:
+            return out
+
+        for chunk_coords, chunk_selection, out_selection in self._chunk_selections(selection):
+            out[out_selection] = self._get_chunk(chunk_coords)[chunk_selection]
+
+        if out.ndim == 0:
+            return out[()]
+        return out
+
+    def __setitem__(self, key, value):
+        self._array[key] = value
+
+        selection = self._normalise_key(key)
+        if selection is None:
+            self._cache.invalidate(self._cache_prefix)
+        else:
+            self._cache.discard(self._cache_prefix + (coords,) for coords, _, _ in self._chunk_selections(selection))
+
+    def _get_chunk(self, chunk_coords: Tuple[int, ...]) -> numpy.ndarray:
+        key = self._cache_prefix + (chunk_coords,)
+        chunk = self._cache.get(key)
+        if chunk is None:
+            # Edge chunks are returned trimmed to the bounds of the array:
+            chunk = numpy.asarray(self._array.get_block_selection(chunk_coords))
+            self._cache.put(key, chunk)
+        return chunk
+
+    def _normalise_key(self, key) -> Optional[List]:
+        # Returns, for each axis, an integer or a range of indices, or None if the key isn't supported:
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        nb_ellipsis = sum(1 for k in key if k is Ellipsis)
+        if nb_ellipsis > 1:
+            return None
+        if nb_ellipsis == 1:
+            index = next(i for i, k in enumerate(key) if k is Ellipsis)
+            key = key[:index] + (slice(None),) * (self._array.ndim - len(key) + 1) + key[index + 1 :]
+
+        if len(key) > self._array.ndim:
+            return None
+        key = key + (slice(None),) * (self._array.ndim - len(key))
+
+        selection = []
+        for k, length in zip(key, self._array.shape):
+            if isinstance(k, Integral) and not isinstance(k, (bool, numpy.bool_)):
+                if not -length <= k < length:
+                    raise IndexError(f"Index {k} is out of bounds for axis of length {length}")
+                selection.append(int(k) % length)
+            elif isinstance(k, slice) and (k.step is None or k.step > 0):
+                selection.append(range(*k.indices(length)))
+            else:
+                return None
+        return selection
+
+    def _chunk_selections(self, selection: List) -> Iterator[Tuple[Tuple[int, ...], Tuple, Tuple]]:
+        # Yields the coordinates of the chunks intersecting the selection, and the selections within each chunk
+        # and within the output array:
+        per_axis = []
+        for s, chunk_length in zip(selection, self._array.chunks):
+            if isinstance(s, Integral):
+                index = s // chunk_length
+                per_axis.append([(index, s - index * chunk_length, None)])
+                continue
+
+            axis_selections = []
+            if len(s) > 0:
+                for index in range(s[0] // chunk_length, s[-1] // chunk_length + 1):
+                    chunk_start = index * chunk_length
+                    chunk_stop = min(chunk_start + chunk_length, s.stop)
+                    # first selected index within the chunk:
+                    first = s.start + -(-max(0, chunk_start - s.start) // s.step) * s.step
+                    if first >= chunk_stop:
+                        continue
+                    out_start = (first - s.start) // s.step
+                    out_stop = out_start + len(range(first, chunk_stop, s.step))
+                    axis_selections.append(
+                        (
+                            index,
+                            slice(first - chunk_start, chunk_stop - chunk_start, s.step),
+                            slice(out_start, out_stop),
+                        )
+                    )
+            per_axis.append(axis_selections)
+
+        for combination in itertools.product(*per_axis):
+            chunk_coords = tuple(c[0] for c in combination)
+            chunk_selection = tuple(c[1] for c in combination)
+            out_selection = tuple(c[2] for c in combination if c[2] is not None)
+            yield chunk_coords, chunk_selection, out_selection
@@ -0,0 +1,418 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from arbol.arbol import aprint
+from zarr.storage import normalize_storage_path
+
+# Path of the metrics endpoint, outside of the hierarchy of dexp datasets:
+metrics_path = "/_dexp/metrics"
+
+_metadata_keys = (".zarray", ".zgroup", ".zattrs", ".zmetadata")
+_max_header_bytes = 2 ** 16
+_range_pattern = re.compile(r"^bytes=(\d*)-(\d*)$")
+_reasons = {
+    200: "OK",
+    204: "No Content",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    500: "Internal Server Error",
+}
+
+
+class ChunkServer:
+    def __init__(
+        self,
+        store: Any,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        workers: int = 8,
+        cache_size: int = 2 ** 28,
+        keep_alive_timeout: float = 60,
+        report_interval: Optional[float] = 60,
+    ):
+        """
+        Asynchronous HTTP server of the keys of a zarr store, to be read by zarr clients over HTTP (fsspec, napari).
+        Chunks are served as they are stored, already compressed, and are never decoded or recompressed. Many
+        connections are handled concurrently by an asyncio event loop, store reads are done by a pool of threads,
+        and concurrent requests for the same key share a single store read.
+
+        Responses carry a content-based ETag: requests with a matching If-None-Match header get an empty
+        '304 Not Modified' response, so that clients revalidating their caches do not download chunks again.
+        Single byte ranges are supported. Recently served keys are kept in an in-memory, least-recently-used,
+        hot-chunk cache, which assumes that the store is not modified while it is served. Request and throughput
+        metrics are reported periodically, at the end, and on the metrics endpoint (see metrics_path) as JSON.
+
+        Parameters
+        ----------
+        store : zarr store to serve, read-only access.
+        host : host to serve from.
+        port : port to serve from, 0 for any free port (see port once started).
+        workers : number of threads reading from the store.
+        cache_size : size in bytes of the hot-chunk cache, 0 to disable it.
+        keep_alive_timeout : time in seconds after which idle connections are closed.
+        report_interval : time in seconds between metrics reports, None for no periodic reports.
+        """
+        self._store = store
+        self.host = host
+        self._port = port
+        self._workers = max(1, workers)
+        self._cache_size = max(0, int(cache_size))
+        self._keep_alive_timeout = keep_alive_timeout
+        self._report_interval = report_interval
+
+        # key -> (data, etag), in least-recently-used order, only accessed from the event loop:
+        self._cache: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._cache_nbytes = 0
+        # key -> future of the store read in progress:
+        self._reads: Dict[str, asyncio.Future] = {}
+
+        self._loop = None
+        self._executor = None
+        self._stopping = None
+        self._started = threading.Event()
+        self._connections: Set[asyncio.Task] = set()
+        self._reset_metrics()
+
+    @property
+    def port(self) -> int:
+        """Port served from, the port actually bound once started if the given port was 0"""
+        return self._port
+
+    def run(self):
+        """
+        Serves until stop is called, or until interrupted (KeyboardInterrupt).
+        """
+        asyncio.run(self._run())
+
+    def wait_until_started(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the server listens, for servers run from another thread. Returns False on timeout.
+        """
+        return self._started.wait(timeout)
+
+    def stop(self):
+        """
+        Stops the server, can be called from any thread, and once the server stopped.
+        """
+        loop = self._loop
+        if loop is not None and self._stopping is not None:
+            try:
+                loop.call_soon_threadsafe(self._stopping.set)
+            except RuntimeError:
+                # the event loop closed in the meantime, the server already stopped:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Returns request and throughput metrics since the server started.
+        """
+        uptime = max(1e-9, time.monotonic() - self._start_time)
+        nb_lookups = self._cache_hits + self._cache_misses
+        return {
+            "uptime": uptime,
+            "requests": self._nb_requests,
+            "responses": dict(self._nb_responses),
+            "requests_per_second": self._nb_requests / uptime,
+            "bytes_sent": self._bytes_sent,
+            "throughput_mb_per_second": self._bytes_sent / uptime / 1e6,
+            "mean_latency_ms": 1000 * self._total_latency / max(1, self._nb_requests),
+            "active_connections": len(self._connections),
+            "concurrent_requests": self._concurrent_requests,
+            "max_concurrent_requests": self._max_concurrent_requests,
+            "store_reads": self._store_reads,
+            "store_bytes_read": self._store_bytes_read,
+            "cache_hits": self._cache_hits,
+            "cache_misses": self._cache_misses,
+            "cache_hit_rate": self._cache_hits / nb_lookups if nb_lookups > 0 else 0.0,
+            "cache_nbytes": self._cache_nbytes,
+            "cache_max_bytes": self._cache_size,
+        }
+
+    def _reset_metrics(self):
+        self._start_time = time.monotonic()
+        self._nb_requests = 0
+        self._nb_responses = defaultdict(int)
+        self._bytes_sent = 0
+        self._total_latency = 0.0
+        self._concurrent_requests = 0
+        self._max_concurrent_requests = 0
+        self._store_reads = 0
+        self._store_bytes_read = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _report(self):
+        metrics = self.metrics()
+        aprint(
+            f"Served {metrics['requests']} requests ({metrics['requests_per_second']:.1f}/s), "
+            + f"{metrics['bytes_sent'] / 1e6:.1f} MB ({metrics['throughput_mb_per_second']:.2f} MB/s), "
+            + f"mean latency: {metrics['mean_latency_ms']:.2f} ms, "
+            + f"max concurrent requests: {metrics['max_concurrent_requests']}, "
+            + f"cache hit rate: {metrics['cache_hit_rate']:.3f}, responses: {metrics['responses']}"
+        )
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="chunk_server")
+        self._reset_metrics()
+
+        server = await asyncio.start_server(self._handle_connection, self.host, self._port, limit=_max_header_bytes)
+        self._port = server.sockets[0].getsockname()[1]
+        aprint(f"Serving store at: http://{self.host}:{self._port}, metrics at: {metrics_path}")
+        self._started.set()
+
+        reporter = None if self._report_interval is None else asyncio.ensure_future(self._report_periodically())
+        try:
+            await self._stopping.wait()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            server.close()
+            # Closes the open connections, idle connections are kept alive otherwise:
+            connections = list(self._connections)
+            for connection in connections:
+                connection.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            await server.wait_closed()
+            self._executor.shutdown(wait=True)
+            self._report()
+            self._started.clear()
+            self._loop = None
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self._report_interval)
+            self._report()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    header = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self._keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    break
+                keep_alive = await self._handle_request(header, writer)
+        except (ConnectionError, asyncio.CancelledError):
+            # disconnected by the client, or the server is stopping:
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    async def _handle_request(self, header: bytes, writer: asyncio.StreamWriter) -> bool:
+        # Handles one request, returns whether the connection is kept alive:
+        start = time.monotonic()
+        self._nb_requests += 1
+        self._concurrent_requests += 1
+        self._max_concurrent_requests = max(self._max_concurrent_requests, self._concurrent_requests)
+        try:
+            try:
+                method, target, version, headers = _parse_request(header)
+            except ValueError:
+                await self._respond(writer, 400, keep_alive=False)
+                return False
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+            if method == "OPTIONS":
+                # CORS preflight of browser clients:
+                await self._respond(writer, 204, keep_alive=keep_alive)
+            elif method not in ("GET", "HEAD"):
+                await self._respond(writer, 405, keep_alive=keep_alive)
+            elif urlsplit(target).path == metrics_path:
+                body = json.dumps(self.metrics()).encode()
+                await self._respond(writer, 200, body, "application/json", head=method == "HEAD", keep_alive=keep_alive)
+            else:
+                await self._serve_key(writer, method, target, headers, keep_alive)
+            return keep_alive
+        finally:
+            self._concurrent_requests -= 1
+            self._total_latency += time.monotonic() - start
+
+    async def _serve_key(
+        self, writer: asyncio.StreamWriter, method: str, target: str, headers: Dict[str, str], keep_alive: bool
+    ):
+        try:
+            key = normalize_storage_path(unquote(urlsplit(target).path))
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=keep_alive)
+            return
+
+        try:
+            entry = await self._get(key) if key else None
+        except Exception as error:
+            aprint(f"Error while reading key '{key}': {error}")
+            await self._respond(writer, 500, keep_alive=keep_alive)
+            return
+        if entry is None:
+            await self._respond(writer, 404, keep_alive=keep_alive)
+            return
+
+        data, etag = entry
+        content_type = "application/json" if key.rsplit("/", 1)[-1] in _metadata_keys else "application/octet-stream"
+        extra_headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+
+        if etag in (t.strip() for t in headers.get("if-none-match", "").split(",")):
+            await self._respond(writer, 304, extra_headers=extra_headers, keep_alive=keep_alive)
+            return
+
+        status = 200
+        byte_range = headers.get("range")
+        if byte_range is not None:
+            span = _parse_range(byte_range, len(data))
+            if span is None:
+                extra_headers["Content-Range"] = f"bytes */{len(data)}"
+                await self._respond(writer, 416, extra_headers=extra_headers, keep_alive=keep_alive)
+                return
+            first, last = span
+            extra_headers["Content-Range"] = f"bytes {first}-{last}/{len(data)}"
+            data = memoryview(data)[first : last + 1]
+            status = 206
+
+        await self._respond(
+            writer,
+            status,
+            data,
+            content_type,
+            extra_headers=extra_headers,
+            head=method == "HEAD",
+            keep_alive=keep_alive,
+        )
+
+    async def _get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        # Returns the data and ETag of a key, None if the key does not exist:
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache_hits += 1
+            self._cache.move_to_end(key)
+            return entry
+        self._cache_misses += 1
+
+        # Concurrent requests for the same key share the same read:
+        read = self._reads.get(key)
+        if read is None:
+            read = asyncio.ensure_future(self._read(key))
+            self._reads[key] = read
+            read.add_done_callback(lambda _: self._reads.pop(key, None))
+        return await asyncio.shield(read)
+
+    async def _read(self, key: str) -> Optional[Tuple[bytes, str]]:
+        data = await self._loop.run_in_executor(self._executor, self._read_store, key)
+        if data is None:
+            return None
+        self._store_reads += 1
+        self._store_bytes_read += len(data)
+        entry = (data, _etag(data))
+        self._put(key, entry)
+        return entry
+
+    def _read_store(self, key: str) -> Optional[bytes]:
+        try:
+            return bytes(self._store[key])
+        except KeyError:
+            return None
+
+    def _put(self, key: str, entry: Tuple[bytes, str]):
+        nbytes = len(entry[0])
+        if nbytes > self._cache_size:
+            return
+        previous = self._cache.pop(key, None)
+        if previous is not None:
+            self._cache_nbytes -= len(previous[0])
+        self._cache[key] = entry
+        self._cache_nbytes += nbytes
+        while self._cache_nbytes > self._cache_size:
+            _, (evicted, _) = self._cache.popitem(last=False)
+            self._cache_nbytes -= len(evicted)
+
+    async def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: Any = b"",
+        content_type: str = "application/octet-stream",
+        extra_headers: Optional[Dict[str, str]] = None,
+        head: bool = False,
+        keep_alive: bool = True,
+    ):
+        headers = {
+            "Date": formatdate(usegmt=True),
+            "Server": "dexp",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "*",
+            "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+            "Access-Control-Expose-Headers": "ETag, Content-Range, Content-Length",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        if status not in (204, 304):
+            headers["Content-Type"] = content_type
+            headers["Content-Length"] = str(len(body))
+        if extra_headers is not None:
+            headers.update(extra_headers)
+
+        send_body = not head and status not in (204, 304) and len(body) > 0
+        # Counted before writing, the response is complete for the client as soon as its bytes are written:
+        if send_body:
+            self._bytes_sent += len(body)
+        self._nb_responses[status] += 1
+
+        lines = [f"HTTP/1.1 {status} {_reasons[status]}"] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if send_body:
+            writer.write(body)
+        # Waits for the data to be sent when the transport buffers are full:
+        await writer.drain()
+
+
+def _parse_request(header: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+    lines = header.decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+        raise ValueError(f"Invalid request line: {lines[0]}")
+    method, target, version = parts
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, version, headers
+
+
+def _parse_range(byte_range: str, size: int) -> Optional[Tuple[int, int]]:
+    # Returns the first and last bytes of a single byte range, None if not satisfiable:
+    match = _range_pattern.match(byte_range.strip())
+    if match is None or size == 0:
+        return None
+    first, last = match.groups()
+    if first == "":
+        if last == "":
+            return None
+        # suffix range, the last bytes:
+        return max(0, size - int(last)), size - 1
+    first = int(first)
+    last = size - 1 if last == "" else min(int(last), size - 1)
+    if first > last:
+        return None
+    return first, last
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
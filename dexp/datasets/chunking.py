@@ -0,0 +1,190 @@
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+import numpy
+from arbol import aprint, asection
+
+# Access patterns, and their default target compressed chunk size in bytes:
+#  'stack' : whole time points are read or written at once (deconvolution, fusion, deskewing, ...),
+#  'slice' : single planes (z slices) are accessed (viewing slice by slice, 2D processing),
+#  'view'  : arbitrary sub-volumes are accessed (interactive viewing, cropping).
+access_patterns = {"stack": 16 * 2 ** 20, "slice": 2 ** 20, "view": 2 ** 20}
+
+# Typical compression ratio of microscopy data, used to go from compressed to uncompressed chunk sizes:
+_default_compression_ratio = 2.0
+
+# Blosc can't compress buffers larger than this:
+_max_chunk_bytes = 2 ** 31 - 1
+
+
+def compute_chunks(
+    shape: Sequence[int],
+    dtype: Union[str, numpy.dtype],
+    access_pattern: str = "view",
+    chunk_bytes: Optional[int] = None,
+    compression_ratio: float = _default_compression_ratio,
+) -> Tuple[int, ...]:
+    """
+    Computes the chunk shape of a (t, [z,] y, x) array for a given access pattern and target compressed chunk size.
+    Chunks always have a size of one along time, so that time points can be written independently.
+
+    Parameters
+    ----------
+    shape : shape of the array, time is the first axis.
+    dtype : dtype of the array.
+    access_pattern : 'stack' for chunks spanning whole planes, as deep as the target size allows, 'slice' for
+        chunks one plane deep, and 'view' for chunks of balanced shape.
+    chunk_bytes : target compressed chunk size in bytes, if None the default of the access pattern is used.
+    compression_ratio : expected compression ratio, used to estimate the uncompressed chunk size.
+
+    Returns
+    -------
+    Chunk shape
+    """
+    if access_pattern not in access_patterns:
+        raise ValueError(f"Unknown access pattern: '{access_pattern}', must be one of: {tuple(access_patterns)}")
+
+    if chunk_bytes is None:
+        chunk_bytes = access_patterns[access_pattern]
+    target_bytes = min(_max_chunk_bytes, chunk_bytes * compression_ratio)
+    nb_voxels = max(1, int(target_bytes // numpy.dtype(dtype).itemsize))
+
+    spatial_shape = [max(1, int(s)) for s in shape[1:]]
+    if len(spatial_shape) == 0:
+        return (1,)
+
+    if access_pattern == "stack":
+        # Whole planes, split in halves along y then x if a plane is too large, then as deep as possible:
+        plane = spatial_shape[-2:]
+        while numpy.prod(plane) > nb_voxels:
+            axis = 0 if plane[0] > 1 else -1
+            plane[axis] = -(-plane[axis] // 2)
+        depth = [1] * (len(spatial_shape) - 2)
+        if depth:
+            depth[-1] = min(spatial_shape[-3], max(1, nb_voxels // int(numpy.prod(plane))))
+        chunks = depth + plane
+    else:
+        if access_pattern == "slice" and len(spatial_shape) > 2:
+            nb_balanced_axes = 2
+        else:
+            nb_balanced_axes = len(spatial_shape)
+        # Balanced shape: the largest axis is halved until the chunk is small enough:
+        balanced = spatial_shape[-nb_balanced_axes:]
+        while numpy.prod(balanced) > nb_voxels:
+            axis = int(numpy.argmax(balanced))
+            balanced[axis] = -(-balanced[axis] // 2)
+        chunks = [1] * (len(spatial_shape) - nb_balanced_axes) + balanced
+
+    return (1,) + tuple(int(c) for c in chunks)
+
+
+def benchmark_chunks(
+    shape: Sequence[int],
+    dtype: Union[str, numpy.dtype] = numpy.uint16,
+    access_pattern: str = "view",
+    chunk_bytes: Optional[int] = None,
+    chunks: Optional[Sequence[int]] = None,
+    path: Optional[str] = None,
+    codec: str = "zstd",
+    clevel: int = 3,
+    nb_reads: int = 16,
+) -> Dict[str, Any]:
+    """
+    Measures the write and read throughput of a chunking policy on the local storage, by writing a temporary
+    dataset of synthetic data and reading it back with the given access pattern.
+
+    Parameters
+    ----------
+    shape : shape of the dataset to write, for example a few time points of the actual shape.
+    dtype : dtype of the dataset.
+    access_pattern : access pattern used to compute the chunks (if not given) and to read the dataset.
+    chunk_bytes : target compressed chunk size in bytes, see compute_chunks.
+    chunks : chunks to benchmark, if None they are computed from the access pattern and target chunk size.
+    path : folder in which the temporary dataset is written, current folder by default.
+    codec : compression codec.
+    clevel : compression level.
+    nb_reads : number of planes or sub-volumes read for the 'slice' and 'view' access patterns.
+
+    Returns
+    -------
+    Dictionary with the chunk shape, the measured compression ratio, and the write and read throughputs in MB/s
+    """
+    from dexp.datasets import ZDataset
+
+    if chunks is None:
+        chunks = compute_chunks(shape, dtype, access_pattern=access_pattern, chunk_bytes=chunk_bytes)
+    chunks = tuple(chunks)
+
+    rng = numpy.random.default_rng(0)
+    # Smooth background with noise, compresses similarly to microscopy data:
+    stack_shape = tuple(shape[1:])
+    stack = numpy.zeros(stack_shape, dtype=numpy.float32)
+    stack += 100 + 50 * numpy.sin(numpy.linspace(0, 4 * numpy.pi, stack_shape[-1], dtype=numpy.float32))
+    stack += rng.normal(scale=10, size=stack_shape).astype(numpy.float32)
+    stack = stack.astype(dtype)
+
+    stack_bytes = stack.nbytes
+    total_bytes = stack_bytes * shape[0]
+
+    folder = tempfile.mkdtemp(prefix="zz__chunk_benchmark__", dir=os.getcwd() if path is None else path)
+    try:
+        with asection(f"Benchmarking chunks {chunks} for access pattern '{access_pattern}' in {folder}"):
+            dataset = ZDataset(os.path.join(folder, "benchmark.zarr"), mode="w")
+            dataset.add_channel(
+                "benchmark",
+                shape=shape,
+                dtype=dtype,
+                chunks=chunks,
+                enable_projections=False,
+                codec=codec,
+                clevel=clevel,
+            )
+
+            array = dataset.get_array("benchmark")
+
+            start = time.monotonic()
+            for t in range(shape[0]):
+                array[t] = stack
+            write_time = time.monotonic() - start
+
+            compression_ratio = array.nbytes / max(1, array.nbytes_stored)
+
+            start = time.monotonic()
+            read_bytes = 0
+            if access_pattern == "stack":
+                for t in range(shape[0]):
+                    read_bytes += array[t].nbytes
+            else:
+                for _ in range(nb_reads):
+                    t = rng.integers(shape[0])
+                    if access_pattern == "slice" and len(stack_shape) > 2:
+                        read_bytes += array[t, rng.integers(stack_shape[0])].nbytes
+                    else:
+                        # Sub-volumes of a quarter of the size of the stack along each axis:
+                        slicing = [t]
+                        for s in stack_shape:
+                            size = max(1, s // 4)
+                            origin = rng.integers(s - size + 1)
+                            slicing.append(slice(origin, origin + size))
+                        read_bytes += array[tuple(slicing)].nbytes
+            read_time = time.monotonic() - start
+
+            dataset.close()
+
+            results = {
+                "chunks": chunks,
+                "compression_ratio": compression_ratio,
+                "write_throughput": total_bytes / 1e6 / max(1e-9, write_time),
+                "read_throughput": read_bytes / 1e6 / max(1e-9, read_time),
+            }
+            aprint(
+                f"compression ratio: {compression_ratio:.2f}, "
+                + f"write: {results['write_throughput']:.1f} MB/s, read: {results['read_throughput']:.1f} MB/s"
+            )
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return results
@@ -0,0 +1,103 @@
+from numbers import Integral
+from typing import Optional, Tuple
+
+import numpy
+
+
+class CCArray:
+    def __init__(self, dataset, channel: str, time_point: Optional[int] = None):
+        """
+        Lazy array of the stacks of a ClearControl dataset channel, of axes (t, z, y, x), or of a single stack,
+        of axes (z, y, x), if a time point is given. Indexing maps directly to file reads: only the z slabs of the
+        selected time points are read, without building any task graph. Can be wrapped with dask.array.from_array.
+
+        Parameters
+        ----------
+        dataset : ClearControl dataset.
+        channel : channel of the dataset.
+        time_point : if not None, the array is the stack of that time point.
+        """
+        self._dataset = dataset
+        self._channel = channel
+        self._time_points = list(dataset._time_points[channel]) if time_point is None else [time_point]
+        self._single_stack = time_point is not None
+
+        stack_shape = tuple(
+            dataset._channel_shape[channel] if time_point is None else dataset._shapes[(channel, time_point)]
+        )
+        self.shape = stack_shape if self._single_stack else (len(self._time_points),) + stack_shape
+        self.dtype = numpy.dtype(dataset.dtype(channel))
+        self.ndim = len(self.shape)
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype=None) -> numpy.ndarray:
+        return numpy.asarray(self[...], dtype=dtype)
+
+    def __dask_tokenize__(self) -> Tuple:
+        return type(self).__name__, self._dataset.folder, self._channel, tuple(self._time_points), self.shape
+
+    def __repr__(self) -> str:
+        return f"CCArray(channel={self._channel}, shape={self.shape}, dtype={self.dtype})"
+
+    def __getitem__(self, key) -> numpy.ndarray:
+        key = self._normalise_key(key)
+        if self._single_stack:
+            key = (0,) + key
+
+        t_key, z_key, other_keys = key[0], key[1], key[2:]
+
+        if isinstance(t_key, Integral):
+            return self._read(self._time_points[t_key], z_key, other_keys)
+
+        stacks = [self._read(time_point, z_key, other_keys) for time_point in self._time_points[t_key]]
+        if len(stacks) == 0:
+            stack_shape = numpy.empty(self.shape[-3:], dtype=self.dtype)[(z_key,) + other_keys].shape
+            return numpy.empty((0,) + stack_shape, dtype=self.dtype)
+        return numpy.stack(stacks)
+
+    def _normalise_key(self, key) -> Tuple:
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        if any(k is Ellipsis for k in key):
+            index = next(i for i, k in enumerate(key) if k is Ellipsis)
+            key = key[:index] + (slice(None),) * (self.ndim - len(key) + 1) + key[index + 1 :]
+
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for array of dimension {self.ndim}")
+        for k in key:
+            if not isinstance(k, (slice, Integral)):
+                raise IndexError(f"Only integers and slices are supported to index a {type(self).__name__}, not: {k}")
+
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        # negative and out of bounds integer indices:
+        normalised_key = []
+        for k, length in zip(key, self.shape):
+            if isinstance(k, Integral):
+                if not -length <= k < length:
+                    raise IndexError(f"Index {k} is out of bounds for axis of length {length}")
+                k = int(k) % length
+            normalised_key.append(k)
+
+        return tuple(normalised_key)
+
+    def _read(self, time_point: int, z_key, other_keys: Tuple) -> numpy.ndarray:
+        depth = self._dataset._shapes[(self._channel, time_point)][0]
+
+        if isinstance(z_key, Integral):
+            slab = self._dataset._get_slab_for_stack_file(self._channel, time_point, z_key, z_key + 1)
+            return numpy.asarray(slab[(0,) + other_keys])
+
+        # Only the slab spanning the selected z slices is read:
+        z_range = range(*z_key.indices(depth))
+        if len(z_range) == 0:
+            return numpy.empty((0,) + self.shape[-2:], dtype=self.dtype)[(slice(None),) + other_keys]
+        z_first, z_last = min(z_range), max(z_range)
+        slab = self._dataset._get_slab_for_stack_file(self._channel, time_point, z_first, z_last + 1)
+        z_stop = z_range.stop - z_first
+        z_key = slice(z_range.start - z_first, z_stop if z_stop >= 0 else None, z_range.step)
+
+        return numpy.asarray(slab[(z_key,) + other_keys])
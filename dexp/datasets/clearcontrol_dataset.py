@@ -1,20 +1,29 @@
 import os
 import re
+import threading
 from fnmatch import fnmatch
 from os import listdir
 from os.path import exists, join
-from typing import Any, Sequence, Tuple
+from typing import Any, Dict, Sequence, Tuple
 
 import numpy
-from arbol.arbol import aprint
+from arbol.arbol import aprint, asection
 from cachey import Cache
-from dask import array, delayed
+from dask import array
 from numpy import uint16
 
 from dexp.datasets.base_dataset import BaseDataset
-from dexp.io.compress_array import decompress_array
+from dexp.datasets.clearcontrol_array import CCArray
+from dexp.io.compress_array import (
+    compressed_array_index,
+    decompress_array,
+    decompress_array_range,
+)
 from dexp.utils.config import config_blosc
 
+# Raw stacks are stored as little-endian unsigned 16 bit integers:
+_raw_dtype = numpy.dtype(uint16).newbyteorder("L")
+
 
 class CCDataset(BaseDataset):
     def __init__(self, path, cache_size=8e9):
@@ -53,6 +62,10 @@ class CCDataset(BaseDataset):
 
         self.cache = Cache(cache_size)  # Leverage two gigabytes of memory
 
+        # Indices of the Blosc frames of compressed stacks, per channel and time point:
+        self._frame_indices = {}
+        self._frame_index_lock = threading.Lock()
+
     def _parse_channel(self, channel):
 
         index_file = self._index_files[channel]
@@ -109,10 +122,8 @@ class CCDataset(BaseDataset):
             if file_name.endswith(".raw"):
                 aprint(f"Accessing file: {file_name}")
 
-                dt = numpy.dtype(uint16)
-                dt = dt.newbyteorder("L")
-
-                array = numpy.fromfile(file_name, dtype=dt)
+                # Memory-mapped, only the pages that are accessed are read from disk:
+                array = numpy.memmap(file_name, dtype=_raw_dtype, mode="r", shape=shape)
 
             elif file_name.endswith(".blc"):
                 array = numpy.empty(shape=shape, dtype=dtype)
@@ -131,28 +142,112 @@ class CCDataset(BaseDataset):
             aprint(f"Could not find file: {file_name} for array of shape: {shape}")
             return numpy.zeros(shape, dtype=uint16)
 
-    def _get_slice_array_for_stack_file_and_z(self, file_name, shape, z):
-
-        try:
-            if file_name.endswith(".raw"):
-                aprint(f"Accessing file: {file_name} at z={z}")
-
-                length = shape[1] * shape[2] * numpy.dtype(uint16).itemsize
-                offset = z * length
+    def _get_slab_for_stack_file(self, channel: str, time_point: int, z_start: int, z_stop: int) -> numpy.ndarray:
+        file_name = self._get_stack_file_name(channel, time_point)
+        shape = self._shapes[(channel, time_point)]
 
-                dt = numpy.dtype(uint16)
-                dt = dt.newbyteorder("L")
+        if file_name.endswith(".raw"):
+            return self._get_array_for_stack_file(file_name, shape=shape, dtype=uint16)[z_start:z_stop]
 
-                array = numpy.fromfile(file_name, offset=offset, count=length, dtype=dt)
-            elif file_name.endswith(".blc"):
-                raise NotImplementedError("This type of access is not yet supported")
+        slab = numpy.empty((z_stop - z_start,) + tuple(shape[1:]), dtype=uint16)
+        plane_length = int(numpy.prod(shape[1:])) * slab.itemsize
+        try:
+            index = self._get_frame_index(channel, time_point)
+            # Only the Blosc frames overlapping with the slab are read, and decompressed in parallel:
+            return decompress_array_range(
+                file_name, index, z_start * plane_length, z_stop * plane_length, slab, workers=-1
+            )
 
-            array = array.reshape(shape[1:])
-            return array
+        except FileNotFoundError:
+            aprint(f"Could not find file: {file_name} for array of shape: {shape}")
+            slab[...] = 0
+            return slab
+
+    def _z_chunks(self, channel: str, time_point: int, per_z_slice: bool) -> Tuple[int, ...]:
+        """
+        Returns the chunks along z of a stack: one per z slice, or the whole stack if not per_z_slice. Compressed
+        stacks are decompressed whole Blosc frames at a time, their chunks thus start at the z slices at which
+        frames start, so that each frame is decompressed once instead of once per z slice.
+        """
+        shape = self._shapes[(channel, time_point)]
+        depth = shape[0]
+        file_name = self._get_stack_file_name(channel, time_point)
+        if not per_z_slice:
+            return (depth,)
+        if not file_name.endswith(".blc"):
+            return (1,) * depth
 
+        try:
+            index = self._get_frame_index(channel, time_point)
         except FileNotFoundError:
-            aprint(f"Could  not find file: {file_name} for array of shape: {shape} at z={z}")
-            return numpy.zeros(shape[1:], dtype=uint16)
+            return (depth,)
+        plane_length = int(numpy.prod(shape[1:])) * _raw_dtype.itemsize
+        starts = sorted({0} | {int(offset) // plane_length for offset in index[:, 2] if offset < depth * plane_length})
+        return tuple(stop - start for start, stop in zip(starts, starts[1:] + [depth]))
+
+    def _get_frame_index_file_name(self, channel: str) -> str:
+        return join(self.folder, f"{channel}.blc_index.npy")
+
+    def _get_frame_index(self, channel: str, time_point: int) -> numpy.ndarray:
+        """
+        Returns the index of the Blosc frames of a compressed stack (see compressed_array_index).
+        Indices are built once for all time points of a channel, and cached in a file next to the dataset,
+        the index of a stack is rebuilt if the size of its file changed.
+        """
+        with self._frame_index_lock:
+            if channel not in self._frame_indices:
+                self._frame_indices[channel] = self._load_frame_indices(channel)
+            frame_indices = self._frame_indices[channel]
+
+            file_name = self._get_stack_file_name(channel, time_point)
+            file_size = os.path.getsize(file_name)
+
+            if time_point not in frame_indices or frame_indices[time_point][0] != file_size:
+                with open(file_name, "rb") as compressed_file:
+                    frame_indices[time_point] = (file_size, compressed_array_index(compressed_file))
+                self._save_frame_indices(channel)
+
+            return frame_indices[time_point][1]
+
+    def _load_frame_indices(self, channel: str) -> Dict[int, Tuple[int, numpy.ndarray]]:
+        frame_indices = {}
+        index_file_name = self._get_frame_index_file_name(channel)
+
+        if exists(index_file_name):
+            # rows of: time point, file size, and frame index:
+            rows = numpy.load(index_file_name)
+            for time_point in numpy.unique(rows[:, 0]):
+                time_point_rows = rows[rows[:, 0] == time_point]
+                frame_indices[int(time_point)] = (int(time_point_rows[0, 1]), time_point_rows[:, 2:])
+            return frame_indices
+
+        with asection(f"Building index of compressed stacks for channel: {channel}"):
+            for time_point in self._time_points[channel]:
+                file_name = self._get_stack_file_name(channel, time_point)
+                if exists(file_name):
+                    with open(file_name, "rb") as compressed_file:
+                        frame_indices[time_point] = (
+                            os.path.getsize(file_name),
+                            compressed_array_index(compressed_file),
+                        )
+        self._frame_indices[channel] = frame_indices
+        self._save_frame_indices(channel)
+
+        return frame_indices
+
+    def _save_frame_indices(self, channel: str):
+        rows = [
+            numpy.concatenate([numpy.full((len(index), 2), (time_point, file_size), dtype=numpy.int64), index], axis=1)
+            for time_point, (file_size, index) in sorted(self._frame_indices[channel].items())
+        ]
+        index_file_name = self._get_frame_index_file_name(channel)
+        try:
+            with open(index_file_name + ".tmp", "wb") as index_file:
+                numpy.save(index_file, numpy.concatenate(rows) if rows else numpy.zeros((0, 6), dtype=numpy.int64))
+            os.replace(index_file_name + ".tmp", index_file_name)
+        except OSError as error:
+            # for example for read-only datasets, the index is then only kept in memory:
+            aprint(f"Could not save index of compressed stacks to: {index_file_name} ({error})")
 
     def close(self):
         # Nothing to do...
@@ -186,46 +281,39 @@ class CCDataset(BaseDataset):
     def append_metadata(self, metadata: dict):
         raise NotImplementedError("Method append_metadata is not available for a joined dataset!")
 
-    def get_array(self, channel: str, per_z_slice: bool = True, wrap_with_dask: bool = False):
-
-        # Lazy and memorized version of get_stack:
-        lazy_get_stack = delayed(self.get_stack, pure=True)
-
-        # Lazily load each stack for each time point:
-        lazy_stacks = [lazy_get_stack(channel, time_point, per_z_slice) for time_point in self._time_points[channel]]
+    def get_array(self, channel: str, per_z_slice: bool = True, wrap_with_dask: bool = True):
+        """
+        Returns the array of a channel, a dask array by default, or the lazy array that the dask array wraps if
+        wrap_with_dask is False: indexing it directly reads the stacks, without building a task graph.
+        """
 
-        # Construct a small Dask array for every lazy value:
-        arrays = [
-            array.from_delayed(lazy_stack, dtype=uint16, shape=self._channel_shape[channel])
-            for lazy_stack in lazy_stacks
-        ]
+        # Lazy array, indexing reads the stacks directly:
+        lazy_array = CCArray(self, channel)
 
-        stacked_array = array.stack(arrays, axis=0)  # Stack all small Dask arrays into one
+        if wrap_with_dask:
+            shape = lazy_array.shape
+            # All stacks of a channel are compressed the same way, their chunks along z are those of the first one:
+            z_chunks = self._z_chunks(channel, self._time_points[channel][0], per_z_slice)
+            chunks = ((1,) * shape[0], z_chunks) + tuple((s,) for s in shape[2:])
+            return array.from_array(lazy_array, chunks=chunks)
 
-        return stacked_array
+        return lazy_array
 
     def get_stack(self, channel, time_point, per_z_slice=True, wrap_with_dask: bool = False):
 
         file_name = self._get_stack_file_name(channel, time_point)
         shape = self._shapes[(channel, time_point)]
 
-        if per_z_slice and not self._is_compressed:
-
-            lazy_get_slice_array_for_stack_file_and_z = delayed(
-                self.cache.memoize(self._get_slice_array_for_stack_file_and_z), pure=True
-            )
-
-            # Lazily load each stack for each time point:
-            lazy_stacks = [lazy_get_slice_array_for_stack_file_and_z(file_name, shape, z) for z in range(0, shape[0])]
+        if wrap_with_dask:
+            # z slices or slabs are read on access:
+            chunks = (self._z_chunks(channel, time_point, per_z_slice),) + tuple((s,) for s in shape[1:])
+            return array.from_array(CCArray(self, channel, time_point), chunks=chunks)
 
-            arrays = [array.from_delayed(lazy_stack, dtype=uint16, shape=shape[1:]) for lazy_stack in lazy_stacks]
-
-            stack = array.stack(arrays, axis=0)
-
-        else:
-            stack = self._get_array_for_stack_file(file_name, shape=shape, dtype=uint16)
+        if file_name.endswith(".blc"):
+            return self._get_slab_for_stack_file(channel, time_point, 0, shape[0])
 
-        return stack
+        # Raw stacks are memory-mapped, and thus always read per z slice, on access:
+        return self._get_array_for_stack_file(file_name, shape=shape, dtype=uint16)
 
     def add_channel(self, name: str, shape: Tuple[int, ...], dtype, enable_projections: bool = True, **kwargs) -> Any:
         raise NotImplementedError("Not implemented!")
@@ -0,0 +1,245 @@
+import math
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy
+
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+# Quantile levels recorded for each time point, denser in the tails where contrast limits are usually chosen:
+default_quantile_levels = tuple(
+    float(q)
+    for q in numpy.unique(
+        numpy.concatenate(
+            (
+                [0.0, 0.0001, 0.001, 0.005],
+                numpy.round(numpy.linspace(0.01, 0.99, 99), 2),
+                [0.995, 0.999, 0.9999, 1.0],
+            )
+        )
+    )
+)
+
+default_nb_bins = 256
+
+# Maximum number of voxels sampled from a stack for its histogram and quantiles:
+default_max_samples = 2 ** 20
+
+_fields = ("min", "max", "mean", "std")
+
+
+def statistics_length(nb_bins: int = default_nb_bins, quantile_levels: Sequence[float] = default_quantile_levels):
+    """
+    Returns the length of the row of statistics of a time point: min, max, mean, std, quantiles and histogram.
+    """
+    return len(_fields) + len(quantile_levels) + nb_bins
+
+
+def sample_values(image: xpArray, max_samples: int = default_max_samples) -> numpy.ndarray:
+    """
+    Samples the voxels of an image at a regular stride, all voxels are returned if there are fewer than the maximum
+    number of samples. The stride is chosen coprime with the size of the planes of the image so that the samples
+    do not all fall on the same rows or columns.
+
+    Parameters
+    ----------
+    image : image to sample.
+    max_samples : maximum number of samples.
+
+    Returns
+    -------
+    1D numpy array of samples.
+    """
+    values = image.reshape(-1)
+    stride = max(1, -(-values.size // max(1, max_samples)))
+    if stride > 1:
+        plane_size = int(numpy.prod(image.shape[-2:], dtype=numpy.int64))
+        while math.gcd(stride, plane_size) != 1:
+            stride += 1
+    return Backend.to_numpy(values[::stride])
+
+
+def merge_statistics(stats: Sequence[Dict[str, float]], sizes: Sequence[int]) -> Dict[str, float]:
+    """
+    Merges the statistics (min, max, mean, std) of several disjoint parts of an image, as returned by
+    multi_projection, into the statistics of the whole.
+
+    Parameters
+    ----------
+    stats : statistics of each part.
+    sizes : number of voxels of each part.
+    """
+    size = sum(sizes)
+    mean = sum(s["mean"] * n for s, n in zip(stats, sizes)) / max(1, size)
+    squares = sum((s["std"] ** 2 + s["mean"] ** 2) * n for s, n in zip(stats, sizes)) / max(1, size)
+    return {
+        "min": min(s["min"] for s in stats),
+        "max": max(s["max"] for s in stats),
+        "mean": mean,
+        "std": max(0.0, squares - mean ** 2) ** 0.5,
+    }
+
+
+def statistics_row(
+    stats: Dict[str, float],
+    samples: numpy.ndarray,
+    size: int,
+    nb_bins: int = default_nb_bins,
+    quantile_levels: Sequence[float] = default_quantile_levels,
+) -> numpy.ndarray:
+    """
+    Builds the row of statistics of a time point from its exact min, max, mean and std, and from samples of its
+    voxels, from which the quantiles and the histogram are estimated. The histogram spans the range [min, max],
+    and its counts are scaled to the number of voxels of the stack.
+
+    Parameters
+    ----------
+    stats : min, max, mean and std of the stack, as returned by multi_projection.
+    samples : samples of the voxels of the stack, see sample_values.
+    size : number of voxels of the stack.
+    nb_bins : number of bins of the histogram.
+    quantile_levels : levels of the recorded quantiles.
+
+    Returns
+    -------
+    Row of statistics as a float64 numpy array, see statistics_length.
+    """
+    row = numpy.full(statistics_length(nb_bins, quantile_levels), numpy.nan, dtype=numpy.float64)
+    if stats is None or stats["min"] is None or samples.size == 0:
+        return row
+
+    minimum, maximum = stats["min"], stats["max"]
+    row[: len(_fields)] = [stats[field] for field in _fields]
+
+    samples = samples.astype(numpy.float64, copy=False)
+    quantiles = numpy.quantile(samples, quantile_levels)
+    # The extreme quantiles are exact, samples may miss the extreme values:
+    quantiles = numpy.clip(quantiles, minimum, maximum)
+    quantiles[numpy.asarray(quantile_levels) == 0] = minimum
+    quantiles[numpy.asarray(quantile_levels) == 1] = maximum
+    row[len(_fields) : len(_fields) + len(quantile_levels)] = quantiles
+
+    counts, _ = numpy.histogram(samples, bins=nb_bins, range=_histogram_range(minimum, maximum))
+    row[len(_fields) + len(quantile_levels) :] = counts * (size / samples.size)
+    return row
+
+
+def _histogram_range(minimum: float, maximum: float) -> Tuple[float, float]:
+    return minimum, (maximum if maximum > minimum else minimum + 1)
+
+
+class IntensityStatistics:
+    def __init__(self, rows: numpy.ndarray, quantile_levels: Sequence[float] = default_quantile_levels):
+        """
+        Intensity statistics of one or several time points of a channel, as recorded by ZDataset at write time:
+        exact min, max, mean and standard deviation, and approximate quantiles and histogram estimated from samples.
+        Values are NaN for time points not written yet. For a single time point values are floats, otherwise arrays
+        with one entry per time point.
+
+        Parameters
+        ----------
+        rows : row of statistics of a time point, or array of rows of several time points.
+        quantile_levels : levels of the recorded quantiles.
+        """
+        rows = numpy.asarray(rows, dtype=numpy.float64)
+        self._single = rows.ndim == 1
+        self._rows = numpy.atleast_2d(rows)
+        self._quantile_levels = numpy.asarray(quantile_levels, dtype=numpy.float64)
+        self.nb_bins = self._rows.shape[1] - len(_fields) - len(self._quantile_levels)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __repr__(self) -> str:
+        if self._single:
+            return (
+                f"IntensityStatistics(min={self.min}, max={self.max}, mean={self.mean:.3f}, std={self.std:.3f}, "
+                + f"median={self.quantile(0.5):.3f})"
+            )
+        return f"IntensityStatistics(time_points={len(self)}, recorded={int(self.recorded.sum())})"
+
+    def _value(self, values: numpy.ndarray) -> Union[float, numpy.ndarray]:
+        return float(values[0]) if self._single else values
+
+    @property
+    def recorded(self) -> Union[bool, numpy.ndarray]:
+        """Whether statistics were recorded for the time points"""
+        recorded = ~numpy.isnan(self._rows[:, 0])
+        return bool(recorded[0]) if self._single else recorded
+
+    @property
+    def min(self) -> Union[float, numpy.ndarray]:
+        return self._value(self._rows[:, 0])
+
+    @property
+    def max(self) -> Union[float, numpy.ndarray]:
+        return self._value(self._rows[:, 1])
+
+    @property
+    def mean(self) -> Union[float, numpy.ndarray]:
+        return self._value(self._rows[:, 2])
+
+    @property
+    def std(self) -> Union[float, numpy.ndarray]:
+        return self._value(self._rows[:, 3])
+
+    @property
+    def quantile_levels(self) -> numpy.ndarray:
+        return self._quantile_levels
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, numpy.ndarray]:
+        """
+        Returns the approximate quantiles of the time points, interpolated between the recorded quantiles.
+
+        Parameters
+        ----------
+        q : quantile level or levels, within [0, 1].
+
+        Returns
+        -------
+        Quantile, or array of quantiles with the time points along the first axis and the levels along the second
+        """
+        levels = numpy.asarray(q, dtype=numpy.float64)
+        if numpy.any(levels < 0) or numpy.any(levels > 1):
+            raise ValueError(f"Quantile levels must be within [0, 1], got: {q}")
+        start = len(_fields)
+        quantiles = numpy.stack(
+            [
+                numpy.interp(levels, self._quantile_levels, row[start : start + len(self._quantile_levels)])
+                for row in self._rows
+            ]
+        )
+        if self._single:
+            quantiles = quantiles[0]
+            return float(quantiles) if quantiles.ndim == 0 else quantiles
+        return quantiles
+
+    def histogram(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Returns the approximate histograms of the time points, over the range [min, max] of each time point.
+
+        Returns
+        -------
+        Counts and bin edges, with the time points along the first axis if there are several time points.
+        """
+        counts = self._rows[:, -self.nb_bins :]
+        edges = numpy.stack([numpy.linspace(*_histogram_range(row[0], row[1]), self.nb_bins + 1) for row in self._rows])
+        if self._single:
+            return counts[0], edges[0]
+        return counts, edges
+
+    def contrast_limits(self, low: float = 0.001, high: float = 0.999) -> Optional[Tuple[float, float]]:
+        """
+        Returns contrast limits covering the recorded time points: the lowest of their low quantiles and the
+        highest of their high quantiles, None if no time point was recorded.
+
+        Parameters
+        ----------
+        low : quantile level of the lower contrast limit.
+        high : quantile level of the upper contrast limit.
+        """
+        recorded = numpy.atleast_1d(self.recorded)
+        if not numpy.any(recorded):
+            return None
+        quantiles = numpy.atleast_2d(self.quantile([low, high]))[recorded]
+        return float(quantiles[:, 0].min()), float(quantiles[:, 1].max())
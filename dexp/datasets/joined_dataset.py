@@ -70,10 +70,14 @@ class JoinedDataset(BaseDataset):
 
             for axis in range(len(self.shape(channel)) - 1):
                 try:
-                    self._projection_arrays[f"{channel}/{axis}"] = concatenate(
+                    projections = [
                         dataset.get_projection_array(channel, axis=axis, wrap_with_dask=True)
                         for dataset in self._dataset_list
-                    )
+                    ]
+                    # datasets without projections, such as ClearControl datasets, return None:
+                    if any(projection is None for projection in projections):
+                        raise KeyError(f"{channel}/{axis}")
+                    self._projection_arrays[f"{channel}/{axis}"] = concatenate(projections)
                 except KeyError:
                     self._projection_arrays[f"{channel}/{axis}"] = None
 
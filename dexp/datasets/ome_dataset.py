@@ -3,6 +3,9 @@ from typing import Dict, Sequence
 import numpy as np
 from ome_zarr.format import CurrentFormat
 
+# Axes of OME-Zarr images written from dexp datasets, in order:
+_ome_axes = (("t", "time"), ("c", "channel"), ("z", "space"), ("y", "space"), ("x", "space"))
+
 
 def default_omero_metadata(name: str, channels: Sequence[str], dtype: np.dtype) -> Dict:
     val_max = 1.0 if np.issubdtype(dtype, np.floating) else np.iinfo(dtype).max
@@ -24,3 +27,54 @@ def default_omero_metadata(name: str, channels: Sequence[str], dtype: np.dtype)
             for ch in channels
         ],
     }
+
+
+def default_multiscales_metadata(
+    name: str, nb_levels: int, resolution: Sequence[float], downscale: Sequence[int]
+) -> Dict:
+    """
+    Multiscales metadata for a (t, c, z, y, x) image pyramid where level i is stored at path 'i'.
+
+    Parameters
+    ----------
+    name : name of the image.
+    nb_levels : number of levels, including the full resolution level.
+    resolution : full resolution voxel size along (t, z, y, x).
+    downscale : downscaling factor along (z, y, x) between two consecutive levels.
+    """
+    dt, dz, dy, dx = resolution
+    datasets = []
+    for level in range(nb_levels):
+        scale = [dt, 1.0] + [float(d * f ** level) for d, f in zip((dz, dy, dx), downscale)]
+        datasets.append({"path": str(level), "coordinateTransformations": [{"type": "scale", "scale": scale}]})
+
+    return {
+        "version": CurrentFormat().version,
+        "name": name,
+        "axes": [{"name": axis, "type": axis_type} for axis, axis_type in _ome_axes],
+        "datasets": datasets,
+    }
+
+
+def downsample_stack(stack: np.ndarray, downscale: Sequence[int]) -> np.ndarray:
+    """
+    Downsamples a stack by averaging blocks of given size, the stack is padded by repeating its edges
+    when its shape is not a multiple of the block size. Integer stacks are rounded to the nearest integer.
+
+    Parameters
+    ----------
+    stack : stack to downsample.
+    downscale : size of the blocks along each axis.
+    """
+    pad_width = [(0, -s % f) for s, f in zip(stack.shape, downscale)]
+    if any(after > 0 for _, after in pad_width):
+        stack = np.pad(stack, pad_width, mode="edge")
+
+    blocks_shape = []
+    for s, f in zip(stack.shape, downscale):
+        blocks_shape += [s // f, f]
+    downsampled = stack.reshape(blocks_shape).mean(axis=tuple(range(1, 2 * stack.ndim, 2)), dtype=np.float32)
+
+    if not np.issubdtype(stack.dtype, np.floating):
+        downsampled = np.rint(downsampled, out=downsampled)
+    return downsampled.astype(stack.dtype, copy=False)
@@ -1,5 +1,10 @@
+import numpy
+import pytest
 from arbol import aprint
 
+from dexp.datasets import ZDataset
+from dexp.datasets.operations import copy
+from dexp.datasets.operations.copy import dataset_copy
 from dexp.datasets.operations.demo.demo_copy import _demo_copy
 from dexp.utils.backends import CupyBackend, NumpyBackend
 
@@ -16,3 +21,166 @@ def test_copy_cupy():
 
     except ModuleNotFoundError:
         aprint("Cupy module not found! demo ignored")
+
+
+@pytest.mark.parametrize("chunks", [(1, 16, 16, 16), (1, 8, 32, 32)])
+def test_copy_raw_chunks(tmp_path, chunks):
+    rng = numpy.random.default_rng(0)
+    images = rng.integers(0, 4096, size=(6, 32, 48, 40), dtype=numpy.uint16)
+
+    dataset = ZDataset(path=str(tmp_path / "dataset.zarr"), mode="w", store="dir")
+    dataset.add_channel(name="channel", shape=images.shape, chunks=(1, 16, 16, 16), dtype=images.dtype)
+    dataset.write_array(channel="channel", array=images)
+
+    output_path = str(tmp_path / "copy.zarr")
+    dataset_copy(
+        dataset=dataset, dest_path=output_path, channels=("channel",), slicing=(slice(1, 5), ...), chunks=chunks
+    )
+
+    copied_dataset = ZDataset(path=output_path, mode="r")
+    copied_array = copied_dataset.get_array("channel")
+
+    assert copied_array.chunks == chunks
+    assert numpy.array_equal(copied_array[...], images[1:5])
+    for axis in range(3):
+        assert numpy.array_equal(
+            copied_dataset.get_projection_array("channel", axis)[...], images[1:5].max(axis=axis + 1)
+        )
+
+    if chunks == (1, 16, 16, 16):
+        # Same layout and codec, the encoded chunks are copied as they are:
+        source_array = dataset.get_array("channel")
+        key, copied_key = source_array._chunk_key((2, 1, 0, 2)), copied_array._chunk_key((1, 1, 0, 2))
+        assert source_array.chunk_store[key] == copied_array.chunk_store[copied_key]
+
+    # Intensity statistics are recorded whether chunks are copied as they are or not:
+    statistics = copied_dataset.get_statistics("channel")
+    assert numpy.all(statistics.recorded)
+    assert numpy.array_equal(statistics.max, images[1:5].max(axis=(1, 2, 3)))
+    assert numpy.allclose(statistics.mean, images[1:5].mean(axis=(1, 2, 3)))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_copy_resume(tmp_path, workers):
+    rng = numpy.random.default_rng(0)
+    images = rng.integers(0, 4096, size=(5, 8, 16, 16), dtype=numpy.uint16)
+
+    dataset = ZDataset(path=str(tmp_path / "dataset.zarr"), mode="w", store="dir")
+    dataset.add_channel(name="channel", shape=images.shape, chunks=(1, 8, 8, 8), dtype=images.dtype)
+    dataset.write_array(channel="channel", array=images)
+
+    # Interrupted copy, only some time points were written:
+    output_path = str(tmp_path / "copy.zarr")
+    interrupted = ZDataset(path=output_path, mode="w", store="dir")
+    interrupted.add_channel(name="channel", shape=images.shape, chunks=(1, 8, 8, 8), dtype=images.dtype)
+    for tp in (0, 3):
+        interrupted.write_stack(channel="channel", time_point=tp, stack_array=numpy.zeros_like(images[tp]))
+    interrupted.close()
+
+    dataset_copy(
+        dataset=dataset,
+        dest_path=output_path,
+        channels=("channel",),
+        slicing=None,
+        chunks=(1, 8, 8, 8),
+        resume=True,
+        workers=workers,
+    )
+
+    copied_dataset = ZDataset(path=output_path, mode="r")
+    assert copied_dataset.completed_time_points("channel") == list(range(5))
+    assert copied_dataset.missing_time_points("channel") == []
+    copied_array = copied_dataset.get_array("channel")
+    for tp in range(5):
+        # completed time points are not written again:
+        expected = numpy.zeros_like(images[tp]) if tp in (0, 3) else images[tp]
+        assert numpy.array_equal(copied_array[tp], expected)
+
+
+def test_copy_resume_uninitialised_chunks(tmp_path):
+    rng = numpy.random.default_rng(0)
+    images = rng.integers(0, 4096, size=(3, 8, 16, 16), dtype=numpy.uint16)
+
+    dataset = ZDataset(path=str(tmp_path / "dataset.zarr"), mode="w", store="dir")
+    source_array = dataset.add_channel(name="channel", shape=images.shape, chunks=(1, 8, 8, 8), dtype=images.dtype)
+    dataset.write_array(channel="channel", array=images)
+    # A chunk of time point 1 is not initialised, it reads as the fill value:
+    del source_array.chunk_store[source_array._chunk_key((1, 0, 1, 0))]
+    expected = source_array[...]
+
+    # Interrupted copy, time point 1 was partially written:
+    output_path = str(tmp_path / "copy.zarr")
+    interrupted = ZDataset(path=output_path, mode="w", store="dir")
+    interrupted_array = interrupted.add_channel(
+        name="channel", shape=images.shape, chunks=(1, 8, 8, 8), dtype=images.dtype
+    )
+    interrupted_array[1] = 0
+    interrupted.close()
+
+    dataset_copy(dataset=dataset, dest_path=output_path, channels=("channel",), slicing=None, resume=True)
+
+    copied_array = ZDataset(path=output_path, mode="r").get_array("channel")
+    # Chunks remaining from the interrupted copy are removed:
+    assert numpy.array_equal(copied_array[...], expected)
+
+
+def _spy_raw_copies(monkeypatch):
+    # Records the time points whose encoded chunks are copied as they are:
+    copied_time_points = []
+    copy_raw_chunks = copy._copy_raw_chunks
+
+    def _copy_raw_chunks(source, dest, source_time_point, dest_time_point):
+        copied_time_points.append(dest_time_point)
+        copy_raw_chunks(source, dest, source_time_point, dest_time_point)
+
+    monkeypatch.setattr(copy, "_copy_raw_chunks", _copy_raw_chunks)
+    return copied_time_points
+
+
+def test_copy_raw_chunks_source_layout(tmp_path, monkeypatch):
+    rng = numpy.random.default_rng(0)
+    images = rng.integers(0, 4096, size=(4, 32, 48, 40), dtype=numpy.uint16)
+
+    # Dataset written with other chunks and codec than the defaults:
+    dataset = ZDataset(path=str(tmp_path / "dataset.zarr"), mode="w", store="dir")
+    source_array = dataset.add_channel(
+        name="channel", shape=images.shape, chunks=(1, 16, 16, 16), dtype=images.dtype, codec="lz4", clevel=5
+    )
+    dataset.write_array(channel="channel", array=images)
+
+    output_path = str(tmp_path / "copy.zarr")
+    copied_time_points = _spy_raw_copies(monkeypatch)
+    dataset_copy(dataset=dataset, dest_path=output_path, channels=("channel",), slicing=(slice(1, 3), ...))
+    assert 0 in copied_time_points and 1 in copied_time_points
+
+    copied_array = ZDataset(path=output_path, mode="r").get_array("channel")
+    assert numpy.array_equal(copied_array[...], images[1:3])
+
+    # Without chunks and codec given, those of the source are kept and the encoded chunks are copied as they are:
+    assert copied_array.chunks == source_array.chunks
+    assert copied_array.compressor.get_config() == source_array.compressor.get_config()
+    key, copied_key = source_array._chunk_key((2, 1, 0, 2)), copied_array._chunk_key((1, 1, 0, 2))
+    assert source_array.chunk_store[key] == copied_array.chunk_store[copied_key]
+
+
+def test_copy_raw_chunks_without_statistics(tmp_path, monkeypatch):
+    rng = numpy.random.default_rng(0)
+    images = rng.integers(0, 4096, size=(4, 16, 32, 32), dtype=numpy.uint16)
+
+    # Dataset written before intensity statistics were recorded:
+    dataset = ZDataset(path=str(tmp_path / "dataset.zarr"), mode="w", store="dir")
+    dataset.add_channel(
+        name="channel", shape=images.shape, chunks=(1, 8, 16, 16), dtype=images.dtype, enable_statistics=False
+    )
+    dataset.write_array(channel="channel", array=images)
+
+    output_path = str(tmp_path / "copy.zarr")
+    copied_time_points = _spy_raw_copies(monkeypatch)
+    dataset_copy(dataset=dataset, dest_path=output_path, channels=("channel",), slicing=(slice(1, 3), ...))
+    # Encoded chunks are still copied as they are:
+    assert 0 in copied_time_points and 1 in copied_time_points
+
+    copied_dataset = ZDataset(path=output_path, mode="r")
+    assert numpy.array_equal(copied_dataset.get_array("channel")[...], images[1:3])
+    # Statistics are left unrecorded:
+    assert not numpy.any(copied_dataset.get_statistics("channel").recorded)
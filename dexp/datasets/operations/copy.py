@@ -1,6 +1,9 @@
-from typing import Optional, Sequence
+import itertools
+import math
+from typing import Any, Optional, Sequence, Tuple
 
 import numpy
+import zarr
 from arbol.arbol import aprint, asection
 from joblib import Parallel, delayed
 
@@ -16,9 +19,10 @@ def dataset_copy(
     slicing,
     store: str = "dir",
     chunks: Optional[Sequence[int]] = None,
-    compression: str = "zstd",
-    compression_level: int = 3,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
     overwrite: bool = False,
+    resume: bool = False,
     zerolevel: int = 0,
     workers: int = 1,
     workersbackend: Optional[str] = None,
@@ -29,27 +33,76 @@ def dataset_copy(
     # Create destination dataset:
     from dexp.datasets import ZDataset
 
-    mode = "w" + ("" if overwrite else "-")
-    dest_dataset = ZDataset(dest_path, mode, store, parent=dataset)
+    # When resuming, time points already written to the destination are skipped:
+    mode = "a" if resume else "w" + ("" if overwrite else "-")
+    # Stacks are compressed and written in the background while the next ones are read:
+    dest_dataset = ZDataset(dest_path, mode, store, parent=dataset, write_workers=1)
 
     # Process each channel:
     for channel in dataset._selected_channels(channels):
         with asection(f"Copying channel {channel}:"):
-            array = dataset.get_array(channel)
+            array = dataset.get_array(channel, wrap_with_dask=False)
 
             aprint(f"Slicing with: {slicing}")
             out_shape, volume_slicing, time_points = slice_from_shape(array.shape, slicing)
 
             dtype = array.dtype
-            dest_dataset.add_channel(
-                name=channel, shape=out_shape, dtype=dtype, chunks=chunks, codec=compression, clevel=compression_level
+            # When only slicing along time, the layout and codec of the source are kept unless given,
+            # so that encoded chunks can be copied as they are:
+            time_slicing_only = zerolevel == 0 and _is_full_volume_slicing(volume_slicing)
+            codec, clevel, fill_value = _default_codec(array) if time_slicing_only else (None, None, None)
+            if compression is not None or codec is None:
+                codec = compression or "zstd"
+            if compression_level is not None or clevel is None:
+                clevel = 3 if compression_level is None else compression_level
+            dest_array = dest_dataset.add_channel(
+                name=channel,
+                shape=out_shape,
+                dtype=dtype,
+                chunks=_default_chunks(array) if chunks is None and time_slicing_only else chunks,
+                codec=codec,
+                clevel=clevel,
+                value=fill_value,
+                access_pattern="view",
+                exist_ok=resume,
             )
+            indices = dest_dataset.missing_time_points(channel)
+
+            # When only slicing along time, and with the same chunks and codec, encoded chunks are copied as they are:
+            ndim = array.ndim - 1
+            source_projections = [dataset.get_projection_array(channel, axis) for axis in range(ndim)]
+            dest_projections = [dest_dataset.get_projection_array(channel, axis) for axis in range(ndim)]
+            # Statistics are not computed when copying chunks, they are copied from the source when it has them,
+            # and are left unrecorded otherwise:
+            source_statistics = dataset.get_statistics_array(channel) if isinstance(dataset, ZDataset) else None
+            dest_statistics = dest_dataset.get_statistics_array(channel)
+            copy_statistics = source_statistics is not None and dest_statistics is not None
+            raw_copy = (
+                time_slicing_only
+                and _raw_chunks_compatible(array, dest_array)
+                and all(projection is not None for projection in source_projections)
+                and (not copy_statistics or _same_statistics_layout(source_statistics, dest_statistics))
+            )
+            aprint(f"Copying {'encoded chunks as they are' if raw_copy else 'by decoding and encoding stacks'}.")
 
-            def process(i):
+            def process(i, tp_array=None):
                 tp = time_points[i]
                 try:
                     aprint(f"Processing time point: {i} ...")
-                    tp_array = array[tp][volume_slicing]
+                    if raw_copy:
+                        _copy_raw_chunks(array, dest_array, tp, i)
+                        for source_projection, dest_projection in zip(source_projections, dest_projections):
+                            if _raw_chunks_compatible(source_projection, dest_projection):
+                                _copy_raw_chunks(source_projection, dest_projection, tp, i)
+                            else:
+                                dest_projection[i] = source_projection[tp]
+                        if copy_statistics:
+                            dest_statistics[i] = source_statistics[tp]
+                        dest_dataset.mark_completed(channel, i)
+                        return
+
+                    if tp_array is None:
+                        tp_array = array[tp][volume_slicing]
                     if zerolevel != 0:
                         tp_array = numpy.array(tp_array)
                         tp_array = numpy.clip(tp_array, a_min=zerolevel, a_max=None, out=tp_array)
@@ -64,14 +117,20 @@ def dataset_copy(
                     if stop_at_exception:
                         raise error
 
-            if workers == 1:
-                for i in range(len(time_points)):
+            if workers == 1 and raw_copy:
+                for i in indices:
                     process(i)
-            else:
-                n_jobs = compute_num_workers(workers, len(time_points))
+            elif workers == 1:
+                # The next time points are read while the current one is written:
+                tps = [time_points[i] for i in indices]
+                with dataset.prefetch(channel, tps, slicing=volume_slicing) as stacks:
+                    for i, tp_array in zip(indices, stacks):
+                        process(i, tp_array)
+            elif len(indices) > 0:
+                n_jobs = compute_num_workers(workers, len(indices))
 
                 parallel = Parallel(n_jobs=n_jobs, backend=workersbackend)
-                parallel(delayed(process)(i) for i in range(len(time_points)))
+                parallel(delayed(process)(i) for i in indices)
 
     # Dataset info:
     aprint(dest_dataset.info())
@@ -82,3 +141,76 @@ def dataset_copy(
 
     # close destination dataset:
     dest_dataset.close()
+
+
+def _is_full_volume_slicing(volume_slicing) -> bool:
+    # True if the slicing of each time point selects the whole volume:
+    if not isinstance(volume_slicing, tuple):
+        volume_slicing = (volume_slicing,)
+    return all(s is Ellipsis or s == slice(None) for s in volume_slicing)
+
+
+def _same_statistics_layout(source: zarr.Array, dest: zarr.Array) -> bool:
+    # True if the rows of statistics of the source can be copied as they are to the destination:
+    return source.shape[1:] == dest.shape[1:] and source.attrs.get("quantiles") == dest.attrs.get("quantiles")
+
+
+def _default_chunks(source: Any) -> Optional[Tuple[int, ...]]:
+    # Chunks of the source array if it is a zarr array with a single time point per chunk, None otherwise:
+    if isinstance(source, zarr.Array) and source.chunks[0] == 1:
+        return source.chunks
+    return None
+
+
+def _default_codec(source: Any) -> Tuple[Optional[str], Optional[int], Optional[Any]]:
+    # Blosc codec, compression level and fill value of the source array, None if it is not a Blosc zarr array:
+    if not isinstance(source, zarr.Array):
+        return None, None, None
+    config = None if source.compressor is None else source.compressor.get_config()
+    if config is None or config.get("id") != "blosc":
+        return None, None, source.fill_value
+    return config["cname"], config["clevel"], source.fill_value
+
+
+def _raw_chunks_compatible(source: Any, dest: Any) -> bool:
+    """
+    Returns True if the encoded chunks of a time point of the source array can be copied as they are to
+    a time point of the destination array: same volume shape, chunks, dtype, memory order, fill value,
+    compressor and filters, and chunks that hold a single time point.
+    """
+    if not isinstance(source, zarr.Array) or not isinstance(dest, zarr.Array):
+        return False
+
+    def _config(codec):
+        return None if codec is None else codec.get_config()
+
+    def _same_fill_value(a, b):
+        return a == b or (a is not None and b is not None and a != a and b != b)
+
+    return (
+        source.shape[1:] == dest.shape[1:]
+        and source.chunks == dest.chunks
+        and source.chunks[0] == 1
+        and source.dtype == dest.dtype
+        and source.order == dest.order
+        and _same_fill_value(source.fill_value, dest.fill_value)
+        and _config(source.compressor) == _config(dest.compressor)
+        and [_config(f) for f in source.filters or []] == [_config(f) for f in dest.filters or []]
+    )
+
+
+def _copy_raw_chunks(source: zarr.Array, dest: zarr.Array, source_time_point: int, dest_time_point: int):
+    """
+    Copies the encoded chunks of a time point from a source array to a destination array without decoding them,
+    chunks that are not initialised in the source are removed from the destination, where they might remain from
+    an interrupted copy, so that they read as the fill value.
+    """
+    grid = itertools.product(*(range(math.ceil(s / c)) for s, c in zip(source.shape[1:], source.chunks[1:])))
+    for index in grid:
+        dest_key = dest._chunk_key((dest_time_point,) + index)
+        try:
+            data = source.chunk_store[source._chunk_key((source_time_point,) + index)]
+        except KeyError:
+            dest.chunk_store.pop(dest_key, None)
+            continue
+        dest.chunk_store[dest_key] = data
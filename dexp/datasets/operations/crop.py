@@ -66,6 +66,7 @@ def dataset_crop(
     compression: str = "zstd",
     compression_level: int = 3,
     overwrite: bool = False,
+    resume: bool = False,
     workers: int = 1,
     check: bool = True,
     stop_at_exception: bool = True,
@@ -74,13 +75,15 @@ def dataset_crop(
     # Create destination dataset:
     from dexp.datasets import ZDataset
 
-    mode = "w" + ("" if overwrite else "-")
-    dest_dataset = ZDataset(dest_path, mode, store, parent=dataset)
+    # When resuming, time points already written to the destination are skipped:
+    mode = "a" if resume else "w" + ("" if overwrite else "-")
+    # Stacks are compressed and written in the background while the next ones are read:
+    dest_dataset = ZDataset(dest_path, mode, store, parent=dataset, write_workers=1)
 
     with asection("Estimating region of interest"):
         nb_time_pts = dataset.nb_timepoints(reference_channel)
         slicing = compute_crop_slicing(
-            dataset.get_array(reference_channel), [0, nb_time_pts // 2, nb_time_pts - 1], quantile
+            dataset.get_array(reference_channel, wrap_with_dask=False), [0, nb_time_pts // 2, nb_time_pts - 1], quantile
         )
         aprint("Estimated slicing of", slicing)
         volume_shape = tuple(s.stop - s.start for s in slicing)
@@ -90,7 +93,7 @@ def dataset_crop(
     # Process each channel:
     for channel in dataset._selected_channels(channels):
         with asection(f"Cropping channel {channel}:"):
-            array = dataset.get_array(channel)
+            array = dataset.get_array(channel, wrap_with_dask=False)
 
             dtype = array.dtype
             dest_dataset.add_channel(
@@ -100,7 +103,10 @@ def dataset_crop(
                 chunks=chunks,
                 codec=compression,
                 clevel=compression_level,
+                access_pattern="view",
+                exist_ok=resume,
             )
+            indices = dest_dataset.missing_time_points(channel)
 
             def process(tp):
                 try:
@@ -117,13 +123,13 @@ def dataset_crop(
                         raise error
 
             if workers == 1:
-                for i in range(len(array)):
+                for i in indices:
                     process(i)
-            else:
-                n_jobs = compute_num_workers(workers, len(array))
+            elif len(indices) > 0:
+                n_jobs = compute_num_workers(workers, len(indices))
 
                 parallel = Parallel(n_jobs=n_jobs)
-                parallel(delayed(process)(i) for i in range(len(array)))
+                parallel(delayed(process)(i) for i in indices)
 
     # Dataset info:
     aprint(dest_dataset.info())
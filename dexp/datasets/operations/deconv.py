@@ -1,4 +1,3 @@
-import functools
 from pathlib import Path
 from typing import List, Optional, Sequence, Tuple
 
@@ -10,12 +9,14 @@ from dask.distributed import Client
 from dask_cuda import LocalCUDACluster
 
 from dexp.datasets import BaseDataset
+from dexp.datasets.chunking import compute_chunks
 from dexp.optics.psf.standard_psfs import nikon16x08na, olympus20x10na
 from dexp.processing.deconvolution import (
     admm_deconvolution,
     lucy_richardson_deconvolution,
 )
-from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolver import FFTConvolver
+from dexp.processing.utils.estimate_tiles import estimate_tiles
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
 from dexp.utils.backends import Backend, BestBackend
 from dexp.utils.slicing import slice_from_shape
@@ -30,7 +31,9 @@ def dataset_deconv(
     compression: str = "zstd",
     compression_level: int = 3,
     overwrite: bool = False,
+    resume: bool = False,
     tilesize: Optional[Tuple[int]] = None,
+    memory_budget: Optional[float] = None,
     method: str = "lr",
     num_iterations: int = 16,
     max_correction: int = 16,
@@ -55,7 +58,8 @@ def dataset_deconv(
 
     from dexp.datasets import ZDataset
 
-    mode = "w" + ("" if overwrite else "-")
+    # When resuming, time points already written to the destination are skipped:
+    mode = "a" if resume else "w" + ("" if overwrite else "-")
     dest_dataset = ZDataset(dest_path, mode, store, parent=dataset)
 
     # Default tile size:
@@ -76,7 +80,7 @@ def dataset_deconv(
     lazy_computation = []
 
     for channel in dataset._selected_channels(channels):
-        array = dataset.get_array(channel)
+        array = dataset.get_array(channel, wrap_with_dask=False)
 
         aprint(f"Slicing with: {slicing}")
         out_shape, volume_slicing, time_points = slice_from_shape(array.shape, slicing)
@@ -84,11 +88,6 @@ def dataset_deconv(
         out_shape = tuple(int(round(u * v)) for u, v in zip(out_shape, (1,) + scaling))
         dtype = numpy.float16 if method == "admm" else array.dtype
 
-        # Adds destination array channel to dataset
-        dest_array = dest_dataset.add_channel(
-            name=channel, shape=out_shape, dtype=dtype, codec=compression, clevel=compression_level
-        )
-
         # This is not ideal but difficult to avoid right now:
         sxy = (sx + sy) / 2
 
@@ -131,9 +130,39 @@ def dataset_deconv(
 
         margins = max(psf_xy_size, psf_z_size)
 
+        # Tile shape and margins that fit within the memory budget:
+        if memory_budget is not None:
+            # Number of float32 buffers needed per voxel, rough estimate for admm with second derivatives in 3D:
+            buffers_per_voxel = 6 if method == "lr" else 28
+            tilesize, margins = estimate_tiles(
+                out_shape[1:],
+                memory_budget=int(memory_budget * 1e9),
+                buffers_per_voxel=buffers_per_voxel,
+                margins=margins,
+                fft_kernel_shape=psf_kernel.shape,
+            )
+            aprint(f"Tile size: {tilesize} and margins: {margins} estimated for a memory budget of {memory_budget} GB")
+
+        # Chunks are no larger than the tiles, so that deconvolved tiles are written to whole chunks:
+        tiles = (tilesize,) * (len(out_shape) - 1) if isinstance(tilesize, int) else tuple(tilesize)
+        chunks = compute_chunks(out_shape, dtype, access_pattern="stack")
+        chunks = chunks[:1] + tuple(c if t is None else min(c, t) for c, t in zip(chunks[1:], tiles))
+
+        # Adds destination array channel to dataset
+        dest_dataset.add_channel(
+            name=channel,
+            shape=out_shape,
+            dtype=dtype,
+            chunks=chunks,
+            codec=compression,
+            clevel=compression_level,
+            exist_ok=resume,
+        )
+
         if method == "lr":
             normalize = False
-            convolve = functools.partial(fft_convolve, in_place=False, mode="reflect", internal_dtype=numpy.float32)
+            # The PSF and back-projector FFTs are cached and shared across iterations and tiles:
+            convolve = FFTConvolver(in_place=False, mode="reflect", internal_dtype=numpy.float32)
 
             def deconv(image):
                 min_value = image.min()
@@ -188,25 +217,21 @@ def dataset_deconv(
 
                         with asection(
                             f"Deconvolving image of shape: {tp_array.shape}, with tile size: {tilesize}, "
-                            + "margins: {margins} "
+                            + f"margins: {margins}, and saving it for time point {i}"
                         ):
                             aprint(f"Number of iterations: {num_iterations}, back_projection:{back_projection}, ")
-                            tp_array = scatter_gather_i2i(
-                                deconv,
-                                tp_array,
-                                tiles=tilesize,
-                                margins=margins,
-                                normalise=normalize,
-                                internal_dtype=dtype,
-                            )
-
-                        with asection("Moving array from backend to numpy."):
-                            tp_array = Backend.to_numpy(tp_array, dtype=dest_array.dtype, force_copy=False)
-
-                    with asection(
-                        f"Saving deconvolved stack for time point {i}, shape:{tp_array.shape}, dtype:{array.dtype}"
-                    ):
-                        dest_dataset.write_stack(channel=channel, time_point=i, stack_array=tp_array)
+                            # Deconvolved tiles are written straight into the destination dataset:
+                            with dest_dataset.stack_writer(channel=channel, time_point=i) as stack_writer:
+                                scatter_gather_i2i(
+                                    deconv,
+                                    tp_array,
+                                    tiles=tilesize,
+                                    margins=margins,
+                                    normalise=normalize,
+                                    internal_dtype=dtype,
+                                    pipelined=True,
+                                    out=stack_writer,
+                                )
 
                     aprint(f"Done processing time point: {i}/{len(time_points)} .")
 
@@ -220,7 +245,7 @@ def dataset_deconv(
                 if stop_at_exception:
                     raise error
 
-        for i in range(len(time_points)):
+        for i in dest_dataset.missing_time_points(channel):
             lazy_computation.append(process(i))
 
     dask.compute(*lazy_computation)
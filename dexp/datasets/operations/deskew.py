@@ -5,6 +5,7 @@ from joblib import Parallel, delayed
 from zarr.errors import ContainsArrayError, ContainsGroupError
 
 from dexp.datasets import BaseDataset
+from dexp.datasets.prefetcher import Prefetcher
 from dexp.processing.deskew.classic_deskew import classic_deskew
 from dexp.processing.deskew.yang_deskew import yang_deskew
 from dexp.utils.backends import Backend, BestBackend
@@ -28,6 +29,7 @@ def dataset_deskew(
     compression: str = "zstd",
     compression_level: int = 3,
     overwrite: bool = False,
+    resume: bool = False,
     workers: int = 1,
     workersbackend: str = "threading",
     devices: Optional[List[int]] = None,
@@ -59,8 +61,10 @@ def dataset_deskew(
     # We allocate last minute once we know the shape...
     from dexp.datasets import ZDataset
 
-    zarr_mode = "w" + ("" if overwrite else "-")
-    dest_dataset = ZDataset(dest_path, zarr_mode, store, parent=dataset)
+    # When resuming, time points already written to the destination are skipped:
+    zarr_mode = "a" if resume else "w" + ("" if overwrite else "-")
+    # Deskewed stacks are compressed and written in the background while the next ones are deskewed:
+    dest_dataset = ZDataset(dest_path, zarr_mode, store, parent=dataset, write_workers=1)
 
     # Metadata for deskewing:
     metadata = dataset.get_metadata()
@@ -77,15 +81,19 @@ def dataset_deskew(
     # Iterate through channels::
     for array, channel, flip in zip(arrays, channels, flips):
 
-        # shape and dtype of views to deskew:
-        shape = array[0].shape
         nb_timepoints = array.shape[0]
+        # Destination channels are created once the shape of deskewed stacks is known:
+        if channel in dest_dataset.channels():
+            time_points = dest_dataset.missing_time_points(channel)
+        else:
+            time_points = list(range(nb_timepoints))
 
-        def process(channel, tp, device):
+        def process(channel, tp, device, array_tp=None):
             try:
 
-                with asection(f"Loading channel {channel} for time point {tp}"):
-                    array_tp = array[tp].compute()
+                if array_tp is None:
+                    with asection(f"Loading channel {channel} for time point {tp}"):
+                        array_tp = array[tp].compute()
 
                 with BestBackend(device, exclusive=True, enable_unified_memory=True):
 
@@ -126,6 +134,7 @@ def dataset_deskew(
                             dtype=deskewed_view_tp.dtype,
                             codec=compression,
                             clevel=compression_level,
+                            access_pattern="stack",
                         )
                     except (ContainsArrayError, ContainsGroupError):
                         aprint("Other thread/process created channel before... ")
@@ -154,11 +163,13 @@ def dataset_deskew(
 
         if workers > 1:
             Parallel(n_jobs=workers, backend=workersbackend)(
-                delayed(process)(channel, tp, devices[tp % len(devices)]) for tp in range(0, shape[0])
+                delayed(process)(channel, tp, devices[tp % len(devices)]) for tp in time_points
             )
         else:
-            for tp in range(0, nb_timepoints):
-                process(channel, tp, devices[0])
+            # The next time points are read while the current one is deskewed:
+            with Prefetcher(array, time_points) as stacks:
+                for tp, array_tp in zip(time_points, stacks):
+                    process(channel, tp, devices[0], array_tp)
 
     # Dataset info:
     aprint(dest_dataset.info())
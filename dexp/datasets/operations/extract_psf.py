@@ -32,7 +32,7 @@ def dataset_extract_psf(
     )
 
     for channel in dataset._selected_channels(channels):
-        array = dataset.get_array(channel)
+        array = dataset.get_array(channel, wrap_with_dask=False)
         _, volume_slicing, time_points = slice_from_shape(array.shape, slicing)
 
         psfs = []
@@ -1,9 +1,13 @@
+from contextlib import ExitStack
+from os.path import exists
+
 import dask
 import numpy as np
 from arbol.arbol import aprint, asection
 from toolz import curry
 
 from dexp.datasets import ZDataset
+from dexp.datasets.prefetcher import Prefetcher
 from dexp.processing.multiview_lightsheet.fusion.mvsols import msols_fuse_1C2L
 from dexp.processing.multiview_lightsheet.fusion.simview import SimViewFusion
 from dexp.processing.registration.model.model_io import (
@@ -47,10 +51,14 @@ def dataset_fuse(
     pad,
     white_top_hat_size,
     white_top_hat_sampling,
+    resume=False,
     stop_at_exception=True,
 ):
 
-    views = {channel.split("-")[-1]: dataset.get_array(channel, per_z_slice=False) for channel in channels}
+    views = {
+        channel.split("-")[-1]: dataset.get_array(channel, per_z_slice=False, wrap_with_dask=False)
+        for channel in channels
+    }
 
     with asection("Views:"):
         for channel, view in views.items():
@@ -80,6 +88,38 @@ def dataset_fuse(
         else:
             models = [None] * len(time_points)
 
+    # When resuming, time points already fused are skipped, except the first one that is always fused
+    # to obtain the equalisation ratios and registration model of the following time points:
+    indices = list(range(len(time_points)))
+    if resume:
+        try:
+            completed = set(ZDataset(output_path, "r").completed_time_points("fused"))
+        except ValueError:
+            # no existing output dataset:
+            completed = set()
+        indices = [i for i in indices if i == 0 or i not in completed]
+        aprint(f"Resuming fusion, {len(time_points) - len(indices)} time points already fused are skipped.")
+
+    # Prefetchers are closed, stopping their reader threads and releasing their stacks, once fusion ends or fails:
+    prefetchers = ExitStack()
+    if len(devices) == 1:
+        # Time points are processed in order, the views of the next time points are read while one is fused:
+        prefetch_time_points = [time_points[i] for i in indices]
+        prefetched_views = zip(
+            *(
+                prefetchers.enter_context(Prefetcher(view, prefetch_time_points, slicing=volume_slicing))
+                for view in views.values()
+            )
+        )
+
+        def load_views(tp):
+            return dict(zip(views.keys(), next(prefetched_views)))
+
+    else:
+
+        def load_views(tp):
+            return {k: np.asarray(view[tp][volume_slicing]) for k, view in views.items()}
+
     @curry
     def process(i, params, device_id=0):
         equalisation_ratios_reference, model, dest_dataset = params
@@ -87,7 +127,7 @@ def dataset_fuse(
         try:
             with asection(f"Fusing time point for time point {i}/{len(time_points)}"):
                 with asection(f"Loading channels {channels}"):
-                    views_tp = {k: np.asarray(view[tp][volume_slicing]) for k, view in views.items()}
+                    views_tp = load_views(tp)
 
                 with BestBackend(exclusive=True, enable_unified_memory=True, device_id=device_id):
                     if models[i] is not None:
@@ -175,14 +215,19 @@ def dataset_fuse(
                     if i == 0:
                         # We allocate last minute once we know the shape... because we don't always know
                         # the shape in advance!!!
-                        mode = "w" + ("" if overwrite else "-")
-                        dest_dataset = ZDataset(output_path, mode, store, parent=dataset)
+                        mode = "a" if resume else "w" + ("" if overwrite else "-")
+                        # Fused stacks are written in the background while the next ones are fused, except when
+                        # the dataset is created in a dask worker, its pending writes would be lost with it:
+                        write_workers = 1 if len(devices) == 1 else 0
+                        dest_dataset = ZDataset(output_path, mode, store, parent=dataset, write_workers=write_workers)
                         dest_dataset.add_channel(
                             "fused",
                             shape=(len(time_points),) + tp_array.shape,
                             dtype=tp_array.dtype,
                             codec=compression,
                             clevel=compression_level,
+                            access_pattern="stack",
+                            exist_ok=resume,
                         )
 
                     dest_dataset.write_stack(channel="fused", time_point=i, stack_array=tp_array)
@@ -222,26 +267,36 @@ def dataset_fuse(
     else:
         raise NotImplementedError
 
-    # it creates the output dataset from the first time point output shape
-    params = process(0, init_params)
-    if len(devices) > 1:
-        params = params.persist()
-
-    if equalise_mode == "all":
-        params = init_params[:2] + (params[2],)
+    with prefetchers:
+        # it creates the output dataset from the first time point output shape
+        params = process(0, init_params)
+        if len(devices) > 1:
+            params = params.persist()
 
-    lazy_computations = []  # it is only lazy if len(devices) > 1
-    for i in range(1, len(time_points)):
-        lazy_computations.append(process(i, params))
+        if equalise_mode == "all":
+            params = init_params[:2] + (params[2],)
 
-    if len(devices) > 1:
-        first_model, dest_dataset = params.compute()[1:]
-        models = [first_model] + [output[1] for output in dask.compute(*lazy_computations)]
-    else:
-        models = [params[1]] + [output[1] for output in lazy_computations]
-        dest_dataset = params[2]
+        lazy_computations = []  # it is only lazy if len(devices) > 1
+        for i in indices[1:]:
+            lazy_computations.append(process(i, params))
 
-    if not loadreg and models[0] is not None:
+        if len(devices) > 1:
+            first_model, dest_dataset = params.compute()[1:]
+            new_models = [first_model] + [output[1] for output in dask.compute(*lazy_computations)]
+        else:
+            new_models = [params[1]] + [output[1] for output in lazy_computations]
+            dest_dataset = params[2]
+
+    if not loadreg and new_models[0] is not None:
+        models = [None] * len(time_points)
+        if len(indices) < len(time_points) and exists(model_list_filename):
+            # the models of skipped time points are kept from the existing models file:
+            with NumpyBackend():
+                previous_models = model_list_from_file(model_list_filename)
+            if len(previous_models) == len(time_points):
+                models = previous_models
+        for i, model in zip(indices, new_models):
+            models[i] = model
         model_list_to_file(model_list_filename, models)
 
     aprint(dest_dataset.info())
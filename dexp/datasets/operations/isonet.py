@@ -26,6 +26,7 @@ def dataset_isonet(
     training_tp_index: Optional[int],
     max_epochs: int,
     check: bool,
+    resume: bool = False,
 ):
     if channel is None:
         channel = "fused"
@@ -66,11 +67,18 @@ def dataset_isonet(
     if "a" in mode:
         from dexp.datasets import ZDataset
 
-        mode = "w" + ("" if overwrite else "-")
-        dest_dataset = ZDataset(path, mode, store, parent=dataset)
+        # When resuming, time points already written to the destination are skipped:
+        mode = "a" if resume else "w" + ("" if overwrite else "-")
+        # Stacks are compressed and written in the background while the next ones are processed:
+        dest_dataset = ZDataset(path, mode, store, parent=dataset, write_workers=1)
         zarr_array = None
+        time_points = range(0, array.shape[0] - 1)
+        if channel in dest_dataset.channels():
+            zarr_array = dest_dataset.get_array(channel)
+            missing_time_points = set(dest_dataset.missing_time_points(channel))
+            time_points = [tp for tp in time_points if tp in missing_time_points]
 
-        for tp in range(0, array.shape[0] - 1):
+        for tp in time_points:
             with timeit("Elapsed time: "):
 
                 aprint(f"Processing time point: {tp} ...")
@@ -95,7 +103,12 @@ def dataset_isonet(
                     shape = (array.shape[0],) + tp_array.shape
                     aprint(f"Creating Zarr array of shape: {shape} ")
                     zarr_array = dest_dataset.add_channel(
-                        name=channel, shape=shape, dtype=array.dtype, codec=compression, clevel=compression_level
+                        name=channel,
+                        shape=shape,
+                        dtype=array.dtype,
+                        codec=compression,
+                        clevel=compression_level,
+                        access_pattern="stack",
                     )
 
                 aprint("Writing image to Zarr file...")
@@ -36,7 +36,10 @@ def dataset_register(
     stop_at_exception=True,
 ):
 
-    views = {channel.split("-")[-1]: dataset.get_array(channel, per_z_slice=False) for channel in channels}
+    views = {
+        channel.split("-")[-1]: dataset.get_array(channel, per_z_slice=False, wrap_with_dask=False)
+        for channel in channels
+    }
 
     with asection("Views:"):
         for channel, view in views.items():
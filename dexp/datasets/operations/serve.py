@@ -1,18 +1,44 @@
 from arbol.arbol import aprint
 
 from dexp.datasets import ZDataset
+from dexp.datasets.chunk_server import ChunkServer
 
 
-def dataset_serve(dataset: ZDataset, host: str = "0.0.0.0", port: int = 8000):
+def dataset_serve(
+    dataset: ZDataset,
+    host: str = "0.0.0.0",
+    port: int = 8000,
+    workers: int = 8,
+    cache_size: int = 2 ** 28,
+    report_interval: float = 60,
+):
+    """
+    Serves a zarr dataset over HTTP, see ChunkServer.
+
+    Parameters
+    ----------
+    dataset : dataset to serve.
+    host : host to serve from.
+    port : port to serve from.
+    workers : number of threads reading from the store.
+    cache_size : size in bytes of the hot-chunk cache.
+    report_interval : time in seconds between metrics reports.
+    """
     if not type(dataset) == ZDataset:
         aprint("Cannot serve a non-Zarr dataset!")
         return
 
     aprint(dataset.info())
     try:
-        from simple_zarr_server import serve
-
-        serve(dataset._root_group, host=host, port=port)
+        # Keys are served as stored, chunks and consolidated metadata alike:
+        store = dataset._root_group.chunk_store
+        server = ChunkServer(
+            store, host=host, port=port, workers=workers, cache_size=cache_size, report_interval=report_interval
+        )
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            aprint("Interrupted, stopping server.")
     finally:
         # close destination dataset:
         dataset.close()
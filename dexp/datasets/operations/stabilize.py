@@ -120,6 +120,7 @@ def dataset_stabilize(
     compression_codec: str = "zstd",
     compression_level: int = 3,
     overwrite: bool = False,
+    resume: bool = False,
     max_range: int = 7,
     min_confidence: float = 0.5,
     enable_com: bool = False,
@@ -154,10 +155,11 @@ def dataset_stabilize(
     channels: selected channels
     reference_channel: use this channel to compute the stabilization model and apply to every channel.
     slicing: selected array slicing
-    zarr_store: type of store, can be 'dir', 'ndir', or 'zip'
+    zarr_store: type of store, can be 'dir', 'ndir', 'zip', or 'shard'
     compression_codec: compression codec to be used ('zstd', 'blosclz', 'lz4', 'lz4hc', 'zlib' or 'snappy').
     compression_level: An integer between 0 and 9 specifying the compression level.
     overwrite: overwrite output dataset if already exists
+    resume: resume an interrupted stabilisation, time points already written to the output dataset are skipped.
     max_range: maximal distance, in time points, between pairs of images to registrate.
     min_confidence: minimal confidence below which pairwise registrations are rejected for the stabilisation.
     enable_com: enable center of mass fallback when standard registration fails.
@@ -185,8 +187,9 @@ def dataset_stabilize(
 
     from dexp.datasets import ZDataset
 
-    mode = "w" + ("" if overwrite else "-")
-    dest_dataset = ZDataset(output_path, mode, zarr_store, parent=dataset)
+    mode = "a" if resume else "w" + ("" if overwrite else "-")
+    # Stacks are compressed and written in the background while the next ones are stabilised:
+    dest_dataset = ZDataset(output_path, mode, zarr_store, parent=dataset, write_workers=1)
 
     model = None
     if reference_channel is not None:
@@ -279,8 +282,15 @@ def dataset_stabilize(
         padded_shape = (nb_timepoints,) + channel_model.padded_shape(shape[1:])
 
         dest_dataset.add_channel(
-            name=channel, shape=padded_shape, dtype=dtype, codec=compression_codec, clevel=compression_level
+            name=channel,
+            shape=padded_shape,
+            dtype=dtype,
+            codec=compression_codec,
+            clevel=compression_level,
+            access_pattern="stack",
+            exist_ok=resume,
         )
+        time_points = dest_dataset.missing_time_points(channel)
 
         # definition of function that processes each time point:
         def process(tp):
@@ -310,11 +320,11 @@ def dataset_stabilize(
 
         # start jobs:
         if workers == 1:
-            for tp in range(0, nb_timepoints):
+            for tp in time_points:
                 process(tp)
-        else:
-            n_jobs = compute_num_workers(workers, nb_timepoints)
-            Parallel(n_jobs=n_jobs, backend=workers_backend)(delayed(process)(tp) for tp in range(0, nb_timepoints))
+        elif len(time_points) > 0:
+            n_jobs = compute_num_workers(workers, len(time_points))
+            Parallel(n_jobs=n_jobs, backend=workers_backend)(delayed(process)(tp) for tp in time_points)
 
     # printout output dataset info:
     aprint(dest_dataset.info())
@@ -1,4 +1,5 @@
 import os
+from contextlib import ExitStack
 from os.path import join
 from typing import Sequence, Union
 
@@ -7,6 +8,7 @@ from joblib import Parallel, delayed
 from tifffile import memmap
 
 from dexp.datasets import BaseDataset
+from dexp.datasets.prefetcher import Prefetcher
 from dexp.io.io import tiff_save
 
 
@@ -43,13 +45,16 @@ def dataset_tiff(
 
         os.makedirs(dest_path, exist_ok=True)
 
-        def process(tp):
+        def tiff_file_path_for(tp, channel):
+            return join(dest_path, f"file{tp}_{channel}.tiff")
+
+        def process(tp, stacks=None):
             try:
                 with asection(f"Saving time point {tp}: "):
-                    for channel, array in zip(selected_channels, arrays):
-                        tiff_file_path = join(dest_path, f"file{tp}_{channel}.tiff")
+                    for c, (channel, array) in enumerate(zip(selected_channels, arrays)):
+                        tiff_file_path = tiff_file_path_for(tp, channel)
                         if overwrite or not os.path.exists(tiff_file_path):
-                            stack = array[tp].compute()
+                            stack = array[tp].compute() if stacks is None else stacks[c]
 
                             if project is not False and type(project) == int:
                                 # project is the axis for projection, but here we are not considering
@@ -80,8 +85,18 @@ def dataset_tiff(
                 delayed(process)(tp) for tp in range(0, arrays[0].shape[0])
             )
         else:
-            for tp in range(0, arrays[0].shape[0]):
-                process(tp)
+            # Only time points with files left to save are read, the next ones while the current one is saved:
+            time_points = [
+                tp
+                for tp in range(0, arrays[0].shape[0])
+                if overwrite
+                or not all(os.path.exists(tiff_file_path_for(tp, channel)) for channel in selected_channels)
+            ]
+            aprint(f"Time points already saved: {arrays[0].shape[0] - len(time_points)}")
+            with ExitStack() as exit_stack:
+                prefetchers = [exit_stack.enter_context(Prefetcher(array, time_points)) for array in arrays]
+                for tp, stacks in zip(time_points, zip(*prefetchers)):
+                    process(tp, stacks)
 
     else:
 
@@ -109,9 +124,10 @@ def dataset_tiff(
 
                 memmap_image = memmap(tiff_file_path, shape=shape, dtype=array.dtype, bigtiff=True, imagej=True)
 
-                def process(tp):
+                def process(tp, stack=None):
                     aprint(f"Processing time point {tp}")
-                    stack = array[tp].compute()
+                    if stack is None:
+                        stack = array[tp].compute()
 
                     if project is not False and type(project) == int:
                         # project is the axis for projection, but here we are not considering the T dimension anymore...
@@ -125,8 +141,10 @@ def dataset_tiff(
                         delayed(process)(tp) for tp in range(0, array.shape[0])
                     )
                 else:
-                    for tp in range(0, array.shape[0]):
-                        process(tp)
+                    # The next time points are read while the current one is saved:
+                    with Prefetcher(array, range(0, array.shape[0])) as stacks:
+                        for tp, stack in enumerate(stacks):
+                            process(tp, stack)
 
                 memmap_image.flush()
                 del memmap_image
@@ -0,0 +1,103 @@
+import mmap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional, Sequence
+
+import numpy
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        array: Any,
+        time_points: Sequence[int],
+        slicing: Optional[Any] = None,
+        depth: int = 2,
+        max_bytes: Optional[int] = None,
+        workers: int = 1,
+    ):
+        """
+        Iterates, in order, over the stacks of an array for a sequence of time points, while the next stacks are read
+        and decoded in background threads. Works with any array that can be indexed by time point: zarr arrays,
+        ClearControl lazy arrays, dask arrays, ...
+
+        Parameters
+        ----------
+        array : array of which the first axis is time.
+        time_points : time points to read, in order.
+        slicing : slicing applied to each stack after indexing by time point.
+        depth : maximum number of stacks read ahead of the one being processed.
+        max_bytes : maximum number of bytes of stacks read ahead, at least one stack is always read ahead.
+        workers : number of threads reading stacks.
+        """
+        self._array = array
+        self._time_points = list(time_points)
+        self._slicing = slicing
+        self._depth = max(1, depth)
+        self._max_bytes = max_bytes
+        self._workers = max(1, workers)
+        self._stack_nbytes = None
+        self._executor = None
+        self._pending = deque()
+
+    def __len__(self) -> int:
+        return len(self._time_points)
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __iter__(self) -> Iterator[numpy.ndarray]:
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="prefetcher")
+        try:
+            next_index = 0
+            for _ in range(len(self._time_points)):
+                # Reads ahead as many stacks as the depth and byte budget allow:
+                while next_index < len(self._time_points) and (len(self._pending) == 0 or self._has_budget()):
+                    self._pending.append(self._executor.submit(self._read, self._time_points[next_index]))
+                    next_index += 1
+
+                stack = self._pending.popleft().result()
+                self._stack_nbytes = stack.nbytes
+                yield stack
+        finally:
+            self.close()
+
+    def close(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _has_budget(self) -> bool:
+        if len(self._pending) >= self._depth:
+            return False
+        if self._max_bytes is None:
+            return True
+        if self._stack_nbytes is None:
+            # the size of stacks is known once the first one is read:
+            return False
+        return (len(self._pending) + 1) * self._stack_nbytes <= self._max_bytes
+
+    def _read(self, time_point: int) -> numpy.ndarray:
+        stack = self._array[time_point]
+        if self._slicing is not None:
+            stack = stack[self._slicing]
+        stack = numpy.asarray(stack)
+        if _is_memory_mapped(stack):
+            # Memory-mapped stacks are only read on access, they are read now:
+            stack = numpy.array(stack)
+        return stack
+
+
+def _is_memory_mapped(array: numpy.ndarray) -> bool:
+    base = array
+    while base is not None:
+        if isinstance(base, (numpy.memmap, mmap.mmap)):
+            return True
+        base = getattr(base, "base", None)
+    return False
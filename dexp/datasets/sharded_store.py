@@ -0,0 +1,228 @@
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from os.path import basename, dirname, exists, join
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from numcodecs.compat import ensure_bytes
+from zarr.storage import DirectoryStore, Store, normalize_storage_path
+
+# Record header: length of the chunk name, and length of the chunk data:
+_header = struct.Struct("<HQ")
+# Data length of records deleting a chunk:
+_deleted = 2 ** 64 - 1
+_shard_extension = ".shard"
+_chunk_name_pattern = re.compile(r"\d+(\.\d+)*")
+
+
+class ShardedStore(Store):
+    def __init__(self, path: str, chunks_per_shard: Sequence[int] = (1,), max_open_shards: int = 64):
+        """
+        Zarr store that packs many chunks into a few shard files, to keep the number of files of large datasets low.
+        Metadata files are stored as in a directory store, chunks of an array are appended to the shard file that
+        corresponds to their chunk coordinates: chunk (i0, i1, ...) goes to shard (i0 // n0, i1 // n1, ...) where
+        (n0, n1, ...) are the number of chunks per shard along the leading axes, the remaining axes are not split.
+        By default there is one shard per time point and array.
+
+        Shards are append-only logs of (name, data) records, an index of each shard is built by scanning
+        record headers, and is updated incrementally when the shard grows. Reads and writes remain chunk-granular,
+        and can be done concurrently from several threads. Overwritten or deleted chunks leave unused records behind.
+        Records are appended with O_APPEND, which is atomic on local file systems but not on NFS: concurrent writers
+        on network file systems can interleave or overwrite each other's records, each shard should then be written
+        by a single process.
+
+        Parameters
+        ----------
+        path : path of the store directory.
+        chunks_per_shard : number of chunks per shard along the leading axes of arrays.
+        max_open_shards : maximum number of shards kept open for reading, the least recently read are closed first.
+        """
+        self.path = os.path.abspath(path)
+        self._chunks_per_shard = tuple(chunks_per_shard)
+        self._max_open_shards = max(1, max_open_shards)
+        self._metadata_store = DirectoryStore(self.path)
+        self._lock = threading.RLock()
+        # shard path -> (indexed size, {chunk name: (offset, length)}):
+        self._indices: Dict[str, Tuple[int, Dict[str, Tuple[int, int]]]] = {}
+        # shard path -> [file descriptor, number of ongoing reads], from least to most recently read:
+        self._read_fds: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def __getstate__(self):
+        # Locks, file descriptors and indices are not shared with other processes:
+        return self.path, self._chunks_per_shard, self._max_open_shards
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def _shard_path(self, key: str) -> Tuple[Optional[str], str]:
+        # Returns the shard path and chunk name for a chunk key, and None for other keys (metadata):
+        key = normalize_storage_path(key)
+        name = basename(key)
+        if not _chunk_name_pattern.fullmatch(name):
+            return None, name
+        indices = name.split(".")
+        shard_id = ".".join(str(int(i) // n) for i, n in zip(indices, self._chunks_per_shard))
+        return join(self.path, dirname(key), shard_id + _shard_extension), name
+
+    def _index(self, shard_path: str) -> Dict[str, Tuple[int, int]]:
+        # Scans the records appended since the last call, the shard might be written by other stores or processes:
+        with self._lock:
+            indexed_size, index = self._indices.get(shard_path, (0, {}))
+            size = os.path.getsize(shard_path) if exists(shard_path) else 0
+            if size < indexed_size:
+                indexed_size, index = 0, {}
+            if size > indexed_size:
+                with open(shard_path, "rb") as shard:
+                    shard.seek(indexed_size)
+                    while indexed_size + _header.size <= size:
+                        name_length, data_length = _header.unpack(shard.read(_header.size))
+                        name = shard.read(name_length).decode()
+                        data_offset = indexed_size + _header.size + name_length
+                        if data_length == _deleted:
+                            index.pop(name, None)
+                            data_length = 0
+                        elif data_offset + data_length > size:
+                            # incomplete record, being written:
+                            break
+                        else:
+                            index[name] = (data_offset, data_length)
+                        indexed_size = data_offset + data_length
+                        shard.seek(indexed_size)
+            self._indices[shard_path] = (indexed_size, index)
+            return index
+
+    def _append(self, shard_path: str, name: str, data: bytes):
+        encoded_name = name.encode()
+        data_length = _deleted if data is None else len(data)
+        record = _header.pack(len(encoded_name), data_length) + encoded_name + (b"" if data is None else data)
+
+        with self._lock:
+            os.makedirs(dirname(shard_path), exist_ok=True)
+            # Records are written with a single append, so that concurrent writers do not interleave:
+            fd = os.open(shard_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+            try:
+                written = 0
+                while written < len(record):
+                    # writes can be short, for instance when the file system is full or on signals:
+                    nb_bytes = os.write(fd, memoryview(record)[written:])
+                    if nb_bytes == 0:
+                        raise OSError(f"Could not write record of chunk {name} to shard: {shard_path}")
+                    written += nb_bytes
+                end = os.lseek(fd, 0, os.SEEK_CUR)
+            finally:
+                os.close(fd)
+
+            indexed_size, index = self._indices.get(shard_path, (0, {}))
+            if end - len(record) == indexed_size:
+                # no other writer appended to the shard since it was last indexed:
+                if data is None:
+                    index.pop(name, None)
+                else:
+                    index[name] = (end - len(data), len(data))
+                self._indices[shard_path] = (end, index)
+
+    @contextmanager
+    def _read_fd(self, shard_path: str) -> Iterator[int]:
+        # Shards stay open between reads, evicted shards are closed once their ongoing reads are done:
+        with self._lock:
+            entry = self._read_fds.pop(shard_path, None)
+            if entry is None:
+                entry = [os.open(shard_path, os.O_RDONLY), 0]
+            self._read_fds[shard_path] = entry
+            entry[1] += 1
+            while len(self._read_fds) > self._max_open_shards:
+                self._close_fd(self._read_fds.popitem(last=False)[1])
+        try:
+            yield entry[0]
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if self._read_fds.get(shard_path) is not entry:
+                    self._close_fd(entry)
+
+    @staticmethod
+    def _close_fd(entry: List[int]):
+        # Closes the file descriptor of a shard no longer in the open shards, unless it is being read:
+        if entry[1] == 0:
+            os.close(entry[0])
+
+    def __getitem__(self, key: str) -> bytes:
+        shard_path, name = self._shard_path(key)
+        if shard_path is None:
+            return self._metadata_store[key]
+
+        index = self._indices.get(shard_path, (0, {}))[1]
+        if name not in index:
+            index = self._index(shard_path)
+        if name not in index:
+            raise KeyError(key)
+        offset, length = index[name]
+        with self._read_fd(shard_path) as fd:
+            return os.pread(fd, length, offset)
+
+    def __setitem__(self, key: str, value):
+        shard_path, name = self._shard_path(key)
+        if shard_path is None:
+            self._metadata_store[key] = value
+        else:
+            self._append(shard_path, name, ensure_bytes(value))
+
+    def __delitem__(self, key: str):
+        shard_path, name = self._shard_path(key)
+        if shard_path is None:
+            del self._metadata_store[key]
+        elif name in self._index(shard_path):
+            self._append(shard_path, name, None)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        shard_path, name = self._shard_path(key)
+        if shard_path is None:
+            return key in self._metadata_store
+        return name in self._index(shard_path)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._metadata_store.keys():
+            if key.endswith(_shard_extension):
+                prefix = dirname(key)
+                for name in self._index(join(self.path, key)):
+                    yield f"{prefix}/{name}" if prefix else name
+            else:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def listdir(self, path: str = None) -> List[str]:
+        path = normalize_storage_path(path)
+        entries = []
+        for entry in self._metadata_store.listdir(path):
+            if entry.endswith(_shard_extension):
+                entries.extend(self._index(join(self.path, path, entry)))
+            else:
+                entries.append(entry)
+        return sorted(entries)
+
+    def rmdir(self, path: str = None):
+        path = normalize_storage_path(path)
+        with self._lock:
+            prefix = join(self.path, path)
+            for shard_path in [p for p in self._indices if p.startswith(prefix)]:
+                self._indices.pop(shard_path)
+                entry = self._read_fds.pop(shard_path, None)
+                if entry is not None:
+                    self._close_fd(entry)
+            self._metadata_store.rmdir(path)
+
+    def getsize(self, path: str = None) -> int:
+        return self._metadata_store.getsize(path)
+
+    def close(self):
+        with self._lock:
+            for entry in self._read_fds.values():
+                self._close_fd(entry)
+            self._read_fds.clear()
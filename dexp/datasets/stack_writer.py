@@ -0,0 +1,123 @@
+import threading
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+import numpy
+
+from dexp.datasets.intensity_statistics import (
+    default_max_samples,
+    default_quantile_levels,
+    merge_statistics,
+    sample_values,
+    statistics_length,
+    statistics_row,
+)
+from dexp.processing.utils.multi_projection import multi_projection
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+
+class StackWriter:
+    def __init__(
+        self,
+        array: Any,
+        time_point: int,
+        projection_arrays: Sequence[Optional[Any]] = (),
+        statistics_array: Optional[Any] = None,
+        quantile_levels: Optional[Sequence[float]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Writable view of one time point of a (zarr) array of shape (T, ...), to be used as 'out' target
+        for scatter_gather_i2i. Tiles are written directly into the array, and max projections along each axis
+        are accumulated tile after tile, and written to the projection arrays when the writer is closed.
+        Peak memory is thus bounded by the size of the tiles and projections, not the size of the stack.
+        Intensity statistics are also accumulated, from the statistics and samples of each tile.
+
+        Parameters
+        ----------
+        array : array of shape (T, ...) to write into, typically a zarr array.
+        time_point : time point to write.
+        projection_arrays : projection arrays, one per axis of the stack, entries can be None for no projection.
+        statistics_array : array of intensity statistics of shape (T, length), None for no statistics,
+            see intensity_statistics.
+        quantile_levels : levels of the quantiles recorded in the statistics array, default levels if None.
+        on_close : called once the projections are written, for example to record the time point as completed.
+        """
+        self._array = array
+        self._time_point = time_point
+        self._projection_arrays = tuple(projection_arrays)
+        self._projections = [None] * len(self._projection_arrays)
+        self._statistics_array = statistics_array
+        self._quantile_levels = default_quantile_levels if quantile_levels is None else quantile_levels
+        self._tile_statistics = []
+        self._tile_sizes = []
+        self._tile_samples = []
+        self._on_close = on_close
+        self._lock = threading.Lock()
+
+        self.shape = tuple(array.shape[1:])
+        self.dtype = array.dtype
+        self.chunks = None if getattr(array, "chunks", None) is None else tuple(array.chunks[1:])
+        self.ndim = len(self.shape)
+
+    def __setitem__(self, key: Tuple[slice, ...], value: xpArray):
+        value = Backend.to_numpy(value, dtype=self.dtype)
+        self._array[(self._time_point,) + tuple(key)] = value
+
+        axes = tuple(axis for axis, array in enumerate(self._projection_arrays) if array is not None)
+        statistics = self._statistics_array is not None
+        if len(axes) == 0 and not statistics:
+            return
+        # The projections of the tile along all axes, and its statistics, are computed in a single traversal:
+        tile_projections, tile_statistics = multi_projection(value, axes=axes, statistics=statistics)
+
+        if statistics and value.size > 0:
+            # Tiles are sampled in proportion to their size:
+            max_samples = max(1, (default_max_samples * value.size) // max(1, int(numpy.prod(self.shape))))
+            samples = sample_values(value, max_samples)
+            with self._lock:
+                self._tile_statistics.append(tile_statistics)
+                self._tile_sizes.append(value.size)
+                self._tile_samples.append(samples)
+
+        for axis, projection in zip(axes, tile_projections["max"]):
+            projection_key = tuple(s for i, s in enumerate(key) if i != axis)
+            with self._lock:
+                if self._projections[axis] is None:
+                    projection_shape = tuple(s for i, s in enumerate(self.shape) if i != axis)
+                    self._projections[axis] = numpy.full(projection_shape, self._smallest_value(), dtype=self.dtype)
+                accumulated = self._projections[axis][projection_key]
+                numpy.maximum(accumulated, projection, out=accumulated)
+
+    def close(self):
+        """Writes the accumulated projections and statistics"""
+        for projection_array, projection in zip(self._projection_arrays, self._projections):
+            if projection_array is not None and projection is not None:
+                projection_array[self._time_point] = projection
+        self._projections = [None] * len(self._projection_arrays)
+        if self._statistics_array is not None and len(self._tile_statistics) > 0:
+            self._statistics_array[self._time_point] = statistics_row(
+                merge_statistics(self._tile_statistics, self._tile_sizes),
+                numpy.concatenate(self._tile_samples),
+                sum(self._tile_sizes),
+                nb_bins=self._statistics_array.shape[1] - statistics_length(0, self._quantile_levels),
+                quantile_levels=self._quantile_levels,
+            )
+        self._tile_statistics, self._tile_sizes, self._tile_samples = [], [], []
+        if self._on_close is not None:
+            self._on_close()
+
+    def _smallest_value(self):
+        if numpy.issubdtype(self.dtype, numpy.bool_):
+            return False
+        elif numpy.issubdtype(self.dtype, numpy.integer):
+            return numpy.iinfo(self.dtype).min
+        return -numpy.inf
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        # projections are only written if all tiles were written successfully:
+        if type is None:
+            self.close()
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class WriteBehindQueue:
+    def __init__(self, workers: int = 1, max_pending: int = 2):
+        """
+        Bounded queue of writes executed by background threads, so that the thread submitting writes can carry on
+        computing while data is compressed and written. Submitting blocks once the maximum number of pending writes
+        is reached, which bounds the memory held by pending writes. The first error raised by a write is deferred,
+        and raised by the next call to submit or flush.
+
+        Parameters
+        ----------
+        workers : number of writer threads.
+        max_pending : maximum number of writes queued or being executed.
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="write_behind")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._pending: List[Future] = []
+        self._error: Optional[BaseException] = None
+
+    def submit(self, function: Callable, *args, **kwargs):
+        """
+        Queues a write, blocks while the queue is full.
+
+        Parameters
+        ----------
+        function : function doing the write.
+        args, kwargs : arguments of the function.
+        """
+        self._raise_deferred_error()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(function, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.append(future)
+        future.add_done_callback(self._done)
+
+    def flush(self):
+        """
+        Waits for all pending writes to be done, and raises the first error raised by a write, if any.
+        """
+        while True:
+            with self._lock:
+                pending = list(self._pending)
+            if len(pending) == 0:
+                break
+            for future in pending:
+                # errors are collected by the done callback:
+                future.exception()
+        self._raise_deferred_error()
+
+    def close(self):
+        """
+        Flushes the queue and stops the writer threads.
+        """
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending.remove(future)
+            if self._error is None and not future.cancelled() and future.exception() is not None:
+                self._error = future.exception()
+        self._slots.release()
+
+    def _raise_deferred_error(self):
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
@@ -1,3 +1,4 @@
+import copy
 import os
 import re
 import shutil
@@ -10,17 +11,50 @@ import dask
 import numpy
 import zarr
 from arbol.arbol import aprint, asection
-from ome_zarr.format import CurrentFormat
+from joblib import Parallel, delayed
 from zarr import Blosc, CopyError, Group, convenience, open_group
+from zarr.util import json_dumps, json_loads
 
 from dexp.datasets.base_dataset import BaseDataset
-from dexp.datasets.ome_dataset import default_omero_metadata
+from dexp.datasets.chunk_cache import CachedArray, ChunkCache
+from dexp.datasets.chunking import compute_chunks
+from dexp.datasets.intensity_statistics import (
+    IntensityStatistics,
+    default_nb_bins,
+    default_quantile_levels,
+    sample_values,
+    statistics_length,
+    statistics_row,
+)
+from dexp.datasets.ome_dataset import (
+    default_multiscales_metadata,
+    default_omero_metadata,
+    downsample_stack,
+)
+from dexp.datasets.sharded_store import ShardedStore
+from dexp.datasets.stack_writer import StackWriter
+from dexp.datasets.write_behind import WriteBehindQueue
+from dexp.processing.utils.multi_projection import multi_projection
 from dexp.utils.backends import Backend
 from dexp.utils.config import config_blosc
+from dexp.utils.misc import compute_num_workers
+
+_consolidated_metadata_key = ".zmetadata"
+# Folder of the completion manifest of a channel, within the channel group:
+_completion_folder = ".completed"
 
 
 class ZDataset(BaseDataset):
-    def __init__(self, path: str, mode: str = "r", store: str = None, parent: Optional[BaseDataset] = None):
+    def __init__(
+        self,
+        path: str,
+        mode: str = "r",
+        store: str = None,
+        parent: Optional[BaseDataset] = None,
+        chunk_cache_size: Optional[int] = None,
+        write_workers: int = 0,
+        max_pending_writes: int = 2,
+    ):
         """Instantiates a Zarr dataset (and opens it)
 
         Parameters
@@ -32,7 +66,15 @@ class ZDataset(BaseDataset):
             'a' means read/write (create if doesn't exist);
             'w' means create (overwrite if exists);
             'w-' means create (fail if exists).
-        store : type of store, can be 'dir', 'ndir', or 'zip'
+        store : type of store, can be 'dir', 'ndir', 'zip', or 'shard' (chunks packed in one shard file per time point,
+            see ShardedStore)
+        parent : dataset from which this dataset is derived, its metadata and command line history are copied.
+        chunk_cache_size : if not None, size in bytes of a cache of decoded chunks shared by all arrays and projections
+            of this dataset, useful when the same chunks are read repeatedly (interactive viewing, overlapping tiles).
+        write_workers : if strictly positive, number of background threads writing the stacks given to write_stack,
+            and computing their projections, so that the caller can carry on with the next stack. Pending writes are
+            flushed, and deferred errors raised, by flush and close.
+        max_pending_writes : maximum number of stacks waiting to be written, write_stack blocks beyond that.
 
         Returns
         -------
@@ -47,6 +89,11 @@ class ZDataset(BaseDataset):
         self._root_group = None
         self._arrays = {}
         self._projections = {}
+        self._statistics = {}
+        self._chunk_cache = None if chunk_cache_size is None else ChunkCache(chunk_cache_size)
+        self._mode = mode
+        self._metadata = None
+        self._write_queue = None if write_workers <= 0 else WriteBehindQueue(write_workers, max_pending_writes)
 
         # Open remote store:
         if "http" in path:
@@ -54,7 +101,7 @@ class ZDataset(BaseDataset):
             from fsspec import get_mapper
 
             self.store = get_mapper(path)
-            self._root_group = zarr.open(self.store, mode=mode)
+            self._root_group = self._open_root_group(self.store, mode)
             self._initialise_existing()
             return
 
@@ -65,6 +112,8 @@ class ZDataset(BaseDataset):
                 path = path if path.endswith(".zarr.zip") else path + ".zarr.zip"
             elif path.endswith(".nested.zarr") or path.endswith(".nested.zarr/") or store == "ndir":
                 path = path if path.endswith(".nested.zarr") else path + ".nested.zarr"
+            elif path.endswith(".sharded.zarr") or path.endswith(".sharded.zarr/") or store == "shard":
+                path = path if path.endswith(".sharded.zarr") else path + ".sharded.zarr"
             elif path.endswith(".zarr") or path.endswith(".zarr/") or store == "dir":
                 path = path if path.endswith(".zarr") else path + ".zarr"
 
@@ -97,12 +146,17 @@ class ZDataset(BaseDataset):
             elif isdir(path) and (path.endswith(".nested.zarr") or path.endswith(".nested.zarr/") or store == "ndir"):
                 aprint("Opening as Nested Directory store")
                 self._store = zarr.storage.NestedDirectoryStore(path)
+            elif isdir(path) and (
+                path.endswith(".sharded.zarr") or path.endswith(".sharded.zarr/") or store == "shard"
+            ):
+                aprint("Opening as Sharded store")
+                self._store = ShardedStore(path)
             elif isdir(path) and (path.endswith(".zarr") or path.endswith(".zarr/") or store == "dir"):
                 aprint("Opening as Directory store")
                 self._store = zarr.storage.DirectoryStore(path)
 
             aprint(f"Opening with mode: {mode}")
-            self._root_group = open_group(self._store, mode=mode)
+            self._root_group = self._open_root_group(self._store, mode)
             self._initialise_existing()
         elif "a" in mode or "w" in mode:
             aprint(f"Creating Zarr storage: '{path}' with read/write mode: '{mode}' and store type: '{store}'")
@@ -115,13 +169,17 @@ class ZDataset(BaseDataset):
                 elif path.endswith(".nested.zarr") or path.endswith(".nested.zarr/") or store == "ndir":
                     aprint("Opening as Nested Directory store")
                     self._store = zarr.storage.NestedDirectoryStore(path)
+                elif path.endswith(".sharded.zarr") or path.endswith(".sharded.zarr/") or store == "shard":
+                    aprint("Opening as Sharded store")
+                    self._store = ShardedStore(path)
                 elif path.endswith(".zarr") or path.endswith(".zarr/") or store == "dir":
                     aprint("Opening as Directory store")
                     self._store = zarr.storage.DirectoryStore(path)
                 else:
                     aprint(
                         f"Cannot open {path}, needs to be a zarr directory (directory that ends with `.zarr` or "
-                        + "`.nested.zarr` for nested folders), or a zipped zarr file (file that ends with `.zarr.zip`)"
+                        + "`.nested.zarr` for nested folders, `.sharded.zarr` for sharded chunks), "
+                        + "or a zipped zarr file (file that ends with `.zarr.zip`)"
                     )
 
                 self._root_group = zarr.convenience.open(self._store, mode=mode)
@@ -143,6 +201,33 @@ class ZDataset(BaseDataset):
         if mode in ("a", "w", "w-"):
             self.append_cli_history(parent if isinstance(parent, ZDataset) else None)
 
+    @staticmethod
+    def _open_root_group(store: Any, mode: str) -> Group:
+        if mode == "r":
+            # The whole hierarchy is read at once from the consolidated metadata, if the dataset has it:
+            try:
+                root_group = zarr.open_consolidated(store, mode="r")
+                aprint("Opened with consolidated metadata")
+                return root_group
+            except KeyError:
+                pass
+        elif _consolidated_metadata_key in store:
+            # The consolidated metadata is written again when closing the dataset, until then it might be outdated:
+            del store[_consolidated_metadata_key]
+        return open_group(store, mode=mode)
+
+    def _consolidate_metadata(self):
+        # Only the metadata keys of the hierarchy are gathered, instead of listing all the keys (chunks) of the store:
+        paths = [""]
+        self._root_group.visitvalues(lambda item: paths.append(item.path + "/"))
+        metadata = {}
+        for path in paths:
+            for name in (".zgroup", ".zarray", ".zattrs"):
+                key = path + name
+                if key in self._store:
+                    metadata[key] = json_loads(self._store[key])
+        self._store[_consolidated_metadata_key] = json_dumps({"zarr_consolidated_format": 1, "metadata": metadata})
+
     def _initialise_existing(self):
         self._channels = [channel for channel, _ in self._root_group.groups()]
 
@@ -159,6 +244,8 @@ class ZDataset(BaseDataset):
                     # print(f'Opening array at {path}:{channel}/{item_name} ')
                     self._arrays[channel] = array
                     # self._arrays[channel] = from_zarr(path, component=f"{channel}/{item_name}")
+                elif item_name == self._statistics_name(channel):
+                    self._statistics[item_name] = array
                 elif (item_name.startswith(channel) or item_name.startswith("fused")) and "_projection_" in item_name:
                     self._projections[item_name] = array
 
@@ -170,19 +257,40 @@ class ZDataset(BaseDataset):
             return groups[0]
 
     @staticmethod
-    def _default_chunks(shape: Tuple[int], dtype: Union[str, numpy.dtype], max_size: int = 2147483647) -> Tuple[int]:
-        chunk = (1, 64, 256, 256)  # testing smaller chunks
-        # if not isinstance(dtype, numpy.dtype):
-        #     dtype = numpy.dtype(dtype)
-        # width = shape[-1]
-        # height = shape[-2]
-        # depth = min(max_size // (dtype.itemsize * width * height), shape[-3])
-        # chunk = (1, depth, height, width)
-        return chunk[-len(shape) :]
+    def _default_chunks(
+        shape: Tuple[int], dtype: Union[str, numpy.dtype], access_pattern: str = "view", chunk_bytes: int = None
+    ) -> Tuple[int]:
+        return compute_chunks(shape, dtype, access_pattern=access_pattern, chunk_bytes=chunk_bytes)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Copies sent to other processes write synchronously, pending writes stay with this dataset:
+        state["_write_queue"] = None
+        return state
+
+    def flush(self):
+        """
+        Waits for the pending writes of write_stack to be done, and raises the first error of these writes, if any.
+        """
+        if self._write_queue is not None:
+            self._write_queue.flush()
 
     def close(self):
+        if self._write_queue is not None:
+            write_queue, self._write_queue = self._write_queue, None
+            try:
+                write_queue.close()
+            finally:
+                self._close_store()
+        else:
+            self._close_store()
+
+    def _close_store(self):
         # We close the store if it exists, i.e. if we have been writing to the dataset
         if self._store is not None:
+            # Zip stores can't overwrite entries, and are opened quickly anyway:
+            if self._mode != "r" and not isinstance(self._store, zarr.storage.ZipStore):
+                self._consolidate_metadata()
             try:
                 self._store.close()
             except AttributeError:
@@ -190,6 +298,7 @@ class ZDataset(BaseDataset):
 
     def check_integrity(self, channels: Sequence[str] = None) -> bool:
         aprint("Checking integrity of zarr storage, might take some time.")
+        self.flush()
         if channels is None:
             channels = self.channels()
         for channel in channels:
@@ -218,6 +327,7 @@ class ZDataset(BaseDataset):
         return self.get_array(channel).dtype
 
     def info(self, channel: str = None, cli_history: bool = True) -> str:
+        self.flush()
         info_str = ""
         if channel is not None:
             info_str += (
@@ -247,9 +357,10 @@ class ZDataset(BaseDataset):
         if cli_history:
             info_str += ".\n\n"
             key = "cli_history"
-            if key in self._root_group.attrs:
+            metadata = self.get_metadata()
+            if key in metadata:
                 info_str += "\nCommand line history:\n"
-                commands_list = self._root_group.attrs[key]
+                commands_list = metadata[key]
                 for command in commands_list[:-1]:
                     info_str += " ├──■ '" + command + "' \n"
                 info_str += " └──■ '" + commands_list[-1] + "' \n"
@@ -258,13 +369,14 @@ class ZDataset(BaseDataset):
 
     def get_metadata(self):
         """get the attributes stored in the zarr folder"""
-        attrs = {}
-        for name in self._root_group.attrs:
-            attrs[name] = self._root_group.attrs[name]
-        return attrs
+        # The attributes are read once, and kept in memory until they are modified:
+        if self._metadata is None:
+            self._metadata = self._root_group.attrs.asdict()
+        return copy.deepcopy(self._metadata)
 
     def append_metadata(self, metadata: dict):
         self._root_group.attrs.update(metadata)
+        self._metadata = None
 
     def append_cli_history(self, parent: Optional[BaseDataset]):
         key = "cli_history"
@@ -273,12 +385,12 @@ class ZDataset(BaseDataset):
             parent_metadata = parent.get_metadata()
             cli_history = parent_metadata.get(key, [])
 
-        if key in self._root_group.attrs:
-            cli_history += self._root_group.attrs[key]
+        cli_history += self.get_metadata().get(key, [])
 
         new_command = os.path.basename(sys.argv[0]) + " " + " ".join(sys.argv[1:])
         cli_history.append(new_command)
         self._root_group.attrs[key] = cli_history
+        self._metadata = None
 
     def _load_tensorstore(self, array: zarr.Array):
         import tensorstore as ts
@@ -304,10 +416,11 @@ class ZDataset(BaseDataset):
     ):
         assert (wrap_with_dask != wrap_with_tensorstore) or not wrap_with_dask
         array = self._arrays[channel]
+        if wrap_with_tensorstore:
+            return self._load_tensorstore(array)
+        array = self._cached(array)
         if wrap_with_dask:
             return dask.array.from_array(array, chunks=array.chunks)
-        elif wrap_with_tensorstore:
-            return self._load_tensorstore(array)
         return array
 
     def get_stack(self, channel: str, time_point: int, per_z_slice: bool = False, wrap_with_dask: bool = False):
@@ -318,30 +431,184 @@ class ZDataset(BaseDataset):
         array = self._projections.get(self._projection_name(channel, axis))
         if array is None:
             return
+        array = self._cached(array)
         return dask.array.from_array(array, chunks=array.chunks) if wrap_with_dask else array
 
+    def _cached(self, array: zarr.Array) -> Any:
+        return array if self._chunk_cache is None else CachedArray(array, self._chunk_cache)
+
+    @property
+    def chunk_cache(self) -> Optional[ChunkCache]:
+        """
+        Cache of decoded chunks of this dataset, None if disabled. Reports hit-rate statistics, and its maximum size
+        can be changed.
+        """
+        return self._chunk_cache
+
     def _projection_name(self, channel: str, axis: int):
         return f"{channel}_projection_{axis}"
 
     def write_stack(self, channel: str, time_point: int, stack_array: numpy.ndarray):
+        if self._write_queue is None:
+            self._write_stack(channel, time_point, stack_array)
+        else:
+            # The stack is copied, the caller is free to reuse its buffer:
+            stack_array = Backend.to_numpy(stack_array, force_copy=True)
+            self._write_queue.submit(self._write_stack, channel, time_point, stack_array)
+
+    def _write_stack(self, channel: str, time_point: int, stack_array: numpy.ndarray):
         array_in_zarr = self.get_array(channel=channel, wrap_with_dask=False)
         array_in_zarr[time_point] = stack_array
 
-        for axis in range(stack_array.ndim):
-            xp = Backend.get_xp_module()
-            projection = xp.max(stack_array, axis=axis)
-            projection_in_zarr = self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
-            projection_in_zarr[time_point] = projection
+        projections_in_zarr = {
+            axis: self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
+            for axis in range(stack_array.ndim)
+        }
+        projections_in_zarr = {axis: array for axis, array in projections_in_zarr.items() if array is not None}
+        statistics_in_zarr = self._statistics.get(self._statistics_name(channel))
+        if len(projections_in_zarr) > 0 or statistics_in_zarr is not None:
+            # All projections, and the intensity statistics, are computed in a single traversal of the stack:
+            projections, stats = multi_projection(
+                stack_array, axes=tuple(projections_in_zarr), statistics=statistics_in_zarr is not None
+            )
+            for projection_in_zarr, projection in zip(projections_in_zarr.values(), projections["max"]):
+                projection_in_zarr[time_point] = projection
+            if statistics_in_zarr is not None:
+                statistics_in_zarr[time_point] = self._statistics_row(statistics_in_zarr, stack_array, stats)
+
+        self.mark_completed(channel, time_point)
+
+    @staticmethod
+    def _statistics_row(statistics_in_zarr: zarr.Array, stack_array: numpy.ndarray, stats: dict) -> numpy.ndarray:
+        quantile_levels = statistics_in_zarr.attrs["quantiles"]
+        return statistics_row(
+            stats,
+            sample_values(stack_array),
+            stack_array.size,
+            nb_bins=statistics_in_zarr.shape[1] - statistics_length(0, quantile_levels),
+            quantile_levels=quantile_levels,
+        )
+
+    def _statistics_name(self, channel: str) -> str:
+        return f"{channel}_statistics"
+
+    def get_statistics_array(self, channel: str) -> Optional[zarr.Array]:
+        """
+        Returns the array of intensity statistics of a channel, one row per time point, None if there is none.
+        """
+        return self._statistics.get(self._statistics_name(channel))
+
+    def get_statistics(self, channel: str, time_point: Optional[int] = None) -> Optional[IntensityStatistics]:
+        """
+        Returns the intensity statistics of a channel recorded at write time: exact min, max, mean and standard
+        deviation, and approximate quantiles and histogram, for one or all time points. Contrast limits and
+        normalisation ranges can be obtained from them without reading the stacks.
+
+        Parameters
+        ----------
+        channel : channel to get the statistics of.
+        time_point : time point to get the statistics of, all time points if None.
+
+        Returns
+        -------
+        Intensity statistics, None if the channel has no recorded statistics.
+        """
+        statistics_in_zarr = self._statistics.get(self._statistics_name(channel))
+        if statistics_in_zarr is None:
+            return None
+        self.flush()
+        rows = statistics_in_zarr[...] if time_point is None else statistics_in_zarr[time_point]
+        return IntensityStatistics(rows, quantile_levels=statistics_in_zarr.attrs["quantiles"])
+
+    def _completion_path(self, channel: str) -> str:
+        return f"{channel}/{_completion_folder}"
+
+    def mark_completed(self, channel: str, time_point: int):
+        """
+        Records a time point of a channel as completely written (stack and projections) in the completion manifest
+        of the channel. Each time point is recorded with its own (empty) key, so that concurrent writers, threads or
+        processes, never overwrite each other's records, and so that a record is written atomically.
+
+        Parameters
+        ----------
+        channel : channel written.
+        time_point : time point written.
+        """
+        self._root_group.chunk_store[f"{self._completion_path(channel)}/{int(time_point)}"] = b""
+
+    def completed_time_points(self, channel: str) -> List[int]:
+        """
+        Returns the sorted time points of a channel recorded as completely written in its completion manifest.
+
+        Parameters
+        ----------
+        channel : channel to get the completed time points of.
+        """
+        self.flush()
+        keys = zarr.storage.listdir(self._root_group.chunk_store, self._completion_path(channel))
+        return sorted(int(key) for key in keys if key.isdigit())
+
+    def missing_time_points(self, channel: str) -> List[int]:
+        """
+        Returns the time points of a channel that are not recorded as completely written, i.e. the time points that
+        remain to be written when resuming an interrupted operation.
+
+        Parameters
+        ----------
+        channel : channel to get the missing time points of.
+        """
+        completed = set(self.completed_time_points(channel))
+        return [t for t in range(self.nb_timepoints(channel)) if t not in completed]
+
+    def stack_writer(self, channel: str, time_point: int) -> StackWriter:
+        """
+        Returns a writer for a given time point of a channel, to be used as 'out' target of scatter_gather_i2i,
+        tiles are written straight into the zarr array and projections are computed incrementally.
+
+        Parameters
+        ----------
+        channel : channel to write to.
+        time_point : time point to write.
+        """
+        array_in_zarr = self.get_array(channel=channel, wrap_with_dask=False)
+        projections = [
+            self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
+            for axis in range(array_in_zarr.ndim - 1)
+        ]
+        statistics_in_zarr = self._statistics.get(self._statistics_name(channel))
+        return StackWriter(
+            array_in_zarr,
+            time_point,
+            projections,
+            statistics_array=statistics_in_zarr,
+            quantile_levels=None if statistics_in_zarr is None else statistics_in_zarr.attrs["quantiles"],
+            on_close=lambda: self.mark_completed(channel, time_point),
+        )
 
     def write_array(self, channel: str, array: numpy.ndarray):
         array_in_zarr = self.get_array(channel=channel, wrap_with_dask=False)
         array_in_zarr[...] = array
 
-        for axis in range(array.ndim - 1):
-            xp = Backend.get_xp_module()
-            projection = xp.max(array, axis=axis + 1)
-            projection_in_zarr = self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
-            projection_in_zarr[...] = projection
+        projections_in_zarr = {
+            axis: self.get_projection_array(channel=channel, axis=axis, wrap_with_dask=False)
+            for axis in range(array.ndim - 1)
+        }
+        projections_in_zarr = {axis: array for axis, array in projections_in_zarr.items() if array is not None}
+        statistics_in_zarr = self._statistics.get(self._statistics_name(channel))
+        if len(projections_in_zarr) > 0 or statistics_in_zarr is not None:
+            # The projections and intensity statistics of each time point are computed in a single traversal:
+            for time_point in range(array.shape[0]):
+                stack_array = array[time_point]
+                projections, stats = multi_projection(
+                    stack_array, axes=tuple(projections_in_zarr), statistics=statistics_in_zarr is not None
+                )
+                for projection_in_zarr, projection in zip(projections_in_zarr.values(), projections["max"]):
+                    projection_in_zarr[time_point] = projection
+                if statistics_in_zarr is not None:
+                    statistics_in_zarr[time_point] = self._statistics_row(statistics_in_zarr, stack_array, stats)
+
+        for time_point in range(array.shape[0]):
+            self.mark_completed(channel, time_point)
 
     def add_channel(
         self,
@@ -350,9 +617,13 @@ class ZDataset(BaseDataset):
         dtype: numpy.dtype,
         chunks: Sequence[int] = None,
         enable_projections: bool = True,
+        enable_statistics: bool = True,
         codec: str = "zstd",
         clevel: int = 3,
         value: Optional[Any] = None,
+        access_pattern: str = "view",
+        chunk_bytes: Optional[int] = None,
+        exist_ok: bool = False,
     ) -> Any:
         """Adds a channel to this dataset
 
@@ -361,9 +632,17 @@ class ZDataset(BaseDataset):
         name : name of channel.
         shape : shape of correspodning array.
         dtype : dtype of array.
-        chunks: chunks shape.
+        chunks: chunks shape, if None chunks are chosen for the given access pattern and chunk size.
+        enable_statistics: if True, intensity statistics of each time point are recorded when it is written,
+            see get_statistics.
         codec: Compression codec to be used ('zstd', 'blosclz', 'lz4', 'lz4hc', 'zlib' or 'snappy').
         clevel: An integer between 0 and 9 specifying the compression level.
+        value: fill value of the array, the largest value of the dtype by default.
+        access_pattern: intended access pattern: 'stack' for whole time points, 'slice' for planes, or 'view'
+            for sub-volumes, see compute_chunks.
+        chunk_bytes: target compressed chunk size in bytes, if None the default of the access pattern is used.
+        exist_ok: if True and the channel already exists with the same shape and dtype, its array is returned as is,
+            for example to resume writing it.
 
         Returns
         -------
@@ -373,10 +652,19 @@ class ZDataset(BaseDataset):
         """
         # check if channel exists:
         if name in self.channels():
-            raise ValueError("Channel already exist!")
+            if not exist_ok:
+                raise ValueError("Channel already exist!")
+            array = self._arrays[name]
+            if array.shape != tuple(shape) or array.dtype != numpy.dtype(dtype):
+                raise ValueError(
+                    f"Channel '{name}' already exists with shape {array.shape} and dtype {array.dtype}, "
+                    + f"instead of shape {tuple(shape)} and dtype {numpy.dtype(dtype)}"
+                )
+            aprint(f"Channel '{name}' already exists, with time points: {self.completed_time_points(name)} completed")
+            return array
 
         if chunks is None:
-            chunks = self._default_chunks(shape, dtype)
+            chunks = self._default_chunks(shape, dtype, access_pattern=access_pattern, chunk_bytes=chunk_bytes)
 
         aprint(f"chunks={chunks}")
 
@@ -426,6 +714,21 @@ class ZDataset(BaseDataset):
                 )
                 self._projections[proj_name] = proj_array
 
+        if enable_statistics:
+            statistics_name = self._statistics_name(name)
+            length = statistics_length(default_nb_bins, default_quantile_levels)
+            # One row per time point, NaN until the time point is written:
+            statistics_array = channel_group.full(
+                name=statistics_name,
+                shape=(shape[0], length),
+                dtype=numpy.float64,
+                chunks=(1, length),
+                compressor=compressor,
+                fill_value=numpy.nan,
+            )
+            statistics_array.attrs["quantiles"] = list(default_quantile_levels)
+            self._statistics[statistics_name] = statistics_array
+
         return array
 
     def add_channels_to(
@@ -444,7 +747,7 @@ class ZDataset(BaseDataset):
         path : zarr dataset or path of zarr dataset.
         channels: list or tuple of channels to add
         rename: list or tuple of new names for channels
-        store: type of zarr store: 'dir' or 'zip', only usefull if store does not exist yet!
+        store: type of zarr store: 'dir', 'ndir', 'zip' or 'shard', only usefull if store does not exist yet!
         add_projections: If True the projections are also copied.
         overwrite: overwrite destination (not fully functional for zip stores!)
 
@@ -492,6 +795,15 @@ class ZDataset(BaseDataset):
                                     if_exists="replace" if overwrite else "raise",
                                 )
 
+                        statistics_array = self._statistics.get(self._statistics_name(channel))
+                        if statistics_array is not None:
+                            convenience.copy(
+                                source=statistics_array,
+                                dest=dest_group,
+                                name=self._statistics_name(new_name),
+                                if_exists="replace" if overwrite else "raise",
+                            )
+
             except (CopyError, NotImplementedError):
                 aprint("Channel already exists, set option '-w' to force overwriting! ")
 
@@ -559,6 +871,11 @@ class ZDataset(BaseDataset):
         """
         Returns the index of the first uninitialized time point or the last time point if it is fully initialized
         """
+        completed = self.completed_time_points(channel)
+        if len(completed) > 0:
+            return max(completed)
+
+        # Datasets written without completion manifest:
         array = self.get_array(channel)
         prog = re.compile(r"\.".join([r"\d+"] * min(1, array.ndim)))
         initialized = {
@@ -566,8 +883,32 @@ class ZDataset(BaseDataset):
         }
         return max(initialized)
 
-    def to_ome_zarr(self, path: str, chunks: Optional[Sequence[int]] = None, force_dtype: Optional[int] = None):
-        # TODO add multiscale support
+    def to_ome_zarr(
+        self,
+        path: str,
+        chunks: Optional[Sequence[int]] = None,
+        force_dtype: Optional[int] = None,
+        nb_levels: Optional[int] = None,
+        downscale: Sequence[int] = (1, 2, 2),
+        workers: int = 1,
+    ):
+        """
+        Converts this dataset to an OME-Zarr image of axes (t, c, z, y, x), with a multiscale resolution pyramid.
+        Levels are written in a single pass over the dataset: each stack is read once, and each level is
+        downsampled from the previous one. Stacks are processed in parallel, memory usage is thus bounded by
+        a few stacks per worker.
+
+        Parameters
+        ----------
+        path : path of the OME-Zarr image to write.
+        chunks : chunks of the image (5-dimensional), the same chunks are used for all levels.
+        force_dtype : dtype of the image, must be given if channels have different dtypes.
+        nb_levels : number of levels including the full resolution level, if None levels are added until
+            the last level fits in a single chunk along Y and X.
+        downscale : downscaling factors along (z, y, x) between two consecutive levels.
+        workers : number of (time point, channel) stacks processed in parallel,
+            negative numbers n correspond to: number_of _cores / |n|
+        """
 
         ch = self.channels()[0]
         dexp_shape = self.shape(ch)
@@ -594,17 +935,56 @@ class ZDataset(BaseDataset):
         if len(chunks) != 5:
             raise ValueError(f"Chunks must be 5-dimensional. Found {chunks}.")
 
-        ome_zarr_shape = (dexp_shape[0], len(self.channels()), *dexp_shape[1:])
+        downscale = tuple(downscale)
+        if len(downscale) != 3 or any(f < 1 for f in downscale):
+            raise ValueError(f"Downscale factors must be 3 positive integers, one per spatial axis. Found {downscale}.")
 
-        group = zarr.group(zarr.NestedDirectoryStore(path))
-        ome_array = group.create_dataset("0", shape=ome_zarr_shape, dtype=dtype, chunks=chunks)
+        # Shapes of the levels along (z, y, x):
+        level_shapes = [tuple(dexp_shape[1:])]
+        while (nb_levels is None and any(s > c for s, c in zip(level_shapes[-1][1:], chunks[3:]))) or (
+            nb_levels is not None and len(level_shapes) < nb_levels
+        ):
+            next_shape = tuple(-(-s // f) for s, f in zip(level_shapes[-1], downscale))
+            if next_shape == level_shapes[-1]:
+                break
+            level_shapes.append(next_shape)
+
+        nb_timepoints = self.nb_timepoints(ch)
+        nb_channels = len(self.channels())
 
-        for t in range(self.nb_timepoints(ch)):
-            aprint(f"Converting time point {t} ...", end="\r")
-            for c, channel in enumerate(self.channels()):
-                ome_array[t, c] = self.get_stack(channel, t)
-        aprint("")
+        group = zarr.group(zarr.NestedDirectoryStore(path))
+        ome_arrays = [
+            group.create_dataset(
+                str(level),
+                shape=(nb_timepoints, nb_channels) + level_shape,
+                dtype=dtype,
+                chunks=tuple(min(c, s) for c, s in zip(chunks, (nb_timepoints, nb_channels) + level_shape)),
+            )
+            for level, level_shape in enumerate(level_shapes)
+        ]
+
+        def _convert(t: int, c: int, channel: str):
+            stack = numpy.asarray(self.get_stack(channel, t), dtype=dtype)
+            for level, ome_array in enumerate(ome_arrays):
+                if level > 0:
+                    stack = downsample_stack(stack, downscale)
+                ome_array[t, c] = stack
+
+        with asection(f"Converting to OME-Zarr with {len(level_shapes)} levels of shapes: {level_shapes}"):
+            blocks = [(t, c, channel) for t in range(nb_timepoints) for c, channel in enumerate(self.channels())]
+            n_jobs = compute_num_workers(workers, len(blocks))
+            if chunks[0] > 1 or chunks[1] > 1:
+                # stacks sharing chunks cannot be written concurrently:
+                n_jobs = 1
+            if n_jobs == 1:
+                for t, c, channel in blocks:
+                    aprint(f"Converting time point {t} of channel {channel} ...")
+                    _convert(t, c, channel)
+            else:
+                Parallel(n_jobs=n_jobs, backend="threading")(delayed(_convert)(*block) for block in blocks)
 
-        group.attrs["multiscales"] = [{"version": CurrentFormat().version, "datasets": [{"path": "0"}]}]
+        group.attrs["multiscales"] = [
+            default_multiscales_metadata(self._path, len(level_shapes), self.get_resolution(ch), downscale)
+        ]
 
         group.attrs["omero"] = default_omero_metadata(self._path, self.channels(), dtype)
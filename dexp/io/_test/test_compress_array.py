@@ -1,6 +1,14 @@
+import tempfile
+from os.path import join
+
 import numpy
 
-from dexp.io.compress_array import compress_array, decompress_array
+from dexp.io.compress_array import (
+    compress_array,
+    compressed_array_index,
+    decompress_array,
+    decompress_array_range,
+)
 
 
 def do_test(array_dc, array_uc, min_num_chunks=0):
@@ -41,3 +49,22 @@ def test_compress_many_chunks():
     array_uc = numpy.linspace(0, 1024, 1000).astype(numpy.uint16)
     array_dc = numpy.empty_like(array_uc)
     do_test(array_dc, array_uc, min_num_chunks=987)
+
+
+def test_decompress_array_range():
+    array_uc = numpy.linspace(0, 1024, 10000).astype(numpy.uint16)
+    compressed_array = compress_array(array_uc, min_num_chunks=7)
+    index = compressed_array_index(compressed_array)
+    assert len(index) > 1
+    assert index[-1, 0] + index[-1, 1] == len(compressed_array)
+    assert index[-1, 2] + index[-1, 3] == array_uc.nbytes
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_name = join(tmpdir, "array.blc")
+        with open(file_name, "wb") as compressed_file:
+            compressed_file.write(compressed_array)
+
+        for start, stop in ((0, 10000), (1234, 5678), (9999, 10000)):
+            array_dc = numpy.empty(stop - start, dtype=numpy.uint16)
+            decompress_array_range(file_name, index, 2 * start, 2 * stop, array_dc, workers=4)
+            assert (array_dc == array_uc[start:stop]).all()
@@ -1,9 +1,18 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import SEEK_END, BytesIO
 from math import ceil
+from typing import BinaryIO, Union
 
 import blosc
+import numpy
 from blosc import compress_ptr, decompress_ptr, get_cbuffer_sizes
+from numcodecs.blosc import decompress as blosc_decompress
 from numpy import ndarray
 
+# Length of the header of Blosc frames:
+_blosc_header_length = 16
+
 
 def compress_array(array: ndarray, clevel: int = 3, compressor: str = "lz4", min_num_chunks: int = 0) -> bytes:
     """
@@ -110,3 +119,94 @@ def decompress_array(compressed_bytes, out_array: ndarray = None) -> ndarray:
         address_decompressed += num_decompressed_bytes
 
     return out_array
+
+
+def compressed_array_index(compressed: Union[bytes, BinaryIO]) -> numpy.ndarray:
+    """
+    Builds the index of the Blosc frames of an array compressed with the 'compress_array' function,
+    only the frame headers are read.
+
+    Parameters
+    ----------
+    compressed: buffer containing compressed data, or binary file opened for reading.
+
+    Returns
+    -------
+    Array of shape (number of frames, 4) with, for each frame: the offset and length of the compressed frame,
+    and the offset and length of the corresponding decompressed bytes.
+
+    """
+    if isinstance(compressed, (bytes, bytearray, memoryview)):
+        compressed = BytesIO(compressed)
+
+    num_of_compressed_bytes = compressed.seek(0, SEEK_END)
+    offset_compressed = 0
+    offset_decompressed = 0
+
+    frames = []
+    while num_of_compressed_bytes - offset_compressed >= _blosc_header_length:
+        compressed.seek(offset_compressed)
+        num_decompressed_bytes, num_compressed_bytes, _ = get_cbuffer_sizes(compressed.read(_blosc_header_length))
+        frames.append((offset_compressed, num_compressed_bytes, offset_decompressed, num_decompressed_bytes))
+        offset_compressed += num_compressed_bytes
+        offset_decompressed += num_decompressed_bytes
+
+    return numpy.asarray(frames, dtype=numpy.int64).reshape(-1, 4)
+
+
+def decompress_array_range(
+    file_name: str, index: numpy.ndarray, start: int, stop: int, out_array: ndarray = None, workers: int = 1
+) -> ndarray:
+    """
+    Decompresses a range of bytes of an array compressed with the 'compress_array' function and stored in a file.
+    Only the frames overlapping with the range are read and decompressed, frames are decompressed in parallel.
+
+    Parameters
+    ----------
+    file_name: file containing the compressed data.
+    index: index of the Blosc frames as returned by 'compressed_array_index'.
+    start: first byte of the range, in the decompressed array.
+    stop: end of the range (excluded), in the decompressed array.
+    out_array: contiguous array of _correct_ size (stop - start bytes) to put the decompressed data in.
+    workers: number of frames decompressed in parallel, negative numbers n correspond to: number_of _cores / |n|
+
+    Returns
+    -------
+    Same array as passed as 'out_array'
+
+    """
+    if not out_array.flags.c_contiguous:
+        raise ValueError("Output array must be contiguous.")
+    out_bytes = out_array.reshape(-1).view(numpy.uint8)
+    if out_bytes.size != stop - start:
+        raise ValueError(f"Output array has {out_bytes.size} bytes, {stop - start} bytes expected.")
+
+    frames = index[(index[:, 2] < stop) & (index[:, 2] + index[:, 3] > start)]
+    if workers < 0:
+        workers = max(1, os.cpu_count() // -workers)
+
+    with open(file_name, "rb") as compressed_file:
+        fd = compressed_file.fileno()
+
+        def _decompress(frame):
+            offset_compressed, num_compressed_bytes, offset_decompressed, num_decompressed_bytes = map(int, frame)
+            compressed_chunk = os.pread(fd, num_compressed_bytes, offset_compressed)
+            begin = max(start, offset_decompressed)
+            end = min(stop, offset_decompressed + num_decompressed_bytes)
+            if begin == offset_decompressed and end == offset_decompressed + num_decompressed_bytes:
+                # The whole frame is in the range, it is decompressed in place:
+                blosc_decompress(compressed_chunk, out_bytes[begin - start : end - start])
+            else:
+                decompressed = numpy.frombuffer(blosc_decompress(compressed_chunk), dtype=numpy.uint8)
+                out_bytes[begin - start : end - start] = decompressed[
+                    begin - offset_decompressed : end - offset_decompressed
+                ]
+
+        if workers > 1 and len(frames) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_decompress, frames))
+        else:
+            for frame in frames:
+                _decompress(frame)
+
+    return out_array
@@ -1,9 +1,9 @@
 import math
-from typing import Optional, Tuple, Union
+from typing import Callable, Optional, Tuple, Union
 
 import numpy
 
-from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolver import FFTConvolver
 from dexp.processing.filters.kernels.gaussian import gaussian_kernel_nd
 from dexp.processing.filters.kernels.wiener_butterworth import wiener_butterworth_kernel
 from dexp.processing.utils.nan_to_zero import nan_to_zero
@@ -31,7 +31,7 @@ def lucy_richardson_deconvolution(
     blind_spot_mode: str = "median+uniform",
     blind_spot_axis_exclusion: Optional[Union[str, Tuple[int, ...]]] = None,
     eps: float = 1e-12,
-    convolve_method=fft_convolve,
+    convolve_method: Optional[Callable] = None,
     internal_dtype=None,
 ):
     """
@@ -62,7 +62,8 @@ def lucy_richardson_deconvolution(
         For example for a 3D stack where the sampling along z (first axis) is poor,
         use: (0,) so that blind-spot kernel does not extend in z.
     eps: epsilon to avoid dividing by zero
-    convolve_method : convolution method to use
+    convolve_method : convolution method to use, if None the FFTs of the PSF and back projector are computed once
+        and reused across iterations. Pass an instance of FFTConvolver to also reuse them across calls (e.g. tiles).
     internal_dtype : dtype to use internally for computation.
 
     Returns
@@ -181,6 +182,10 @@ def lucy_richardson_deconvolution(
     if padding > 0:
         image = numpy.pad(image, pad_width=padding, mode=padding_mode)
 
+    # Convolution method:
+    if convolve_method is None:
+        convolve_method = FFTConvolver()
+
     # Result array:
     result = xp.full(image.shape, float(xp.mean(image)), dtype=internal_dtype)
 
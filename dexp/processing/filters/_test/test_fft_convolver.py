@@ -0,0 +1,47 @@
+import numpy
+from numpy.linalg import norm
+from skimage.data import camera
+
+from dexp.processing.filters.fft_convolve import fft_convolve
+from dexp.processing.filters.fft_convolver import FFTConvolver
+from dexp.processing.filters.kernels.gaussian import gaussian_kernel_nd
+from dexp.utils.backends import Backend, CupyBackend, NumpyBackend
+
+
+def test_fft_convolver_numpy():
+    with NumpyBackend():
+        _test_fft_convolver()
+
+
+def test_fft_convolver_cupy():
+    try:
+        with CupyBackend():
+            _test_fft_convolver()
+    except ModuleNotFoundError:
+        print("Cupy module not found! Test passes nevertheless!")
+
+
+def _test_fft_convolver():
+    image = camera().astype(numpy.float32) / 255
+    psf = gaussian_kernel_nd(size=9, ndim=2, sigma=2, dtype=numpy.float32)
+
+    image = Backend.to_backend(image)
+    psf = Backend.to_backend(psf)
+
+    convolver = FFTConvolver(in_place=False)
+
+    reference_result = Backend.to_numpy(fft_convolve(image, psf, in_place=False))
+    for _ in range(3):
+        result = Backend.to_numpy(convolver(image, psf))
+        error = norm(reference_result - result, ord=1) / image.size
+        print(error)
+        assert error < 1e-6
+
+    # same kernel content, different instance, same shape: FFT is reused:
+    convolver(image, psf.copy())
+    assert convolver.misses == 1
+    assert convolver.hits == 3
+
+    # different shape: FFT is recomputed:
+    convolver(image[:100, :100], psf)
+    assert convolver.misses == 2
@@ -1,3 +1,5 @@
+from typing import Callable, Optional, Tuple
+
 import numpy
 import scipy.fftpack
 
@@ -20,6 +22,21 @@ def fft_convolve(image1: xpArray, image2: xpArray, mode: str = "reflect", in_pla
     -------
     Convolved image: image1 ○ image2
     """
+    return _fft_convolve(image1, image2, mode=mode, in_place=in_place, internal_dtype=internal_dtype)
+
+
+def _fft_convolve(
+    image1: xpArray,
+    image2: xpArray,
+    mode: str = "reflect",
+    in_place: bool = True,
+    internal_dtype=None,
+    kernel_rfftn: Optional[Callable[[xpArray, Tuple[int, ...]], xpArray]] = None,
+):
+    """
+    Implementation of the FFT based convolution, the real FFT of the second image (kernel) can be delegated
+    to a given function 'kernel_rfftn(kernel, fsize)' -- for example to retrieve it from a cache.
+    """
     xp = Backend.get_xp_module()
     sp = Backend.get_sp_module()
 
@@ -54,7 +71,10 @@ def fft_convolve(image1: xpArray, image2: xpArray, mode: str = "reflect", in_pla
     fsize = tuple(scipy.fftpack.next_fast_len(x) for x in tuple(shape))
 
     image1_fft = sp.fft.rfftn(image1, fsize, overwrite_x=in_place)
-    image2_fft = sp.fft.rfftn(image2, fsize, overwrite_x=in_place)
+    if kernel_rfftn is None:
+        image2_fft = sp.fft.rfftn(image2, fsize, overwrite_x=in_place)
+    else:
+        image2_fft = kernel_rfftn(image2, fsize)
     image1_fft *= image2_fft
     del image2_fft
     result = sp.fft.irfftn(image1_fft, overwrite_x=in_place)
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+from dexp.processing.filters.fft_convolve import _fft_convolve
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+
+class FFTConvolver:
+    def __init__(self, mode: str = "reflect", in_place: bool = True, internal_dtype=None, max_cache_size: int = 8):
+        """
+        FFT based convolution operator that caches the real FFT of the kernels it is given (OTFs),
+        so that repeated convolutions with the same kernel and same padded shape -- for example across
+        Lucy-Richardson iterations and across the tiles of a scatter-gather -- only pay for the FFT of the image.
+        Instances can be called like 'fft_convolve(image, kernel)' and passed as 'convolve_method'.
+
+        Parameters
+        ----------
+        mode : padding mode (see fft_convolve)
+        in_place : If true then the first image might be modified and reused for the result.
+        internal_dtype : dtype to use internally for computation.
+        max_cache_size : maximal number of kernel FFTs kept in the cache, least recently used ones are evicted first.
+        """
+        self.mode = mode
+        self.in_place = in_place
+        self.internal_dtype = internal_dtype
+        self.max_cache_size = max_cache_size
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, image1: xpArray, image2: xpArray) -> xpArray:
+        """
+        Convolves the first image with the second image (kernel), see 'fft_convolve'.
+
+        Parameters
+        ----------
+        image1 : First image
+        image2 : Second image, its FFT is cached.
+
+        Returns
+        -------
+        Convolved image: image1 ○ image2
+        """
+        return _fft_convolve(
+            image1,
+            image2,
+            mode=self.mode,
+            in_place=self.in_place,
+            internal_dtype=self.internal_dtype,
+            kernel_rfftn=self._kernel_rfftn,
+        )
+
+    def clear(self):
+        """Clears the cache of kernel FFTs"""
+        with self._lock:
+            self._cache.clear()
+
+    def _kernel_rfftn(self, kernel: xpArray, fsize: Tuple[int, ...]) -> xpArray:
+        key = self._key(kernel, fsize)
+
+        with self._lock:
+            kernel_fft = self._cache.get(key)
+            if kernel_fft is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return kernel_fft
+
+        sp = Backend.get_sp_module()
+        kernel_fft = sp.fft.rfftn(kernel, fsize, overwrite_x=False)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = kernel_fft
+            while len(self._cache) > self.max_cache_size:
+                self._cache.popitem(last=False)
+
+        return kernel_fft
+
+    @staticmethod
+    def _key(kernel: xpArray, fsize: Tuple[int, ...]) -> Tuple:
+        # Kernels are small, hashing their content is cheap compared to a FFT of the padded image,
+        # and it is robust to kernels being re-instantiated (e.g. moved to the backend) between calls.
+        # The device is part of the key so that FFTs are never shared across GPUs.
+        device = getattr(getattr(kernel, "device", None), "id", None)
+        content = hash(Backend.to_numpy(kernel).tobytes())
+        return type(kernel), device, kernel.shape, kernel.dtype.str, tuple(fsize), content
+
+    def __getstate__(self):
+        # The cache and lock are not sent to other processes (e.g. dask workers):
+        state = self.__dict__.copy()
+        del state["_cache"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
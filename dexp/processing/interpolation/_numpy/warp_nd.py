@@ -0,0 +1,99 @@
+import math
+import os
+
+import numpy
+from joblib import Parallel, delayed
+from scipy.ndimage import map_coordinates
+
+# Equivalent scipy.ndimage modes of the CUDA texture address modes used by the cupy implementation:
+_address_modes = {"clamp": "nearest", "border": "grid-constant", "wrap": "grid-wrap", "mirror": "reflect"}
+
+
+def _warp_nd_numpy(
+    image: numpy.ndarray,
+    vector_field: numpy.ndarray,
+    mode: str,
+    vector_field_order: int = 1,
+    workers: int = -1,
+    chunk_voxels: int = 2 ** 20,
+) -> numpy.ndarray:
+    """
+    Multithreaded CPU warp of an n-dimensional image. The output image is processed in slabs along the first axis,
+    for each slab the vector field is interpolated (with given spline order) at the voxels of the slab only,
+    and the image is then linearly sampled at the displaced coordinates.
+    The working set is thus about (2*ndim+1) float32 buffers of 'chunk_voxels' voxels per worker,
+    and the upsampled vector field is never materialised as a whole.
+
+    Parameters
+    ----------
+    image : image to warp, float32.
+    vector_field : vector field of shape (..., ndim), or of same shape as the image in 1D.
+        The vector field grid is stretched to cover the whole image, vectors are sampled at voxel centers.
+    mode : How to handle warping that reaches outside of the image bounds,
+        can be: 'clamp', 'border', 'wrap', 'mirror'
+    vector_field_order : interpolation order of the vector field: 0-> nearest, 1->linear, 2->quadratic, ...
+    workers : number of threads, -1 for as many as there are cores.
+    chunk_voxels : approximate number of voxels per slab.
+
+    Returns
+    -------
+    Warped image
+
+    """
+    ndim = image.ndim
+
+    if vector_field.ndim == ndim and ndim == 1:
+        vector_field = vector_field[..., numpy.newaxis]
+
+    if vector_field.ndim != ndim + 1 or vector_field.shape[-1] != ndim:
+        raise ValueError("image or vector field has wrong number of dimensions!")
+
+    if mode not in _address_modes:
+        raise ValueError(f"Unsupported warp mode: {mode}, must be one of: {tuple(_address_modes.keys())}")
+
+    if workers < 0:
+        workers = os.cpu_count()
+
+    # Set up resulting image:
+    warped_image = numpy.empty(shape=image.shape, dtype=image.dtype)
+
+    # Slabs along the first axis:
+    slab_voxels = math.prod(image.shape[1:])
+    slab_length = max(1, chunk_voxels // max(1, slab_voxels))
+    slabs = [slice(start, min(start + slab_length, image.shape[0])) for start in range(0, image.shape[0], slab_length)]
+
+    # Scale from image voxel coordinates to vector field grid coordinates, per axis:
+    scales = tuple(f / s for f, s in zip(vector_field.shape[:-1], image.shape))
+    components = tuple(numpy.ascontiguousarray(vector_field[..., d]) for d in range(ndim))
+
+    def _warp_slab(slab: slice):
+        slab_shape = (slab.stop - slab.start,) + image.shape[1:]
+
+        # coordinates of the voxels of the slab:
+        coordinates = numpy.indices(slab_shape, dtype=numpy.float32)
+        coordinates[0] += slab.start
+
+        # coordinates of these voxels in the vector field grid:
+        field_coordinates = (coordinates + 0.5) * numpy.asarray(scales, dtype=numpy.float32).reshape(
+            (ndim,) + (1,) * ndim
+        ) - 0.5
+
+        # Obtain the shifted coordinates of the source voxels:
+        for d in range(ndim):
+            coordinates[d] -= map_coordinates(
+                components[d], field_coordinates, order=vector_field_order, mode="nearest", output=numpy.float32
+            )
+        del field_coordinates
+
+        # Sample source image for voxel values:
+        map_coordinates(
+            image, coordinates, output=warped_image[slab], order=1, mode=_address_modes[mode], cval=0, prefilter=False
+        )
+
+    if workers > 1 and len(slabs) > 1:
+        Parallel(n_jobs=workers, backend="threading")(delayed(_warp_slab)(slab) for slab in slabs)
+    else:
+        for slab in slabs:
+            _warp_slab(slab)
+
+    return warped_image
@@ -2,12 +2,13 @@ import numpy
 from skimage.data import camera
 
 from dexp.processing.interpolation.warp import warp
-from dexp.utils.backends import Backend, CupyBackend
+from dexp.utils.backends import Backend, CupyBackend, NumpyBackend
 from dexp.utils.timeit import timeit
 
-# def test_warp_2d_numpy():
-#     backend = NumpyBackend()
-#     _test_warp_2d(backend)
+
+def test_warp_2d_numpy():
+    with NumpyBackend():
+        _test_warp_2d()
 
 
 def test_warp_2d_cupy():
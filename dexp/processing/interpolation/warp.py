@@ -1,6 +1,7 @@
 import numpy
 from scipy.ndimage import zoom
 
+from dexp.processing.interpolation._numpy.warp_nd import _warp_nd_numpy
 from dexp.utils import xpArray
 from dexp.utils.backends import Backend, NumpyBackend
 
@@ -13,6 +14,7 @@ def warp(
     mode: str = "border",
     image_to_backend: bool = False,
     internal_dtype=None,
+    workers: int = -1,
 ):
     """
     Applies a warp transform (piece wise linear or constant) to an image based on a vector field.
@@ -39,6 +41,10 @@ def warp(
 
     internal_dtype : internal dtype. Right now the dtype must be float32 because of CUDa texture dtype limitations.
 
+    workers : number of threads used by the NumPy backend, -1 for as many as there are cores.
+        With the NumPy backend the vector field is not upsampled up front, instead it is interpolated
+        with the given upsampling order, slab by slab, at the voxels being warped.
+
     Returns
     -------
     Warped image
@@ -56,6 +62,14 @@ def warp(
 
     original_dtype = image.dtype
 
+    if type(Backend.current()) is NumpyBackend:
+        image = Backend.to_numpy(image, dtype=internal_dtype)
+        vector_field = Backend.to_numpy(vector_field, dtype=internal_dtype)
+        vector_field_order = 1 if vector_field_upsampling == 1 else vector_field_upsampling_order
+
+        result = _warp_nd_numpy(image, vector_field, mode, vector_field_order=vector_field_order, workers=workers)
+        return result.astype(original_dtype, copy=False)
+
     if vector_field_upsampling != 1:
         # Note: unfortunately numpy does support float16 zooming, and cupy does not support high-order zooming...
         vector_field = Backend.to_numpy(vector_field, dtype=numpy.float32)
@@ -74,10 +88,7 @@ def warp(
 
     from dexp.utils.backends import CupyBackend
 
-    if type(Backend.current()) is NumpyBackend:
-        raise NotImplementedError("Warping not yet implemented for the Numpy backend.")
-
-    elif type(Backend.current()) is CupyBackend:
+    if type(Backend.current()) is CupyBackend:
 
         params = (image, vector_field, mode)
         if image.ndim == 1:
@@ -0,0 +1,59 @@
+import numpy
+from arbol import aprint
+from skimage.data import camera
+
+from dexp.datasets.synthetic_datasets import generate_nuclei_background_data
+from dexp.processing.registration.warp_nd import register_warp_nd
+from dexp.utils.backends import Backend, CupyBackend, NumpyBackend
+
+
+def test_register_warp_batched_numpy():
+    with NumpyBackend():
+        _test_register_warp_batched_2d()
+        _test_register_warp_batched_3d()
+
+
+def test_register_warp_batched_cupy():
+    try:
+        with CupyBackend():
+            _test_register_warp_batched_2d()
+            _test_register_warp_batched_3d()
+    except ModuleNotFoundError:
+        aprint("Cupy module not found! Test passes nevertheless!")
+
+
+def _test_register_warp_batched_2d():
+    sp = Backend.get_sp_module()
+
+    image = Backend.to_backend(camera().astype(numpy.float32) / 255)
+    shifted = sp.ndimage.shift(image, shift=(3, -5))
+
+    # chunks that do not divide the image shape, to have tiles of different shapes:
+    _compare_batched(image, shifted, chunks=(120, 100), margins=16)
+
+
+def _test_register_warp_batched_3d(length_xy=96):
+    sp = Backend.get_sp_module()
+
+    _, _, image = generate_nuclei_background_data(
+        add_noise=False, length_xy=length_xy, length_z_factor=1, dtype=numpy.float32
+    )
+    image = Backend.to_backend(image)
+    shifted = sp.ndimage.shift(image, shift=(2, -3, 4))
+
+    _compare_batched(image, shifted, chunks=40, margins=8)
+
+
+def _compare_batched(image_a, image_b, chunks, margins):
+    xp = Backend.get_xp_module()
+
+    model_batched = register_warp_nd(image_a, image_b, chunks=chunks, margins=margins, batched=True)
+    model_per_tile = register_warp_nd(image_a, image_b, chunks=chunks, margins=margins, batched=False)
+
+    aprint(f"batched vector field: {model_batched.vector_field}")
+    aprint(f"per tile vector field: {model_per_tile.vector_field}")
+
+    assert model_batched.vector_field.shape == model_per_tile.vector_field.shape
+    assert model_batched.confidence.shape == model_per_tile.confidence.shape
+    assert xp.allclose(model_batched.vector_field, model_per_tile.vector_field)
+    assert xp.allclose(model_batched.confidence, model_per_tile.confidence, atol=1e-3)
@@ -0,0 +1,49 @@
+import numpy
+from scipy.ndimage import shift
+from skimage.data import binary_blobs
+from skimage.filters import gaussian
+
+from dexp.processing.registration.sequence import _FrameSpectrumCache, image_stabilisation
+from dexp.processing.registration.translation_nd_proj import (
+    register_translation_proj_nd,
+)
+from dexp.utils.backends import Backend
+from dexp.utils.testing.testing import execute_both_backends
+
+
+@execute_both_backends
+def test_frame_spectrum_cache_2d():
+    _test_frame_spectrum_cache(ndim=2, length=128)
+
+
+@execute_both_backends
+def test_frame_spectrum_cache_3d():
+    _test_frame_spectrum_cache(ndim=3, length=64)
+
+
+def _test_frame_spectrum_cache(ndim: int, length: int, nb_frames: int = 5):
+    image = gaussian(binary_blobs(length=length, n_dim=ndim, blob_size_fraction=0.05), sigma=1)
+    frames = [shift(image, shift=(2 * i,) * ndim).astype(numpy.float32) for i in range(nb_frames)]
+    frames = [Backend.to_backend(frame) for frame in frames]
+
+    cache = _FrameSpectrumCache(lambda i: frames[i], max_size=3, force_numpy=True)
+
+    for u in range(nb_frames):
+        for v in range(u + 1, min(u + 3, nb_frames)):
+            model = cache.register(u, v)
+            reference = register_translation_proj_nd(frames[u], frames[v], force_numpy=True)
+            print(model, reference)
+            assert numpy.allclose(model.shift_vector, reference.shift_vector)
+            assert numpy.allclose(model.confidence, reference.confidence, atol=1e-4)
+
+    assert len(cache._spectra) <= 3
+
+
+@execute_both_backends
+def test_image_stabilisation_single_frame():
+    image = gaussian(binary_blobs(length=64, n_dim=2, blob_size_fraction=0.05), sigma=1).astype(numpy.float32)
+
+    # A single frame has no pairwise registrations, it is not moved:
+    model = image_stabilisation(Backend.to_backend(image[numpy.newaxis]), axis=0, detrend=True)
+    assert len(model) == 1
+    assert numpy.all(Backend.to_numpy(model.model_list[0].shift_vector) == 0)
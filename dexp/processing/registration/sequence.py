@@ -1,4 +1,7 @@
-from typing import List, Optional, Tuple
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Tuple
 
 import dask
 import numpy
@@ -12,7 +15,16 @@ from dexp.processing.registration.model.sequence_registration_model import (
 from dexp.processing.registration.model.translation_registration_model import (
     TranslationRegistrationModel,
 )
+from dexp.processing.registration.translation_nd import (
+    _filter_image,
+    _model_from_correlation,
+    _phase_correlation_from_spectra,
+    _spectrum,
+)
 from dexp.processing.registration.translation_nd_proj import (
+    _combine_projection_shifts,
+    _preprocess_image,
+    _project_preprocess_image,
     register_translation_proj_nd,
 )
 from dexp.processing.utils.center_of_mass import center_of_mass
@@ -38,6 +50,7 @@ def image_stabilisation(
     detrend: bool = False,
     debug_output: str = None,
     workers: int = 1,
+    cache_size: Optional[int] = None,
     internal_dtype=None,
     **kwargs,
 ) -> SequenceRegistrationModel:
@@ -60,6 +73,9 @@ def image_stabilisation(
     order_reg: order for linear solver regularisation term.
     alpha_reg: multiplicative coefficient for regularisation term.
     detrend: removes linear detrend from stabilized image.
+    workers: number of worker threads for computing pairwise registrations.
+    cache_size: maximal number of frames for which preprocessed spectra are kept in memory, each frame being
+        registered to up to 2*max_range other frames. By default: max_range + workers.
     internal_dtype : internal dtype for computation
     **kwargs: argument passthrough to the pairwise registration method, see 'register_translation_nd'.
 
@@ -106,33 +122,47 @@ def image_stabilisation(
 
         with asection(f"Computing pairwise registrations for {len(uv_set)} (u,v) pairs..."):
 
-            def _compute_model(pair: Tuple[int, int]) -> Optional[TranslationRegistrationModel]:
-                u, v = pair
+            def _get_frame(index: int) -> xpArray:
                 if image_sequence:
-                    image_u = image_sequence[u]
-                    image_v = image_sequence[v]
+                    return image_sequence[index]
                 elif isinstance(image, Array):
-                    image_u = dask.array.take(image, u, axis=axis)
-                    image_v = dask.array.take(image, v, axis=axis)
+                    return dask.array.take(image, index, axis=axis)
                 else:
-                    image_u = xp.take(image, u, axis=axis)
-                    image_v = xp.take(image, v, axis=axis)
-                model = _pairwise_registration(
-                    u,
-                    v,
-                    image_u,
-                    image_v,
-                    mode,
-                    min_confidence,
-                    enable_com,
-                    quantile,
-                    bounding_box,
-                    internal_dtype,
-                    **kwargs,
-                )
+                    return xp.take(image, index, axis=axis)
+
+            # Frames are preprocessed and Fourier transformed once, and reused for all pairs they belong to:
+            spectrum_cache = None
+            if mode == "translation" and ndim in (2, 3) and _FrameSpectrumCache.supports(kwargs):
+                if cache_size is None:
+                    cache_size = max_range + workers
+                spectrum_cache = _FrameSpectrumCache(_get_frame, cache_size, internal_dtype, **kwargs)
+
+            backend = Backend.current()
+
+            def _compute_model(pair: Tuple[int, int]) -> Optional[TranslationRegistrationModel]:
+                u, v = pair
+                # Worker threads run within their own copy of the current backend:
+                with backend.copy(exclusive=False) if workers > 1 else nullcontext():
+                    model = _pairwise_registration(
+                        u,
+                        v,
+                        _get_frame,
+                        mode,
+                        min_confidence,
+                        enable_com,
+                        quantile,
+                        bounding_box,
+                        internal_dtype,
+                        spectrum_cache=spectrum_cache,
+                        **kwargs,
+                    )
                 return model
 
-            pairwise_models = Parallel(n_jobs=workers)(delayed(_compute_model)(pair) for pair in uv_set)
+            # Pairs are sorted so that consecutive registrations share frames:
+            uv_set = sorted(uv_set)
+            pairwise_models = Parallel(n_jobs=workers, backend="threading")(
+                delayed(_compute_model)(pair) for pair in uv_set
+            )
             pairwise_models = [model for model in pairwise_models if model is not None]
 
         nb_models = len(pairwise_models)
@@ -168,59 +198,54 @@ def image_stabilisation(
                         TranslationRegistrationModel(xp.zeros((ndim,), dtype=internal_dtype)) for _ in range(length)
                     )
 
-                    # initialise count for average:
+                    # initialise confidence and count for average:
                     for model in translation_models:
+                        model.confidence = 0
                         model.count = 0
 
-                    for d in range(ndim):
-
-                        # instantiates system to solve with zeros:
-                        a = xp.zeros((nb_models + 1, length), dtype=xp.float32)
-                        y = xp.zeros((nb_models + 1,), dtype=xp.float32)
-
-                        # iterates through all pairwise registrations:
-                        zero_vector = None
+                    if nb_models == 0:
+                        # Without pairwise registrations, for example for a sequence of length 1, no time point
+                        # is moved:
+                        x_opt = xp.zeros((length, ndim), dtype=xp.float32)
+                    else:
+                        # Each pairwise registration defines a constraint: x[u] - x[v] = shift(u, v) - shift(0, 1),
+                        # the system is built directly in sparse form, and is shared by all axes:
+                        us = xp.asarray([model.u for model in pairwise_models])
+                        vs = xp.asarray([model.v for model in pairwise_models])
+                        rows = xp.concatenate([xp.arange(nb_models), xp.arange(nb_models), [nb_models]])
+                        cols = xp.concatenate([us, vs, [0]])
+                        data = xp.concatenate([xp.ones(nb_models), -xp.ones(nb_models), [1]])
+                        a = sp.sparse.coo_matrix(
+                            (data.astype(xp.float32), (rows, cols)), shape=(nb_models + 1, length)
+                        ).tocsr()
+
+                        # we make sure that all shifts are relative to the first pairwise registration,
+                        # and the last constraint forces the solution to have no displacement for first time point:
+                        zero_vector = Backend.to_numpy(pairwise_models[0].shift_vector)
+                        y = xp.zeros((nb_models + 1, ndim), dtype=xp.float32)
                         for tp, model in enumerate(pairwise_models):
-                            u = model.u
-                            v = model.v
-                            confidence = model.overall_confidence()
-
-                            if tp == 0:
-                                # we make sure that all shifts are relative to the first timepoint:
-                                zero_vector = model.shift_vector[d].copy()
-
-                            vector = model.shift_vector[d] - zero_vector
-
-                            # Each pairwise registration defines a constraint that is added to the matrix:
-                            y[tp] = vector.copy()
-                            a[tp, u] = +1
-                            a[tp, v] = -1
-
-                            # For each time point we collect the average confidence of all the pairwise_registrations:
-                            translation_models[u].confidence += confidence
-                            translation_models[u].count += 1
-                            translation_models[v].confidence += confidence
-                            translation_models[v].count += 1
-
-                        # Forces solution to have no displacement for first time point:
-                        y[-1] = 0
-                        a[-1, 0] = 1
+                            y[tp] = Backend.to_numpy(model.shift_vector) - zero_vector
 
-                        # move matrix to sparse domain (much faster!):
-                        a = sp.sparse.coo_matrix(a)
-
-                        # solve system:
+                        # solve system for all axes at once:
                         x_opt = linsolve(
                             a, y, tolerance=tolerance, order_error=order_error, order_reg=order_reg, alpha_reg=alpha_reg
                         )
 
-                        # detrend:
-                        if detrend:
-                            x_opt = sp.signal.detrend(x_opt)
-
-                        # sets the shift vectors for the resulting sequence reg model, and compute average confidences:
-                        for tp in range(length):
-                            translation_models[tp].shift_vector[d] = -x_opt[tp]
+                    # For each time point we collect the average confidence of all the pairwise_registrations:
+                    for model in pairwise_models:
+                        confidence = model.overall_confidence()
+                        for w in (model.u, model.v):
+                            translation_models[w].confidence += confidence
+                            translation_models[w].count += 1
+
+                    # detrend:
+                    if detrend:
+                        x_opt = sp.signal.detrend(x_opt, axis=0)
+
+                    # sets the shift vectors for the resulting sequence reg model, and compute average confidences:
+                    for tp in range(length):
+                        translation_models[tp].shift_vector[...] = -x_opt[tp]
+                        if translation_models[tp].count > 0:
                             translation_models[tp].confidence /= translation_models[tp].count
 
                     model = SequenceRegistrationModel(model_list=translation_models)
@@ -248,19 +273,33 @@ def image_stabilisation(
 
 
 def _pairwise_registration(
-    u, v, image_u, image_v, mode, min_confidence, enable_com, quantile, bounding_box, internal_dtype, **kwargs
+    u,
+    v,
+    get_frame,
+    mode,
+    min_confidence,
+    enable_com,
+    quantile,
+    bounding_box,
+    internal_dtype,
+    spectrum_cache: Optional["_FrameSpectrumCache"] = None,
+    **kwargs,
 ):
-    image_u = Backend.to_backend(image_u, dtype=internal_dtype)
-    image_v = Backend.to_backend(image_v, dtype=internal_dtype)
-
     if mode == "translation":
-        model = register_translation_proj_nd(image_u, image_v, _display_phase_correlation=False, **kwargs)
+        if spectrum_cache is not None:
+            model = spectrum_cache.register(u, v)
+        else:
+            image_u = Backend.to_backend(get_frame(u), dtype=internal_dtype)
+            image_v = Backend.to_backend(get_frame(v), dtype=internal_dtype)
+            model = register_translation_proj_nd(image_u, image_v, _display_phase_correlation=False, **kwargs)
         model.u = u
         model.v = v
         confidence = model.overall_confidence()
 
         if confidence < min_confidence:
             if enable_com:
+                image_u = Backend.to_backend(get_frame(u), dtype=internal_dtype)
+                image_v = Backend.to_backend(get_frame(v), dtype=internal_dtype)
                 offset_mode = f"p={quantile * 100}"
                 com_u = center_of_mass(
                     image_u, mode="full", projection_type="max-min", offset_mode=offset_mode, bounding_box=bounding_box
@@ -278,3 +317,100 @@ def _pairwise_registration(
         raise ValueError(f"Unsupported sequence stabilisation mode: {mode}")
 
     return model
+
+
+class _FrameSpectrumCache:
+
+    _preprocessing_parameters = ("denoise_input_sigma", "gamma", "log_compression", "edge_filter")
+    _correlation_parameters = ("max_range_ratio", "decimate", "quantile", "sigma")
+    _other_parameters = ("drop_worse", "force_numpy")
+
+    def __init__(self, get_frame: Callable[[int], xpArray], max_size: int, internal_dtype=None, **kwargs):
+        """
+        Bounded (least-recently-used) cache of per-frame preprocessed spectra, keyed by frame index.
+        Computes the same pairwise registrations as 'register_translation_proj_nd' with the default
+        2D registration method, but each frame -- or each of its projections for 3D frames -- is projected,
+        preprocessed and Fourier transformed only once, instead of once per pair it belongs to.
+        A pairwise registration then just needs a product and an inverse FFT per projection.
+
+        Parameters
+        ----------
+        get_frame : function that returns the frame for a given index.
+        max_size : maximal number of frames for which spectra are kept.
+        internal_dtype : internal dtype for computation
+        kwargs : registration parameters, see 'register_translation_proj_nd' and 'register_translation_nd'.
+        """
+        self._get_frame = get_frame
+        self._max_size = max(2, max_size)
+        self._internal_dtype = internal_dtype
+        self._preprocessing_kwargs = {k: v for k, v in kwargs.items() if k in self._preprocessing_parameters}
+        self._correlation_kwargs = {k: v for k, v in kwargs.items() if k in self._correlation_parameters}
+        self._drop_worse = kwargs.get("drop_worse", True)
+        self._force_numpy = kwargs.get("force_numpy", False)
+
+        self._spectra = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supports(kwargs: dict) -> bool:
+        """Returns True if the registration parameters can be handled by the cache"""
+        known = (
+            _FrameSpectrumCache._preprocessing_parameters
+            + _FrameSpectrumCache._correlation_parameters
+            + _FrameSpectrumCache._other_parameters
+        )
+        return all(key in known for key in kwargs)
+
+    def register(self, u: int, v: int) -> TranslationRegistrationModel:
+        spectra_u, dtype = self._get_spectra(u)
+        spectra_v, _ = self._get_spectra(v)
+
+        shifts_and_confidences = []
+        for G_u, G_v in zip(spectra_u, spectra_v):
+            correlation = _phase_correlation_from_spectra(G_u, G_v, internal_dtype=dtype)
+            model = _model_from_correlation(correlation, force_numpy=self._force_numpy, **self._correlation_kwargs)
+            shifts_and_confidences.append(model.get_shift_and_confidence())
+
+        shifts, confidences = zip(*shifts_and_confidences)
+        if len(spectra_u) == 1:
+            shift, confidence = shifts[0], confidences[0]
+        else:
+            shift, confidence = _combine_projection_shifts(shifts, confidences, drop_worse=self._drop_worse)
+
+        return TranslationRegistrationModel(shift_vector=shift, confidence=confidence, force_numpy=self._force_numpy)
+
+    def _get_spectra(self, index: int):
+        with self._lock:
+            entry = self._spectra.get(index)
+            if entry is not None:
+                self._spectra.move_to_end(index)
+                return entry
+
+        entry = self._compute_spectra(index)
+
+        with self._lock:
+            self._spectra[index] = entry
+            while len(self._spectra) > self._max_size:
+                self._spectra.popitem(last=False)
+
+        return entry
+
+    def _compute_spectra(self, index: int):
+        xp = Backend.get_xp_module()
+        frame = Backend.to_backend(self._get_frame(index), dtype=self._internal_dtype)
+
+        # Same normalisation and projections as in 'register_translation_proj_nd':
+        if frame.ndim == 2:
+            images = (_preprocess_image(frame, in_place=False, dtype=self._internal_dtype),)
+        else:
+            images = tuple(_project_preprocess_image(frame, axis=axis, dtype=xp.float32) for axis in range(3))
+
+        # Same internal dtype as in 'register_translation_nd':
+        dtype = images[0].dtype if self._internal_dtype is None else self._internal_dtype
+        if isinstance(Backend.current(), NumpyBackend):
+            dtype = numpy.float32
+
+        spectra = tuple(
+            _spectrum(_filter_image(image, internal_dtype=dtype, **self._preprocessing_kwargs)) for image in images
+        )
+        return spectra, dtype
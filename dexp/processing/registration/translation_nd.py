@@ -56,9 +56,6 @@ def register_translation_nd(
     Translation-only registration model
 
     """
-    xp = Backend.get_xp_module()
-    sp = Backend.get_sp_module()
-
     if not image_a.dtype == image_b.dtype:
         raise ValueError("Arrays must have the same dtype")
 
@@ -66,29 +63,65 @@ def register_translation_nd(
         internal_dtype = image_a.dtype
 
     if type(Backend.current()) is NumpyBackend:
-        internal_dtype = xp.float32
+        internal_dtype = numpy.float32
+
+    image_a = _filter_image(image_a, denoise_input_sigma, gamma, log_compression, edge_filter, internal_dtype)
+    image_b = _filter_image(image_b, denoise_input_sigma, gamma, log_compression, edge_filter, internal_dtype)
+
+    # Compute the phase correlation:
+    raw_correlation = _phase_correlation(image_a, image_b, internal_dtype)
+
+    return _model_from_correlation(
+        raw_correlation,
+        max_range_ratio=max_range_ratio,
+        decimate=decimate,
+        quantile=quantile,
+        sigma=sigma,
+        force_numpy=force_numpy,
+        _display_images=(image_a, image_b) if _display_phase_correlation else None,
+    )
+
+
+def _filter_image(
+    image: xpArray,
+    denoise_input_sigma: float = 1.5,
+    gamma: float = 1,
+    log_compression: bool = True,
+    edge_filter: bool = True,
+    internal_dtype=numpy.float32,
+) -> xpArray:
+    xp = Backend.get_xp_module()
+    sp = Backend.get_sp_module()
 
-    image_a = Backend.to_backend(image_a, dtype=internal_dtype)
-    image_b = Backend.to_backend(image_b, dtype=internal_dtype)
+    image = Backend.to_backend(image, dtype=internal_dtype)
 
     if denoise_input_sigma is not None and denoise_input_sigma > 0:
-        image_a = sp.ndimage.filters.gaussian_filter(image_a, sigma=denoise_input_sigma)
-        image_b = sp.ndimage.filters.gaussian_filter(image_b, sigma=denoise_input_sigma)
+        image = sp.ndimage.filters.gaussian_filter(image, sigma=denoise_input_sigma)
 
     if log_compression is not None and log_compression:
-        image_a = xp.log1p(image_a)
-        image_b = xp.log1p(image_b)
+        image = xp.log1p(image)
 
     if gamma is not None and gamma != 1:
-        image_a **= gamma
-        image_b **= gamma
+        image **= gamma
 
     if edge_filter is not None and edge_filter:
-        image_a = sobel_filter(image_a, exponent=1, normalise_input=False)
-        image_b = sobel_filter(image_b, exponent=1, normalise_input=False)
+        image = sobel_filter(image, exponent=1, normalise_input=False)
+
+    return image
+
+
+def _model_from_correlation(
+    raw_correlation: xpArray,
+    max_range_ratio: float = 0.9,
+    decimate: int = 16,
+    quantile: float = 0.999,
+    sigma: float = 1.5,
+    force_numpy: bool = False,
+    _display_images=None,
+) -> TranslationRegistrationModel:
+    xp = Backend.get_xp_module()
+    sp = Backend.get_sp_module()
 
-    # Compute the phase correlation:
-    raw_correlation = _phase_correlation(image_a, image_b, internal_dtype)
     correlation = raw_correlation
 
     # Max range is computed from max_range_ratio:
@@ -132,10 +165,12 @@ def register_translation_nd(
     epsilon = 1e-6
     confidence = (max_correlation - background_correlation_max) / (epsilon + max_correlation)
 
-    if _display_phase_correlation:
+    if _display_images is not None:
         # DO NOT DELETE, INSTRUMENTATION CODE FOR DEBUGGING
         from napari import Viewer, gui_qt
 
+        image_a, image_b = _display_images
+
         with gui_qt():
             aprint(f"shift = {shift_vector}, confidence = {confidence} ")
 
@@ -156,6 +191,84 @@ def register_translation_nd(
     return TranslationRegistrationModel(shift_vector=shift_vector, confidence=confidence, force_numpy=force_numpy)
 
 
+def _shifts_and_confidences_from_correlations(
+    correlations: xpArray,
+    max_range_ratio: float = 0.9,
+    decimate: int = 16,
+    quantile: float = 0.999,
+    sigma: float = 1.5,
+):
+    """
+    Vectorised version of '_model_from_correlation' for a stack of phase correlations, the first axis
+    being the batch axis. Returns an integer array of shift vectors of shape (B, n) and an array of confidences
+    of shape (B,), equal to those obtained by calling '_model_from_correlation' on each correlation.
+    """
+    xp = Backend.get_xp_module()
+    sp = Backend.get_sp_module()
+
+    batch = correlations.shape[0]
+    shape = correlations.shape[1:]
+    ndim = len(shape)
+
+    def _per_batch(array):
+        return array.reshape((batch,) + (1,) * ndim)
+
+    # Max range is computed from max_range_ratio:
+    max_ranges = tuple(int(0.5 * max_range_ratio * s) for s in shape)
+
+    # We estimate the noise floor of each correlation:
+    center = tuple(s // 2 for s in shape)
+    empty_region = correlations[(slice(None),) + tuple(slice(0, c - r) for c, r in zip(center, max_ranges))]
+    samples = empty_region.reshape(batch, -1)[:, ::decimate].astype(numpy.float32)
+    noise_floor_levels = xp.quantile(samples, q=quantile, axis=1)
+    noise_floor_levels = xp.where(xp.isnan(noise_floor_levels), xp.mean(samples, axis=1), noise_floor_levels)
+
+    # Crop to restrict ourself to the search region:
+    correlations = correlations[
+        (slice(None),) + tuple(slice(max(c - r, 0), min(c + r, s)) for c, r, s in zip(center, max_ranges, shape))
+    ]
+
+    # Use the floors to clip anything below:
+    noise_floor_levels = _per_batch(noise_floor_levels.astype(correlations.dtype))
+    correlations = xp.maximum(correlations, noise_floor_levels)
+    correlations -= noise_floor_levels
+
+    # Denoise cropped correlation images, but not across the batch axis:
+    if sigma > 0:
+        correlations = sp.ndimage.filters.gaussian_filter(correlations, sigma=(0,) + (sigma,) * ndim, mode="wrap")
+
+    # Use the max as quickly computed proxy for the real center:
+    flat_correlations = correlations.reshape(batch, -1)
+    max_correlation_flat_indices = xp.argmax(flat_correlations, axis=1)
+    max_correlations = flat_correlations[xp.arange(batch), max_correlation_flat_indices]
+    rough_shifts = xp.stack(xp.unravel_index(max_correlation_flat_indices, correlations.shape[1:]), axis=1)
+
+    # Compute the signed shift vectors:
+    shift_vectors = rough_shifts - xp.asarray(max_ranges)
+
+    # Compute confidences, the masked region follows the same (python slicing) rules as in '_model_from_correlation':
+    mask = None
+    mask_size = tuple(max(8, int(s ** 0.9) // 8) for s in correlations.shape[1:])
+    for axis, (length, size) in enumerate(zip(correlations.shape[1:], mask_size)):
+        starts = _per_batch(_slice_bound(rough_shifts[:, axis] - size, length))
+        stops = _per_batch(_slice_bound(rough_shifts[:, axis] + size, length))
+        index = xp.arange(length).reshape((1,) + tuple(length if a == axis else 1 for a in range(ndim)))
+        axis_mask = (index >= starts) & (index < stops)
+        mask = axis_mask if mask is None else mask & axis_mask
+    masked_correlations = xp.where(mask, 0, correlations)
+    background_correlation_max = xp.max(masked_correlations.reshape(batch, -1), axis=1)
+    epsilon = 1e-6
+    confidences = (max_correlations - background_correlation_max) / (epsilon + max_correlations)
+
+    return shift_vectors, confidences
+
+
+def _slice_bound(indices: xpArray, length: int) -> xpArray:
+    # Effective slice bound, as computed by python for possibly negative indices:
+    xp = Backend.get_xp_module(indices)
+    return xp.where(indices < 0, xp.maximum(indices + length, 0), xp.minimum(indices, length))
+
+
 def _center_of_mass(image):
     image = Backend.to_backend(image)
 
@@ -182,19 +295,33 @@ def _center_of_mass(image):
 
 
 def _phase_correlation(image_a, image_b, internal_dtype=numpy.float32, epsilon: float = 1e-6, window: float = 0.5):
-    xp = Backend.get_xp_module(image_a)
+    G_a = _spectrum(image_a, window=window)
+    G_b = _spectrum(image_b, window=window)
+    return _phase_correlation_from_spectra(G_a, G_b, internal_dtype=internal_dtype, epsilon=epsilon)
+
+
+def _spectrum(image, window: float = 0.5, axes=None):
+    xp = Backend.get_xp_module(image)
+
+    # Axes along which to compute the spectrum, the remaining axes are batch axes:
+    axes = tuple(range(image.ndim)) if axes is None else tuple(axes)
 
     if window > 0:
-        window_axis = tuple(xp.hanning(s) ** window for s in image_a.shape)
+        window_axis = tuple(xp.hanning(image.shape[axis]) ** window for axis in axes)
         window = reduce(xp.multiply, xp.ix_(*window_axis))
-        image_a *= window
-        image_b *= window
+        image *= window.reshape(tuple(image.shape[axis] if axis in axes else 1 for axis in range(image.ndim)))
+
+    return xp.fft.fftn(image, axes=axes).astype(numpy.complex64, copy=False)
+
+
+def _phase_correlation_from_spectra(G_a, G_b, internal_dtype=numpy.float32, epsilon: float = 1e-6, axes=None):
+    xp = Backend.get_xp_module(G_a)
+
+    axes = tuple(range(G_a.ndim)) if axes is None else tuple(axes)
 
-    G_a = xp.fft.fftn(image_a).astype(numpy.complex64, copy=False)
-    G_b = xp.fft.fftn(image_b).astype(numpy.complex64, copy=False)
     conj_b = xp.conj(G_b)
     R = G_a * conj_b
     R /= xp.absolute(R) + epsilon
-    r = xp.fft.ifftn(R).real.astype(internal_dtype, copy=False)
-    r = xp.fft.fftshift(r)
+    r = xp.fft.ifftn(R, axes=axes).real.astype(internal_dtype, copy=False)
+    r = xp.fft.fftshift(r, axes=axes)
     return r
@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Sequence, Tuple
 
 from dexp.processing.registration.model.translation_registration_model import (
     TranslationRegistrationModel,
@@ -75,29 +75,9 @@ def register_translation_proj_nd(
             iap2, ibp2, force_numpy=force_numpy, internal_dtype=internal_dtype, **kwargs
         ).get_shift_and_confidence()
 
-        # print(shifts_p0)
-        # print(shifts_p1)
-        # print(shifts_p2)
-
-        if drop_worse:
-            worse_index = xp.argmin(xp.asarray([confidence_p0, confidence_p1, confidence_p2]))
-
-            if worse_index == 0:
-                shifts = xp.asarray([0.5 * (shifts_p1[0] + shifts_p2[0]), shifts_p2[1], shifts_p1[1]])
-                confidence = (confidence_p1 * confidence_p2) ** 0.5
-            elif worse_index == 1:
-                shifts = xp.asarray([shifts_p2[0], 0.5 * (shifts_p0[0] + shifts_p2[1]), shifts_p0[1]])
-                confidence = (confidence_p0 * confidence_p2) ** 0.5
-            elif worse_index == 2:
-                shifts = xp.asarray([shifts_p1[0], shifts_p0[0], 0.5 * (shifts_p0[1] + shifts_p1[1])])
-                confidence = (confidence_p0 * confidence_p1) ** 0.5
-
-        else:
-            shifts_p0 = xp.asarray([0, shifts_p0[0], shifts_p0[1]])
-            shifts_p1 = xp.asarray([shifts_p1[0], 0, shifts_p1[1]])
-            shifts_p2 = xp.asarray([shifts_p2[0], shifts_p2[1], 0])
-            shifts = (shifts_p0 + shifts_p1 + shifts_p2) / 2
-            confidence = (confidence_p0 * confidence_p1 * confidence_p2) ** 0.33
+        shifts, confidence = _combine_projection_shifts(
+            (shifts_p0, shifts_p1, shifts_p2), (confidence_p0, confidence_p1, confidence_p2), drop_worse=drop_worse
+        )
 
         # if confidence>0.1:
         #     print(f"shift={shifts}, confidence={confidence}")
@@ -122,6 +102,94 @@ def register_translation_proj_nd(
     return model
 
 
+def _combine_projection_shifts(
+    projection_shifts: Sequence[xpArray], projection_confidences: Sequence[float], drop_worse: bool = True
+) -> Tuple[xpArray, float]:
+    """
+    Combines the 2D shifts and confidences obtained by registering the three max projections of 3D images
+    into a 3D shift vector and overall confidence.
+    """
+    xp = Backend.get_xp_module()
+
+    shifts_p0, shifts_p1, shifts_p2 = projection_shifts
+    confidence_p0, confidence_p1, confidence_p2 = projection_confidences
+
+    if drop_worse:
+        worse_index = xp.argmin(xp.asarray([confidence_p0, confidence_p1, confidence_p2]))
+
+        if worse_index == 0:
+            shifts = xp.asarray([0.5 * (shifts_p1[0] + shifts_p2[0]), shifts_p2[1], shifts_p1[1]])
+            confidence = (confidence_p1 * confidence_p2) ** 0.5
+        elif worse_index == 1:
+            shifts = xp.asarray([shifts_p2[0], 0.5 * (shifts_p0[0] + shifts_p2[1]), shifts_p0[1]])
+            confidence = (confidence_p0 * confidence_p2) ** 0.5
+        elif worse_index == 2:
+            shifts = xp.asarray([shifts_p1[0], shifts_p0[0], 0.5 * (shifts_p0[1] + shifts_p1[1])])
+            confidence = (confidence_p0 * confidence_p1) ** 0.5
+
+    else:
+        shifts_p0 = xp.asarray([0, shifts_p0[0], shifts_p0[1]])
+        shifts_p1 = xp.asarray([shifts_p1[0], 0, shifts_p1[1]])
+        shifts_p2 = xp.asarray([shifts_p2[0], shifts_p2[1], 0])
+        shifts = (shifts_p0 + shifts_p1 + shifts_p2) / 2
+        confidence = (confidence_p0 * confidence_p1 * confidence_p2) ** 0.33
+
+    return shifts, confidence
+
+
+def _combine_projection_shifts_batched(
+    projection_shifts: Sequence[xpArray], projection_confidences: Sequence[xpArray], drop_worse: bool = True
+) -> Tuple[xpArray, xpArray]:
+    """
+    Vectorised version of '_combine_projection_shifts' for batches of 2D shifts of shape (B, 2)
+    and confidences of shape (B,), returns 3D shifts of shape (B, 3) and confidences of shape (B,).
+    """
+    xp = Backend.get_xp_module()
+
+    shifts_p0, shifts_p1, shifts_p2 = (xp.asarray(shifts, dtype=xp.float32) for shifts in projection_shifts)
+    confidence_p0, confidence_p1, confidence_p2 = (
+        xp.asarray(confidence, dtype=xp.float32) for confidence in projection_confidences
+    )
+
+    if drop_worse:
+        # Combined shifts and confidences for each choice of projection to drop:
+        candidate_shifts = xp.stack(
+            [
+                xp.stack([0.5 * (shifts_p1[:, 0] + shifts_p2[:, 0]), shifts_p2[:, 1], shifts_p1[:, 1]], axis=1),
+                xp.stack([shifts_p2[:, 0], 0.5 * (shifts_p0[:, 0] + shifts_p2[:, 1]), shifts_p0[:, 1]], axis=1),
+                xp.stack([shifts_p1[:, 0], shifts_p0[:, 0], 0.5 * (shifts_p0[:, 1] + shifts_p1[:, 1])], axis=1),
+            ]
+        )
+        candidate_confidences = xp.stack(
+            [
+                (confidence_p1 * confidence_p2) ** 0.5,
+                (confidence_p0 * confidence_p2) ** 0.5,
+                (confidence_p0 * confidence_p1) ** 0.5,
+            ]
+        )
+
+        worse_indices = xp.argmin(xp.stack([confidence_p0, confidence_p1, confidence_p2]), axis=0)
+        batch_indices = xp.arange(worse_indices.shape[0])
+        shifts = candidate_shifts[worse_indices, batch_indices]
+        confidence = candidate_confidences[worse_indices, batch_indices]
+
+    else:
+        shifts = (
+            xp.stack(
+                [
+                    shifts_p1[:, 0] + shifts_p2[:, 0],
+                    shifts_p0[:, 0] + shifts_p2[:, 1],
+                    shifts_p0[:, 1] + shifts_p1[:, 1],
+                ],
+                axis=1,
+            )
+            / 2
+        )
+        confidence = (confidence_p0 * confidence_p1 * confidence_p2) ** 0.33
+
+    return shifts, confidence
+
+
 def _project_preprocess_image(
     image, axis: int, smoothing: float = 0, quantile: int = None, gamma: float = 1, dtype=None
 ):
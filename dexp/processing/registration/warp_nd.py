@@ -1,16 +1,33 @@
+import math
 from typing import Tuple, Union
 
+import numpy
 from arbol import aprint, section
 
 from dexp.processing.registration.model.warp_registration_model import (
     WarpRegistrationModel,
 )
+from dexp.processing.registration.translation_nd import (
+    _filter_image,
+    _phase_correlation_from_spectra,
+    _shifts_and_confidences_from_correlations,
+    _spectrum,
+)
 from dexp.processing.registration.translation_nd_proj import (
+    _combine_projection_shifts_batched,
+    _preprocess_image,
+    _project_preprocess_image,
     register_translation_proj_nd,
 )
+from dexp.processing.utils.nd_slice import nd_split_slices
 from dexp.processing.utils.scatter_gather_i2v import scatter_gather_i2v
 from dexp.utils import xpArray
-from dexp.utils.backends import Backend
+from dexp.utils.backends import Backend, NumpyBackend
+
+# Registration parameters supported by the batched registration of tiles:
+_preprocessing_parameters = ("denoise_input_sigma", "gamma", "log_compression", "edge_filter")
+_correlation_parameters = ("max_range_ratio", "decimate", "quantile", "sigma")
+_batched_parameters = _preprocessing_parameters + _correlation_parameters + ("drop_worse", "internal_dtype")
 
 
 @section("register_warp_nd")
@@ -21,6 +38,7 @@ def register_warp_nd(
     margins: Union[int, Tuple[int, ...]] = None,
     registration_method=register_translation_proj_nd,
     force_numpy: bool = False,
+    batched: bool = True,
     **kwargs,
 ) -> WarpRegistrationModel:
     """
@@ -35,6 +53,9 @@ def register_warp_nd(
     margins : Margins to add along each dimension per chunk
     registration_method : registration method to use per tile, must return a TranslationRegistrationModel.
     force_numpy: Forces output model to be allocated with numpy arrays.
+    batched : If True, and when using the default registration method, all tiles are registered together:
+        the projections of tiles of same shape are stacked and their phase correlations, peak search,
+        and confidence estimation, are computed in single batched calls instead of tile by tile.
     all additional kwargs are passed to the registration method (by default register_translation_maxproj_nd)
 
     Returns
@@ -47,14 +68,119 @@ def register_warp_nd(
 
     xp = Backend.get_xp_module()
 
-    def f(x, y):
-        model = registration_method(x, y, force_numpy=force_numpy, **kwargs)
-        aprint(f"model: {model} {'' if model.confidence > 0.3 else '(LOW QUALITY!)'}")
-        shift, confidence = model.get_shift_and_confidence()
-        return xp.asarray(shift), xp.asarray(confidence)
+    if (
+        batched
+        and registration_method is register_translation_proj_nd
+        and image_a.ndim in (2, 3)
+        and all(key in _batched_parameters for key in kwargs)
+    ):
+        vector_field, confidence = _register_tiles_batched(image_a, image_b, chunks=chunks, margins=margins, **kwargs)
+        nb_low_quality = int(numpy.sum(confidence <= 0.3))
+        aprint(f"Registered {confidence.size} tiles, {nb_low_quality} of which are of low quality.")
+
+    else:
+
+        def f(x, y):
+            model = registration_method(x, y, force_numpy=force_numpy, **kwargs)
+            aprint(f"model: {model} {'' if model.confidence > 0.3 else '(LOW QUALITY!)'}")
+            shift, confidence = model.get_shift_and_confidence()
+            return xp.asarray(shift), xp.asarray(confidence)
 
-    vector_field, confidence = scatter_gather_i2v(f, (image_a, image_b), tiles=chunks, margins=margins)
+        vector_field, confidence = scatter_gather_i2v(f, (image_a, image_b), tiles=chunks, margins=margins)
 
     model = WarpRegistrationModel(vector_field=vector_field, confidence=confidence, force_numpy=force_numpy)
 
     return model
+
+
+def _register_tiles_batched(
+    image_a: xpArray,
+    image_b: xpArray,
+    chunks: Union[int, Tuple[int, ...]],
+    margins: Union[int, Tuple[int, ...]] = None,
+    drop_worse: bool = True,
+    internal_dtype=None,
+    **kwargs,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Computes the same shifts and confidences as registering each tile with 'register_translation_proj_nd'
+    (with the default 2D registration method), but with one batched FFT per projection axis and tile shape.
+    Returns numpy arrays for the vector field and confidences, with one vector and confidence per tile.
+    """
+    xp = Backend.get_xp_module()
+
+    ndim = image_a.ndim
+    shape = image_a.shape
+
+    if type(chunks) == int:
+        chunks = (chunks,) * ndim
+
+    if margins is None:
+        margins = (0,) * ndim
+    elif type(margins) == int:
+        margins = (margins,) * ndim
+
+    preprocessing_kwargs = {k: v for k, v in kwargs.items() if k in _preprocessing_parameters}
+    correlation_kwargs = {k: v for k, v in kwargs.items() if k in _correlation_parameters}
+
+    # Same internal dtype as in 'register_translation_nd':
+    dtype = internal_dtype
+    if dtype is None:
+        dtype = numpy.float32 if ndim == 3 else image_a.dtype
+    if isinstance(Backend.current(), NumpyBackend):
+        dtype = numpy.float32
+
+    tile_slices = list(nd_split_slices(shape, chunks=chunks, margins=margins))
+    tile_grid_shape = tuple(math.ceil(s / c) for s, c in zip(shape, chunks))
+    nb_tiles = len(tile_slices)
+
+    # Same normalisation and projections as in 'register_translation_proj_nd', followed by the same filtering
+    # as in 'register_translation_nd'. The images to register are grouped by shape:
+    def _images(image, tile_slice):
+        tile = image[tile_slice]
+        if ndim == 2:
+            images = (_preprocess_image(tile, in_place=False, dtype=internal_dtype),)
+        else:
+            images = tuple(_project_preprocess_image(tile, axis=axis, dtype=xp.float32) for axis in range(3))
+        return tuple(_filter_image(image, internal_dtype=dtype, **preprocessing_kwargs) for image in images)
+
+    nb_projections = 1 if ndim == 2 else 3
+    groups = {}
+    for index, tile_slice in enumerate(tile_slices):
+        tile_shape = tuple(s.stop - s.start for s in tile_slice)
+        groups.setdefault(tile_shape, []).append(index)
+
+    shifts = [xp.zeros((nb_tiles, 2), dtype=xp.float32) for _ in range(nb_projections)]
+    confidences = [xp.zeros((nb_tiles,), dtype=xp.float32) for _ in range(nb_projections)]
+
+    for indices in groups.values():
+        images_a = [_images(image_a, tile_slices[index]) for index in indices]
+        images_b = [_images(image_b, tile_slices[index]) for index in indices]
+        batch_indices = xp.asarray(indices)
+
+        for p in range(nb_projections):
+            stack_a = xp.stack([images[p] for images in images_a])
+            stack_b = xp.stack([images[p] for images in images_b])
+
+            # One batched FFT for all tiles of the group:
+            axes = (1, 2)
+            correlations = _phase_correlation_from_spectra(
+                _spectrum(stack_a, axes=axes), _spectrum(stack_b, axes=axes), internal_dtype=dtype, axes=axes
+            )
+            del stack_a, stack_b
+
+            group_shifts, group_confidences = _shifts_and_confidences_from_correlations(
+                correlations, **correlation_kwargs
+            )
+            shifts[p][batch_indices] = group_shifts
+            confidences[p][batch_indices] = group_confidences
+
+    if ndim == 2:
+        vector_field, confidence = shifts[0], confidences[0]
+    else:
+        vector_field, confidence = _combine_projection_shifts_batched(shifts, confidences, drop_worse=drop_worse)
+
+    vector_field = Backend.to_numpy(vector_field, dtype=numpy.float32).reshape(tile_grid_shape + (ndim,))
+    confidence = Backend.to_numpy(confidence, dtype=numpy.float32).reshape(tile_grid_shape)
+
+    return vector_field, confidence
@@ -0,0 +1,29 @@
+import numpy
+
+from dexp.processing.utils.estimate_tiles import estimate_tiles
+
+
+def test_estimate_tiles():
+    shape = (256, 1024, 1024)
+    buffers_per_voxel = 6
+
+    # Enough memory for the whole image, no tiling and no margins needed:
+    tiles, margins = estimate_tiles(shape, memory_budget=int(1e12), buffers_per_voxel=buffers_per_voxel, margins=17)
+    assert tiles == shape
+    assert margins == (0, 0, 0)
+
+    # The longest axis are split first, and margins are only needed along split axis:
+    memory_budget = int(2e9)
+    tiles, margins = estimate_tiles(shape, memory_budget=memory_budget, buffers_per_voxel=buffers_per_voxel, margins=17)
+    assert tiles == (256, 512, 512)
+    assert margins == (0, 17, 17)
+
+    # Accounting for FFT padding requires smaller tiles:
+    tiles, margins = estimate_tiles(
+        shape, memory_budget=memory_budget, buffers_per_voxel=buffers_per_voxel, margins=17, fft_kernel_shape=(17,) * 3
+    )
+    print(tiles, margins)
+
+    tile_size = numpy.prod([min(s, t + 2 * m) for s, t, m in zip(shape, tiles, margins)])
+    assert tile_size * 4 * buffers_per_voxel <= memory_budget
+    assert numpy.prod(tiles) < 256 * 512 * 512
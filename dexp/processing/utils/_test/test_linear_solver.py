@@ -2,6 +2,7 @@ import pytest
 from arbol import aprint, asection
 
 from dexp.processing.utils.linear_solver import linsolve
+from dexp.utils.backends import NumpyBackend
 from dexp.utils.backends.backend import Backend
 from dexp.utils.testing.testing import execute_both_backends
 
@@ -35,3 +36,37 @@ def _run_solver(w=37, h=41, noise=1e-2, **kwargs):
     aprint(f"error : {xp.absolute(x - x_gt)} ")
 
     return mean_abs_error
+
+
+def test_linear_solver_multiple_columns_sparse() -> None:
+    with NumpyBackend():
+        _run_solver_multiple_columns_sparse()
+
+
+def _run_solver_multiple_columns_sparse():
+    xp = Backend.get_xp_module()
+    sp = Backend.get_sp_module()
+
+    xp.random.seed(42)
+
+    # same kind of system as for sequence registration: differences between consecutive unknowns:
+    length = 32
+    x_gt = xp.cumsum(xp.random.rand(length, 3) - 0.5, axis=0)
+    x_gt -= x_gt[0]
+    a = xp.zeros((length, length))
+    for i in range(length - 1):
+        a[i, i], a[i, i + 1] = 1, -1
+    a[-1, 0] = 1
+    y = a @ x_gt
+
+    x = linsolve(sp.sparse.csr_matrix(a), y, alpha_reg=0, order_error=2)
+    assert x.shape == x_gt.shape
+    assert xp.mean(xp.absolute(x - x_gt)).item() < 1e-3
+
+    x = linsolve(sp.sparse.csr_matrix(a), y, alpha_reg=1e-4, order_error=1, order_reg=1)
+    assert x.shape == x_gt.shape
+    assert xp.mean(xp.absolute(x - x_gt)).item() < 1e-2
+
+    x = linsolve(sp.sparse.csr_matrix(a), y, alpha_reg=1e-4, order_error=2, order_reg=1)
+    assert x.shape == x_gt.shape
+    assert xp.mean(xp.absolute(x - x_gt)).item() < 1e-2
@@ -0,0 +1,44 @@
+import numpy
+import pytest
+
+from dexp.processing.utils.multi_projection import multi_projection
+from dexp.utils.backends import NumpyBackend
+
+
+@pytest.mark.parametrize("dtype", [numpy.uint16, numpy.float32])
+def test_multi_projection(dtype):
+    with NumpyBackend():
+        rng = numpy.random.default_rng(0)
+        image = (rng.random((13, 17, 29)) * 1000).astype(dtype)
+
+        # Small blocks, to split along every axis:
+        projections, stats = multi_projection(
+            image, projection_types=("max", "min", "sum", "mean"), statistics=True, block_bytes=10 * image.itemsize
+        )
+
+        for axis in range(image.ndim):
+            assert projections["max"][axis].dtype == image.dtype
+            assert numpy.array_equal(projections["max"][axis], image.max(axis=axis))
+            assert numpy.array_equal(projections["min"][axis], image.min(axis=axis))
+            assert numpy.allclose(projections["sum"][axis], image.sum(axis=axis, dtype=numpy.float64))
+            assert numpy.allclose(projections["mean"][axis], image.mean(axis=axis), rtol=1e-5)
+
+        assert stats["min"] == image.min()
+        assert stats["max"] == image.max()
+        assert stats["mean"] == pytest.approx(image.mean(dtype=numpy.float64))
+        assert stats["std"] == pytest.approx(image.std(dtype=numpy.float64))
+
+
+def test_multi_projection_axes():
+    with NumpyBackend():
+        image = numpy.random.randint(0, 4096, size=(3, 8, 16, 16), dtype=numpy.uint16)
+
+        # Projections of each time point of a time series:
+        projections, stats = multi_projection(image, axes=(1, 2, 3), block_bytes=512)
+        assert stats is None
+        assert list(projections) == ["max"]
+        for i, axis in enumerate((1, 2, 3)):
+            assert numpy.array_equal(projections["max"][i], image.max(axis=axis))
+
+        with pytest.raises(ValueError):
+            multi_projection(image, projection_types=("median",))
@@ -1,14 +1,74 @@
 import numpy as np
+import zarr
 from arbol import aprint
 
 from dexp.processing.utils.scatter_gather_i2i import scatter_gather_i2i
-from dexp.utils.backends import Backend
+from dexp.utils.backends import Backend, NumpyBackend
 from dexp.utils.testing.testing import execute_both_backends
 from dexp.utils.timeit import timeit
 
 
 @execute_both_backends
 def test_scatter_gather_i2i(ndim=3, length_xy=128, splits=4, filter_size=7):
+    _test_scatter_gather_i2i(ndim, length_xy, splits, filter_size)
+
+
+@execute_both_backends
+def test_scatter_gather_i2i_pipelined(ndim=3, length_xy=128, splits=4, filter_size=7):
+    _test_scatter_gather_i2i(ndim, length_xy, splits, filter_size, pipelined=True, queue_depth=2)
+
+
+@execute_both_backends
+def test_scatter_gather_i2i_workers(ndim=3, length_xy=128, splits=4, filter_size=7):
+    _test_scatter_gather_i2i(ndim, length_xy, splits, filter_size, workers=4)
+
+
+@execute_both_backends
+def test_scatter_gather_i2i_worker_backends(length=64, tile=16):
+    image = np.random.default_rng().uniform(0, 1, size=(length,) * 3).astype(np.float32)
+    backend_type = type(Backend.current())
+    backend_stacks = []
+
+    def f(x):
+        # Tiles are computed in the worker threads within a copy of the current backend:
+        assert type(Backend.current()) is backend_type
+        backend_stacks.append(Backend._local.backend_stack)
+        return x * 2
+
+    scatter_gather_i2i(f, image, tiles=tile, workers=4)
+
+    # Backend copies are exited once the tiles are computed, none remains entered in the worker threads:
+    assert len(backend_stacks) == (length // tile) ** 3
+    assert all(len(stack) == 0 for stack in backend_stacks)
+
+
+def test_scatter_gather_i2i_process_workers(ndim=3, length_xy=64, splits=4, filter_size=7):
+    # Process workers are only supported with the NumPy backend:
+    with NumpyBackend():
+        _test_scatter_gather_i2i(ndim, length_xy, splits, filter_size, workers=2, workers_backend="loky")
+
+
+def test_scatter_gather_i2i_chunked_out(length=64, tile=16):
+    with NumpyBackend():
+        image = np.random.default_rng().uniform(0, 1, size=(length,) * 3).astype(np.float32)
+        # Chunks larger than the tiles along y and x, smaller along z:
+        out = zarr.zeros(image.shape, chunks=(8, 32, 64), dtype=np.float32)
+
+        tile_shapes = set()
+
+        def f(x):
+            tile_shapes.add(x.shape)
+            return x * 2
+
+        scatter_gather_i2i(f, image, tiles=(20, tile, tile), workers=4, out=out)
+
+        # Tiles are shrunk to a multiple of the chunks along z, but never enlarged to the chunks along y and x:
+        assert tile_shapes == {(16, tile, tile)}
+        # Tiles sharing chunks are stored one at a time:
+        assert np.array_equal(out[...], image * 2)
+
+
+def _test_scatter_gather_i2i(ndim, length_xy, splits, filter_size, **kwargs):
     sp = Backend.get_sp_module()
     rng = np.random.default_rng()
 
@@ -25,7 +85,7 @@ def test_scatter_gather_i2i(ndim=3, length_xy=128, splits=4, filter_size=7):
         result_ref = 0 * image + 17
 
     with timeit("scatter_gather(f)"):
-        result = scatter_gather_i2i(f, image, tiles=(length_xy // splits,) * ndim, margins=filter_size // 2)
+        result = scatter_gather_i2i(f, image, tiles=(length_xy // splits,) * ndim, margins=filter_size // 2, **kwargs)
 
     image = Backend.to_numpy(image)
     result_ref = Backend.to_numpy(result_ref)
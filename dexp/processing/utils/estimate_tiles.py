@@ -0,0 +1,77 @@
+import math
+from typing import Optional, Sequence, Tuple, Union
+
+import numpy
+import scipy.fftpack
+
+
+def estimate_tiles(
+    shape: Tuple[int, ...],
+    memory_budget: int,
+    buffers_per_voxel: float,
+    margins: Optional[Union[int, Tuple[int, ...]]] = None,
+    fft_kernel_shape: Optional[Sequence[int]] = None,
+    dtype: numpy.dtype = numpy.float32,
+) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+    """
+    Estimates the tile shape and margins to use with scatter_gather_i2i so that the number of tiles is as small
+    as possible while the memory needed to process one tile stays within a given memory budget.
+    Axis are split one at a time, always choosing the split that reduces the memory footprint the most,
+    margins are dropped along axis that do not need to be split.
+
+    Parameters
+    ----------
+    shape : shape of the image to process.
+    memory_budget : memory budget in bytes for processing a single tile (e.g. free memory of the device).
+    buffers_per_voxel : number of buffers of given dtype needed per voxel of (padded) tile by the function
+        to apply, for example: about 6 for Lucy-Richardson deconvolution, and about 8 for tg fusion.
+    margins : margins added to each tile, can be a single integer or a tuple of integers.
+    fft_kernel_shape : If the function does FFT based convolutions, shape of the convolution kernel,
+        the tile is then assumed to be padded as in fft_convolve, including the padding to the next fast FFT length.
+    dtype : dtype of the buffers.
+
+    Returns
+    -------
+    Tuple of tile shape and margins.
+    """
+
+    ndim = len(shape)
+
+    if margins is None:
+        margins = (0,) * ndim
+    elif type(margins) == int:
+        margins = (margins,) * ndim
+
+    itemsize = numpy.dtype(dtype).itemsize
+
+    def _extent(length: int, splits: int, margin: int, kernel_length: Optional[int]) -> int:
+        tile = math.ceil(length / splits)
+        extent = tile if splits == 1 else min(length, tile + 2 * margin)
+        if kernel_length is not None:
+            # fft_convolve pads with half the kernel on each side, and then to the full convolution length:
+            extent = scipy.fftpack.next_fast_len(extent + 2 * (kernel_length // 2) + kernel_length - 1)
+        return extent
+
+    def _memory(splits: Tuple[int, ...]) -> float:
+        kernel_shape = (None,) * ndim if fft_kernel_shape is None else tuple(fft_kernel_shape)
+        extents = tuple(_extent(*args) for args in zip(shape, splits, margins, kernel_shape))
+        return float(numpy.prod(extents, dtype=numpy.float64)) * itemsize * buffers_per_voxel
+
+    splits = (1,) * ndim
+    while _memory(splits) > memory_budget:
+        candidates = [
+            splits[:axis] + (splits[axis] + 1,) + splits[axis + 1 :]
+            for axis in range(ndim)
+            if splits[axis] < shape[axis]
+        ]
+        if len(candidates) == 0:
+            raise ValueError(
+                f"No tiling of an image of shape {shape} fits within a memory budget of {memory_budget} bytes."
+            )
+        # Amongst the candidate splits, we pick the one that reduces the memory footprint the most:
+        splits = min(candidates, key=_memory)
+
+    tiles = tuple(math.ceil(length / s) for length, s in zip(shape, splits))
+    margins = tuple(0 if s == 1 else margin for s, margin in zip(splits, margins))
+
+    return tiles, margins
@@ -1,6 +1,8 @@
 from typing import Optional, Sequence, Tuple
 
 import numpy
+import scipy.sparse
+import scipy.sparse.linalg
 from arbol import aprint
 from scipy.optimize import minimize
 
@@ -23,35 +25,109 @@ def linsolve(
     limited: bool = True,
     verbose: bool = False,
 ) -> xpArray:
+    """
+    Solves the linear system a @ x = y by minimising: beta * ||a @ x - y||_p + alpha_reg * alpha * ||x||_q
+    where p and q are the orders of the error and regularisation terms, and beta and alpha normalise
+    for the number of equations and unknowns. The matrix can be sparse. Error orders within [1, 2) are minimised
+    by iteratively reweighted least squares, other problems with L-BFGS-B (or BFGS) and analytic gradients.
+    Several systems sharing the same matrix can be solved in one call by passing a 2D array for y,
+    one column per right-hand side, each column is solved independently.
+
+    Parameters
+    ----------
+    a : matrix of shape (m, n), dense or sparse.
+    y : right-hand side of shape (m,) or (m, k).
+    x0 : initial solution of shape (n,) or (n, k).
+    maxiter : maximum number of iterations.
+    maxfun : maximum number of function evaluations.
+    tolerance : tolerance for termination.
+    order_error : order p of the error term.
+    order_reg : order q of the regularisation term.
+    alpha_reg : multiplicative coefficient for regularisation term.
+    l2_init : if True the minimisation is initialised with the least squares solution.
+    bounds : bounds for each of the n unknowns (only when limited is True).
+    limited : if True L-BFGS-B is used, BFGS otherwise.
+    verbose : prints convergence messages.
+
+    Returns
+    -------
+    Solution of shape (n,) or (n, k).
+    """
     xp = Backend.get_xp_module()
 
     a = Backend.to_backend(a)
     y = Backend.to_backend(y)
 
+    # Least squares without regularisation has a direct (sparse) solution:
+    if order_error == 2 and alpha_reg == 0 and x0 is None and bounds is None:
+        return _lstsq(a, y, tolerance=tolerance)
+
+    if y.ndim == 2:
+        return xp.stack(
+            [
+                linsolve(
+                    a,
+                    y[:, i],
+                    x0=None if x0 is None else x0[:, i],
+                    maxiter=maxiter,
+                    maxfun=maxfun,
+                    tolerance=tolerance,
+                    order_error=order_error,
+                    order_reg=order_reg,
+                    alpha_reg=alpha_reg,
+                    l2_init=l2_init,
+                    bounds=bounds,
+                    limited=limited,
+                    verbose=verbose,
+                )
+                for i in range(y.shape[1])
+            ],
+            axis=1,
+        )
+
+    # Norms of order below 2 are not smooth enough for L-BFGS-B, which stalls far from the minimum:
+    irls = bounds is None and 1 <= order_error < 2 and (alpha_reg == 0 or 1 <= order_reg <= 2)
+
     if x0 is None:
-        if l2_init:
-            x0 = linsolve(a, y, x0=x0, maxiter=maxiter, tolerance=tolerance, order_error=2, alpha_reg=0, l2_init=False)
+        # reweighted least squares start from the least squares solution, weights are too uneven at zero:
+        if l2_init or irls:
+            x0 = _lstsq(a, y, tolerance=tolerance)
         else:
             x0 = numpy.zeros(a.shape[1])
+    x0 = Backend.to_numpy(x0, dtype=numpy.float64)
 
     beta = (1.0 / y.shape[0]) ** (1.0 / order_error)
     alpha = (1.0 / x0.shape[0]) ** (1.0 / order_reg)
 
+    if irls:
+        x = _irls(
+            a,
+            y,
+            x0,
+            order_error=order_error,
+            order_reg=order_reg,
+            beta=beta,
+            alpha=alpha_reg * alpha,
+            maxiter=maxiter,
+            tolerance=tolerance,
+        )
+        return Backend.to_backend(x)
+
     def fun(x):
         x = Backend.to_backend(x)
-        if alpha_reg == 0:
-            objective = beta * float(xp.linalg.norm(a @ x - y, ord=order_error))
-            # aprint(f"objective={objective}, regterm=N/A ")
-        else:
-            objective = beta * float(xp.linalg.norm(a @ x - y, ord=order_error))
-            regularisation_term = (alpha_reg * alpha) * float(xp.linalg.norm(x, ord=order_reg))
-            # aprint(f"objective={objective}, regterm={regularisation_term} ")
-            objective += regularisation_term
-        return objective
+        error, error_gradient = _norm_and_gradient(a @ x - y, order_error)
+        objective = beta * error
+        gradient = beta * (a.T @ error_gradient)
+        if alpha_reg != 0:
+            regularisation_term, regularisation_gradient = _norm_and_gradient(x, order_reg)
+            objective += (alpha_reg * alpha) * regularisation_term
+            gradient += (alpha_reg * alpha) * regularisation_gradient
+        return objective, Backend.to_numpy(gradient, dtype=numpy.float64)
 
     result = minimize(
         fun,
         x0,
+        jac=True,
         method="L-BFGS-B" if limited else "BFGS",
         tol=tolerance,
         bounds=bounds if limited else None,
@@ -60,7 +136,6 @@ def linsolve(
             "maxiter": maxiter,
             "maxfun": maxfun,
             "gtol": tolerance,
-            "eps": 1e-5,  # the minimization would not converge sometimes without this param.
         },
     )
 
@@ -74,3 +149,84 @@ def linsolve(
         )
 
     return Backend.to_backend(result.x)
+
+
+def _norm_and_gradient(v: xpArray, order: float) -> Tuple[float, xpArray]:
+    """
+    Lp norm of a vector, and its gradient.
+    """
+    xp = Backend.get_xp_module()
+
+    norm = float(xp.linalg.norm(v, ord=order))
+    if norm == 0:
+        # the gradient of a norm that is zero is taken to be zero:
+        return norm, xp.zeros_like(v)
+    if order == 1:
+        gradient = xp.sign(v)
+    else:
+        gradient = xp.sign(v) * (xp.absolute(v) / norm) ** (order - 1)
+
+    return norm, gradient
+
+
+def _irls(
+    a: xpArray,
+    y: xpArray,
+    x0: numpy.ndarray,
+    order_error: float,
+    order_reg: float,
+    beta: float,
+    alpha: float,
+    maxiter: int,
+    tolerance: float,
+) -> numpy.ndarray:
+    """
+    Minimises beta * ||a @ x - y||_p + alpha * ||x||_q, for orders p and q within [1, 2], by iteratively reweighted
+    least squares: each iteration minimises a weighted least squares majorant of the objective at the current
+    solution, so that the objective decreases at each iteration, and the solution is a fixed point.
+    """
+    if not scipy.sparse.issparse(a):
+        a = Backend.to_numpy(a)
+    a = scipy.sparse.csr_matrix(a, dtype=numpy.float64)
+    y = Backend.to_numpy(y, dtype=numpy.float64)
+
+    # Residuals and unknowns smaller than this are given the weight they would have at this value:
+    eps = tolerance * max(1.0, float(numpy.max(numpy.absolute(y), initial=0)))
+
+    def _weights(v, order):
+        v = numpy.maximum(numpy.absolute(v), eps)
+        # weights of the quadratic majorant of the norm ||v||_order at v:
+        return numpy.linalg.norm(v, ord=order) ** (1 - order) * v ** (order - 2)
+
+    x = x0
+    for _ in range(int(min(maxiter, 1000))):
+        # normal equations of the weighted least squares majorant:
+        error_weights = scipy.sparse.diags(beta * _weights(a @ x - y, order_error))
+        normal_matrix = a.T @ error_weights @ a
+        if alpha != 0:
+            normal_matrix = normal_matrix + scipy.sparse.diags(alpha * _weights(x, order_reg))
+        new_x = scipy.sparse.linalg.spsolve(normal_matrix.tocsc(), a.T @ (error_weights @ y))
+        if not numpy.all(numpy.isfinite(new_x)):
+            # singular system, for example without regularisation and with unknowns not constrained by a:
+            new_x = scipy.sparse.linalg.lsqr(normal_matrix, a.T @ (error_weights @ y), x0=x)[0]
+        converged = numpy.linalg.norm(new_x - x) <= tolerance * max(1.0, numpy.linalg.norm(new_x))
+        x = new_x
+        if converged:
+            break
+
+    return x
+
+
+def _lstsq(a: xpArray, y: xpArray, tolerance: float = 1e-6) -> xpArray:
+    """
+    Least squares solution of a @ x = y, column by column for 2D right-hand sides, works for sparse matrices.
+    """
+    xp = Backend.get_xp_module()
+
+    if y.ndim == 1:
+        if not scipy.sparse.issparse(a):
+            a = Backend.to_numpy(a)
+        x = scipy.sparse.linalg.lsqr(a, Backend.to_numpy(y), atol=tolerance, btol=tolerance)[0]
+        return Backend.to_backend(x)
+
+    return xp.stack([_lstsq(a, y[:, i], tolerance=tolerance) for i in range(y.shape[1])], axis=1)
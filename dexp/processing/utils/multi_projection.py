@@ -0,0 +1,145 @@
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+
+from dexp.utils import xpArray
+from dexp.utils.backends import Backend
+
+# Size of the blocks of the traversal, small enough for a block to stay in (L2) cache while it is reduced:
+_default_block_bytes = 2 ** 20
+
+# Number of planes of the blocks along the leading axes:
+_block_depth = 8
+
+_projection_types = ("max", "min", "sum", "mean")
+
+
+def multi_projection(
+    image: xpArray,
+    axes: Optional[Sequence[int]] = None,
+    projection_types: Sequence[str] = ("max",),
+    statistics: bool = False,
+    block_bytes: int = _default_block_bytes,
+) -> Tuple[Dict[str, List[xpArray]], Optional[Dict[str, float]]]:
+    """
+    Computes the projections of an image along several axes, and optionally its intensity statistics, in a single
+    traversal of the image. The image is traversed block by block, each block is small enough to stay in cache
+    while it is reduced along every axis, so that the image is read once from memory instead of once per projection.
+
+    Parameters
+    ----------
+    image : image to project.
+    axes : axes along which to project, all axes by default.
+    projection_types : types of projections to compute: 'max', 'min', 'sum', and 'mean'.
+    statistics : if True, the minimum, maximum, mean and standard deviation of the image are also computed.
+    block_bytes : size in bytes of the blocks of the traversal.
+
+    Returns
+    -------
+    Dictionary of projections, giving for each projection type the list of projections along each of the given axes,
+    and dictionary of statistics ('min', 'max', 'mean', 'std'), or None if statistics are not computed.
+    Max and min projections are of the dtype of the image, sum projections are float64, mean projections float32.
+    """
+    xp = Backend.get_xp_module(image)
+
+    ndim = image.ndim
+    axes = tuple(range(ndim)) if axes is None else tuple(a % ndim for a in axes)
+    for projection_type in projection_types:
+        if projection_type not in _projection_types:
+            raise ValueError(f"Unknown projection type: '{projection_type}', must be one of: {_projection_types}")
+
+    # Mean projections are obtained from sum projections:
+    reductions = {"sum" if t == "mean" else t for t in projection_types}
+
+    accumulators = {}
+    for reduction in reductions:
+        dtype = numpy.float64 if reduction == "sum" else image.dtype
+        fill_value = {"max": _lowest_value(image.dtype), "min": _highest_value(image.dtype), "sum": 0}[reduction]
+        accumulators[reduction] = [
+            xp.full(tuple(s for i, s in enumerate(image.shape) if i != axis), fill_value, dtype=dtype) for axis in axes
+        ]
+
+    minimum, maximum, total, total_squares = None, None, 0.0, 0.0
+
+    for block_slicing in _block_slicings(image.shape, image.dtype.itemsize, block_bytes):
+        block = image[block_slicing]
+
+        for reduction in reductions:
+            for axis, accumulator in zip(axes, accumulators[reduction]):
+                target = accumulator[tuple(s for i, s in enumerate(block_slicing) if i != axis)]
+                if reduction == "max":
+                    xp.maximum(target, xp.max(block, axis=axis), out=target)
+                elif reduction == "min":
+                    xp.minimum(target, xp.min(block, axis=axis), out=target)
+                else:
+                    target += xp.sum(block, axis=axis, dtype=numpy.float64)
+
+        if statistics:
+            # the block is still in cache:
+            block_min, block_max = block.min(), block.max()
+            minimum = block_min if minimum is None else xp.minimum(minimum, block_min)
+            maximum = block_max if maximum is None else xp.maximum(maximum, block_max)
+            total = total + xp.sum(block, dtype=numpy.float64)
+            total_squares = total_squares + xp.sum(xp.square(block, dtype=numpy.float64))
+
+    projections = {}
+    for projection_type in projection_types:
+        if projection_type == "mean":
+            projections["mean"] = [
+                (accumulator / image.shape[axis]).astype(numpy.float32, copy=False)
+                for axis, accumulator in zip(axes, accumulators["sum"])
+            ]
+        else:
+            projections[projection_type] = accumulators[projection_type]
+
+    stats = None
+    if statistics:
+        size = max(1, image.size)
+        mean = float(total) / size
+        variance = max(0.0, float(total_squares) / size - mean ** 2)
+        stats = {
+            "min": None if minimum is None else float(minimum),
+            "max": None if maximum is None else float(maximum),
+            "mean": mean,
+            "std": variance ** 0.5,
+        }
+
+    return projections, stats
+
+
+def _block_slicings(shape: Tuple[int, ...], itemsize: int, block_bytes: int):
+    # Blocks span whole rows (last axis), are a few planes deep along the leading axes so that the reductions
+    # along these axes reduce more than one element, and span as many rows as the size of the blocks allows:
+    ndim = len(shape)
+    budget = max(1, block_bytes // itemsize)
+    block_shape = [1] * ndim
+    if ndim > 0:
+        block_shape[-1] = max(1, min(shape[-1], budget))
+        depth = _block_depth if block_shape[-1] * _block_depth <= budget else 1
+        for axis in reversed(range(ndim - 2)):
+            block_shape[axis] = max(1, min(shape[axis], depth))
+            depth = max(1, depth // block_shape[axis])
+    if ndim > 1:
+        nb_rows = budget // (block_shape[-1] * int(numpy.prod(block_shape[:-2], dtype=numpy.int64)))
+        block_shape[-2] = max(1, min(shape[-2], nb_rows))
+
+    ranges = (range(0, s, b) for s, b in zip(shape, block_shape))
+    for origin in itertools.product(*ranges):
+        yield tuple(slice(o, min(o + b, s)) for o, b, s in zip(origin, block_shape, shape))
+
+
+def _lowest_value(dtype: numpy.dtype):
+    if numpy.issubdtype(dtype, numpy.bool_):
+        return False
+    elif numpy.issubdtype(dtype, numpy.integer):
+        return numpy.iinfo(dtype).min
+    return -numpy.inf
+
+
+def _highest_value(dtype: numpy.dtype):
+    if numpy.issubdtype(dtype, numpy.bool_):
+        return True
+    elif numpy.issubdtype(dtype, numpy.integer):
+        return numpy.iinfo(dtype).max
+    return numpy.inf
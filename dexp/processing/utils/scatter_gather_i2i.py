@@ -1,11 +1,16 @@
-from typing import Callable, Optional, Sequence, Tuple, Union
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Callable, Optional, Sequence, Tuple, Union
 
 import numpy
+from joblib import Parallel, delayed
 
 from dexp.processing.utils.nd_slice import nd_split_slices, remove_margin_slice
 from dexp.processing.utils.normalise import Normalise
 from dexp.utils import xpArray
-from dexp.utils.backends import Backend
+from dexp.utils.backends import Backend, NumpyBackend
 
 
 def scatter_gather_i2i(
@@ -17,6 +22,11 @@ def scatter_gather_i2i(
     clip: bool = False,
     to_numpy: bool = True,
     internal_dtype: Optional[numpy.dtype] = None,
+    pipelined: bool = False,
+    queue_depth: int = 1,
+    workers: int = 1,
+    workers_backend: str = "threading",
+    out: Optional[Any] = None,
 ) -> xpArray:
     """
     Image-2-image scatter-gather.
@@ -38,10 +48,23 @@ def scatter_gather_i2i(
     to_numpy : should the result be a numpy array? Very usefull when the compute backend
         cannot hold the whole input and output images in memory.
     internal_dtype : internal dtype for computation
+    pipelined : if True, tiles are loaded (sliced and moved to the backend) and stored (moved back and assembled)
+        in background threads while the current tile is being computed.
+    queue_depth : maximal number of tiles loaded ahead of, and waiting to be stored behind, the tile being computed.
+        Only used in pipelined mode, bounds the extra memory needed.
+    workers : number of tiles to process concurrently, usefull on the NumPy backend when the function
+        is single threaded. If workers > 1 the pipelined mode is not used.
+    workers_backend : What backend to spawn workers with, can be ‘threading’ (multi-thread) or
+        ‘loky’ (multi-process, NumPy backend only). With threads, tiles are written in place into the result,
+        with processes the function must be picklable and tiles are sent back to the main process.
+    out : optional target array of same shape as the input image, for example a zarr array or a StackWriter
+        obtained from ZDataset.stack_writer. Tiles are then written directly into it instead of into a newly
+        allocated array. If the target is chunked, tiles larger than its chunks are shrunk to a multiple of them.
 
     Returns
     -------
     Result of applying the unary function to the input image, if to_numpy==True then the image is
+    a numpy array, if 'out' is given then 'out' is returned.
 
     """
 
@@ -54,19 +77,38 @@ def scatter_gather_i2i(
     # If None is passed for a tile that means that we don't tile along that axis, we als clip the tile size:
     tiles = tuple((length if tile is None else min(length, tile)) for tile, length in zip(tiles, image.shape))
 
+    # Tiles written to a chunked target are aligned to its chunks when they are at least as large, so that no chunk
+    # is written twice, tiles are never enlarged as that would exceed the memory budget of the function:
+    out_chunks = None if out is None else getattr(out, "chunks", None)
+    aligned = True
+    if out_chunks is not None:
+        tiles = tuple(
+            tile if tile < chunk else min(length, (tile // chunk) * chunk)
+            for tile, chunk, length in zip(tiles, out_chunks, image.shape)
+        )
+        aligned = all(
+            tile % chunk == 0 or tile == length for tile, chunk, length in zip(tiles, out_chunks, image.shape)
+        )
+
     if margins is None:
         margins = (0,) * image.ndim
 
     if type(margins) == int:
         margins = (margins,) * image.ndim
 
-    if to_numpy:
+    if out is not None:
+        if tuple(out.shape) != tuple(image.shape):
+            raise ValueError(f"Target array of shape {out.shape} does not match image shape {image.shape}")
+        result = out
+    elif to_numpy:
         result = numpy.empty(shape=image.shape, dtype=internal_dtype)
     else:
         result = Backend.get_xp_module(image).empty_like(image, dtype=internal_dtype)
 
-    # Normalise:
-    norm = Normalise(Backend.to_backend(image), do_normalise=normalise, clip=clip, quantile=0.005)
+    # Normalise (the image is only moved to the backend if needed, it might be too large or not in memory):
+    norm = Normalise(
+        Backend.to_backend(image) if normalise else image, do_normalise=normalise, clip=clip, quantile=0.005
+    )
 
     # image shape:
     shape = image.shape
@@ -81,13 +123,32 @@ def scatter_gather_i2i(
     # Number of tiles:
     number_of_tiles = len(tile_slices)
 
-    if number_of_tiles == 1:
+    if number_of_tiles == 1 and out is None:
         # If there is only one tile, let's not be complicated about it:
         result = norm.backward(function(norm.forward(image)))
         if to_numpy:
             result = Backend.to_numpy(result, dtype=internal_dtype)
         else:
             result = Backend.to_backend(result, dtype=internal_dtype)
+    elif workers > 1:
+        _scatter_gather_loop_parallel(
+            norm.backward,
+            function,
+            image,
+            internal_dtype,
+            norm.forward,
+            result,
+            shape,
+            slices,
+            to_numpy,
+            workers,
+            workers_backend,
+            aligned,
+        )
+    elif pipelined:
+        _scatter_gather_loop_pipelined(
+            norm.backward, function, image, internal_dtype, norm.forward, result, shape, slices, to_numpy, queue_depth
+        )
     else:
         _scatter_gather_loop(
             norm.backward, function, image, internal_dtype, norm.forward, result, shape, slices, to_numpy
@@ -109,18 +170,174 @@ def _scatter_gather_loop(
 ) -> None:
 
     for tile_slice, tile_slice_no_margins in slices:
-        image_tile = image[tile_slice]
+        image_tile = _load_tile(image, tile_slice, internal_dtype)
+        image_tile = denorm_fun(function(norm_fun(image_tile)))
+        _store_tile(result, image_tile, shape, tile_slice, tile_slice_no_margins, internal_dtype, to_numpy)
+
+
+def _scatter_gather_loop_pipelined(
+    denorm_fun: Callable,
+    function: Callable,
+    image: xpArray,
+    internal_dtype: numpy.dtype,
+    norm_fun: Callable,
+    result: Callable,
+    shape: Tuple[int, ...],
+    slices: Sequence[Tuple[slice, ...]],
+    to_numpy: bool,
+    queue_depth: int,
+) -> None:
+
+    slices = list(slices)
+    queue_depth = max(1, queue_depth)
+
+    with _BackendThreadPool(max_workers=1) as loader, _BackendThreadPool(max_workers=1) as writer:
+
+        loading = deque()
+        storing = deque()
+        next_to_load = 0
+
+        def _schedule_loads():
+            nonlocal next_to_load
+            while len(loading) < queue_depth and next_to_load < len(slices):
+                tile_slice, _ = slices[next_to_load]
+                loading.append(loader.submit(_load_tile, image, tile_slice, internal_dtype))
+                next_to_load += 1
+
+        _schedule_loads()
+
+        for tile_slice, tile_slice_no_margins in slices:
+            image_tile = loading.popleft().result()
+            _schedule_loads()
+
+            image_tile = denorm_fun(function(norm_fun(image_tile)))
+
+            storing.append(
+                writer.submit(
+                    _store_tile, result, image_tile, shape, tile_slice, tile_slice_no_margins, internal_dtype, to_numpy
+                )
+            )
+            del image_tile
+
+            # Waits for stored tiles to keep memory bounded, and surfaces errors as early as possible:
+            while len(storing) > queue_depth:
+                storing.popleft().result()
+
+        while storing:
+            storing.popleft().result()
+
+
+def _scatter_gather_loop_parallel(
+    denorm_fun: Callable,
+    function: Callable,
+    image: xpArray,
+    internal_dtype: numpy.dtype,
+    norm_fun: Callable,
+    result: Callable,
+    shape: Tuple[int, ...],
+    slices: Sequence[Tuple[slice, ...]],
+    to_numpy: bool,
+    workers: int,
+    workers_backend: str,
+    aligned: bool = True,
+) -> None:
+
+    slices = list(slices)
+
+    if workers_backend == "threading":
+        # Tiles that share chunks of the result are stored one at a time, chunks are read, modified and written back:
+        store_lock = nullcontext() if aligned else threading.Lock()
+
+        # Each thread loads, computes and directly stores its tiles into the result array:
+        def _process_tile(tile_slice, tile_slice_no_margins):
+            image_tile = _load_tile(image, tile_slice, internal_dtype)
+            image_tile = denorm_fun(function(norm_fun(image_tile)))
+            with store_lock:
+                _store_tile(result, image_tile, shape, tile_slice, tile_slice_no_margins, internal_dtype, to_numpy)
+
+        with _BackendThreadPool(max_workers=workers) as pool:
+            futures = [pool.submit(_process_tile, *tile_slices) for tile_slices in slices]
+            for future in futures:
+                future.result()
+
+    else:
+        backend = Backend.current()
+        if not isinstance(backend, NumpyBackend):
+            raise ValueError(f"Workers backend '{workers_backend}' is only supported with the NumPy backend.")
+
+        # Only the tiles are sent to the worker processes, and only the tiles without margins are sent back:
+        tiles = Parallel(n_jobs=workers, backend=workers_backend)(
+            delayed(_compute_tile_in_process)(
+                backend,
+                denorm_fun,
+                function,
+                norm_fun,
+                image[tile_slice],
+                remove_margin_slice(shape, tile_slice, tile_slice_no_margins),
+                internal_dtype,
+            )
+            for tile_slice, tile_slice_no_margins in slices
+        )
+
+        for (_, tile_slice_no_margins), image_tile in zip(slices, tiles):
+            result[tile_slice_no_margins] = image_tile
+
+
+def _compute_tile_in_process(
+    backend: Backend,
+    denorm_fun: Callable,
+    function: Callable,
+    norm_fun: Callable,
+    image_tile: numpy.ndarray,
+    remove_margin_slice_tuple: Tuple[slice, ...],
+    internal_dtype: numpy.dtype,
+) -> numpy.ndarray:
+    with backend.copy(exclusive=False):
         image_tile = Backend.to_backend(image_tile, dtype=internal_dtype)
         image_tile = denorm_fun(function(norm_fun(image_tile)))
-        if to_numpy:
-            image_tile = Backend.to_numpy(image_tile, dtype=internal_dtype)
-        else:
-            image_tile = Backend.to_backend(image_tile, dtype=internal_dtype)
+        image_tile = Backend.to_numpy(image_tile, dtype=internal_dtype)
+        return image_tile[remove_margin_slice_tuple]
+
+
+class _BackendThreadPool(ThreadPoolExecutor):
+    # Each task runs within its own copy of the backend current when the pool is created (same device, but never
+    # exclusive), the copy is exited when the task ends so that no backend remains entered in the pool threads:
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers)
+        self._backend = Backend.current()
+
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        return super().submit(_run_in_backend_copy, self._backend, function, *args, **kwargs)
+
+
+def _run_in_backend_copy(backend: Backend, function: Callable, *args, **kwargs) -> Any:
+    with backend.copy(exclusive=False):
+        return function(*args, **kwargs)
+
+
+def _load_tile(image: xpArray, tile_slice: Tuple[slice, ...], internal_dtype: numpy.dtype) -> xpArray:
+    image_tile = image[tile_slice]
+    return Backend.to_backend(image_tile, dtype=internal_dtype)
+
+
+def _store_tile(
+    result: xpArray,
+    image_tile: xpArray,
+    shape: Tuple[int, ...],
+    tile_slice: Tuple[slice, ...],
+    tile_slice_no_margins: Tuple[slice, ...],
+    internal_dtype: numpy.dtype,
+    to_numpy: bool,
+) -> None:
+    if to_numpy:
+        image_tile = Backend.to_numpy(image_tile, dtype=internal_dtype)
+    else:
+        image_tile = Backend.to_backend(image_tile, dtype=internal_dtype)
 
-        remove_margin_slice_tuple = remove_margin_slice(shape, tile_slice, tile_slice_no_margins)
-        image_tile = image_tile[remove_margin_slice_tuple]
+    remove_margin_slice_tuple = remove_margin_slice(shape, tile_slice, tile_slice_no_margins)
+    image_tile = image_tile[remove_margin_slice_tuple]
 
-        result[tile_slice_no_margins] = image_tile
+    result[tile_slice_no_margins] = image_tile
 
 
 # Dask turned out not too work great here, HUGE overhead compared to the light approach above.
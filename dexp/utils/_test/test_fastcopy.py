@@ -0,0 +1,37 @@
+import os
+
+from dexp.utils.fastcopy import fastcopy
+
+
+def test_fastcopy(tmp_path):
+    source = tmp_path / "source.zarr"
+    dest = tmp_path / "dest.zarr"
+
+    # A small tree of chunk files, plus one larger file:
+    for i in range(3):
+        chunk_folder = source / "channel" / str(i)
+        chunk_folder.mkdir(parents=True)
+        for j in range(100):
+            (chunk_folder / str(j)).write_bytes(os.urandom(64 + j))
+    (source / "large").write_bytes(os.urandom(3_000_000))
+
+    nb_files, nb_bytes, nb_skipped = fastcopy(str(source), str(dest), nb_threads=4, batch_size=32)
+
+    assert nb_files == 301
+    assert nb_skipped == 0
+    source_files = sorted(p.relative_to(source) for p in source.rglob("*") if p.is_file())
+    dest_files = sorted(p.relative_to(dest) for p in dest.rglob("*") if p.is_file())
+    assert source_files == dest_files
+    assert sum((source / f).stat().st_size for f in source_files) == nb_bytes
+    for f in source_files:
+        assert (source / f).read_bytes() == (dest / f).read_bytes()
+
+    # Resuming only copies the files that are missing or differ:
+    (dest / "large").unlink()
+    (dest / "channel" / "0" / "0").write_bytes(b"")
+    nb_files, _, nb_skipped = fastcopy(str(source), str(dest), nb_threads=4, resume=True)
+
+    assert nb_files == 2
+    assert nb_skipped == 299
+    assert (source / "large").read_bytes() == (dest / "large").read_bytes()
+    assert (source / "channel" / "0" / "0").read_bytes() == (dest / "channel" / "0" / "0").read_bytes()
@@ -0,0 +1,179 @@
+import errno
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Tuple
+
+from arbol import aprint, asection
+
+# Errors for which the kernel copy is not supported for the given pair of files, and a fallback is used:
+_unsupported_errnos = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+    errno.ENOTSOCK,
+)
+
+
+def fastcopy(
+    source_folder: str,
+    dest_folder: str,
+    nb_threads: int = 8,
+    resume: bool = False,
+    batch_size: int = 256,
+    report_interval: float = 5,
+) -> Tuple[int, int, int]:
+    """
+    Copies a folder (e.g. a zarr dataset) to another folder as fast as possible.
+    The directory tree is walked concurrently, and files are copied by a pool of threads, in batches to amortise
+    the scheduling overhead for the (many) small chunk files of zarr datasets. File contents are copied within
+    the kernel (copy_file_range, or sendfile) when possible, without going through user space.
+
+    Parameters
+    ----------
+    source_folder : source folder, or file.
+    dest_folder : destination folder, or file.
+    nb_threads : number of threads used to walk the tree and copy files.
+    resume : If True, files that already exist at the destination with the same size and
+        modification time are skipped, this is the case for files copied by a previous (interrupted) copy.
+    batch_size : number of files copied per batch.
+    report_interval : interval in seconds between progress and throughput reports.
+
+    Returns
+    -------
+    Tuple of number of files copied, number of bytes copied, and number of files skipped.
+
+    """
+    with asection(f"Copying all files and folders from {source_folder} to {dest_folder} with {nb_threads} threads."):
+        start_time = time.monotonic()
+        last_report_time = start_time
+
+        nb_copied_files, nb_copied_bytes, nb_skipped_files = 0, 0, 0
+
+        def _report(prefix: str):
+            elapsed_time = max(1e-6, time.monotonic() - start_time)
+            aprint(
+                f"{prefix}: {nb_copied_files} files copied, {nb_skipped_files} files skipped, "
+                + f"{nb_copied_bytes / 1e9:.2f} GB in {elapsed_time:.1f} seconds "
+                + f"({nb_copied_bytes / 1e6 / elapsed_time:.1f} MB/s, {nb_copied_files / elapsed_time:.0f} files/s)"
+            )
+
+        if os.path.isfile(source_folder):
+            # A single file, for example a zip store:
+            stat = os.stat(source_folder)
+            nb_copied_files, nb_copied_bytes, nb_skipped_files = _copy_files(
+                [(source_folder, dest_folder, stat.st_size, stat.st_atime_ns, stat.st_mtime_ns)], resume
+            )
+            _report("Done")
+            return nb_copied_files, nb_copied_bytes, nb_skipped_files
+
+        with ThreadPoolExecutor(max_workers=max(1, nb_threads)) as pool:
+            pending = {pool.submit(_scan_directory, source_folder, dest_folder)}
+
+            while pending:
+                done, pending = wait(pending, timeout=report_interval, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    result = future.result()
+                    if result[0] == "scan":
+                        _, sub_directories, files = result
+                        for source, dest in sub_directories:
+                            pending.add(pool.submit(_scan_directory, source, dest))
+                        for i in range(0, len(files), batch_size):
+                            pending.add(pool.submit(_copy_files, files[i : i + batch_size], resume))
+                    else:
+                        copied_files, copied_bytes, skipped_files = result
+                        nb_copied_files += copied_files
+                        nb_copied_bytes += copied_bytes
+                        nb_skipped_files += skipped_files
+
+                if time.monotonic() - last_report_time > report_interval:
+                    last_report_time = time.monotonic()
+                    _report("Progress")
+
+        _report("Done")
+
+    return nb_copied_files, nb_copied_bytes, nb_skipped_files
+
+
+def _scan_directory(source: str, dest: str) -> Tuple[str, List[Tuple[str, str]], List[Tuple]]:
+    os.makedirs(dest, exist_ok=True)
+
+    sub_directories = []
+    files = []
+    with os.scandir(source) as entries:
+        for entry in entries:
+            dest_path = os.path.join(dest, entry.name)
+            if entry.is_dir():
+                sub_directories.append((entry.path, dest_path))
+            else:
+                stat = entry.stat()
+                files.append((entry.path, dest_path, stat.st_size, stat.st_atime_ns, stat.st_mtime_ns))
+
+    return "scan", sub_directories, files
+
+
+def _copy_files(files: List[Tuple], resume: bool) -> Tuple[int, int, int]:
+    nb_copied_files, nb_copied_bytes, nb_skipped_files = 0, 0, 0
+
+    for source, dest, size, atime_ns, mtime_ns in files:
+        if resume:
+            try:
+                dest_stat = os.stat(dest)
+                if dest_stat.st_size == size and dest_stat.st_mtime_ns == mtime_ns:
+                    nb_skipped_files += 1
+                    continue
+            except FileNotFoundError:
+                pass
+
+        _copy_file(source, dest, size)
+        # The modification time is preserved so that resuming can recognise copied files:
+        os.utime(dest, ns=(atime_ns, mtime_ns))
+
+        nb_copied_files += 1
+        nb_copied_bytes += size
+
+    return nb_copied_files, nb_copied_bytes, nb_skipped_files
+
+
+def _copy_file(source: str, dest: str, size: int):
+    with open(source, "rb") as source_file, open(dest, "wb") as dest_file:
+        source_fd = source_file.fileno()
+        dest_fd = dest_file.fileno()
+
+        offset = _kernel_copy(source_fd, dest_fd, size)
+
+        if offset < size:
+            # Kernel copy not available, or the file changed since it was listed:
+            source_file.seek(offset)
+            dest_file.seek(offset)
+            shutil.copyfileobj(source_file, dest_file)
+
+
+def _kernel_copy(source_fd: int, dest_fd: int, size: int) -> int:
+    # Returns the number of bytes copied within the kernel, the rest of the file must be copied otherwise.
+    offset = 0
+
+    for method in ("copy_file_range", "sendfile"):
+        if not hasattr(os, method):
+            continue
+        try:
+            while offset < size:
+                if method == "copy_file_range":
+                    copied = os.copy_file_range(source_fd, dest_fd, size - offset, offset, offset)
+                else:
+                    os.lseek(dest_fd, offset, os.SEEK_SET)
+                    copied = os.sendfile(dest_fd, source_fd, offset, size - offset)
+                if copied == 0:
+                    break
+                offset += copied
+            return offset
+        except OSError as error:
+            if error.errno not in _unsupported_errnos or offset > 0:
+                raise
+
+    return offset